@@ -0,0 +1,136 @@
+"""
+Async versions of the hot read endpoints, served without a thread per request
+under ASGI (see render.yaml).
+
+DRF's ``@api_view`` is sync-only, so these are plain Django async views. They
+authenticate the JWT bearer token themselves and render with DRF's JSON
+renderer, so clients see the same bodies and status codes as before. Queries
+use the async ORM; the cache and conditional-GET helpers shared with the sync
+views run in a thread.
+"""
+
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.db.models import Prefetch
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+
+from users.authentication import ClaimsJWTAuthentication
+
+from . import views
+from .cache import cached_payload
+from .conditional import conditional
+from .models import Course, Enrollment, LessonCompletion
+from .routers import replica_reads
+from .serializers import EnrollmentSerializer
+
+_authenticator = ClaimsJWTAuthentication()
+
+
+def _json(data, status=200, headers=None):
+    return HttpResponse(
+        JSONRenderer().render(data), status=status, headers=headers, content_type="application/json"
+    )
+
+
+def async_api_view(methods, authenticated=False):
+    """
+    Async counterpart of ``@api_view`` + ``@permission_classes``: checks the
+    method, resolves ``request.user`` from the bearer token and, when
+    ``authenticated`` is set, rejects anonymous requests with a 401.
+    """
+    allowed = set(methods) | ({"HEAD"} if "GET" in methods else set())
+
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in allowed:
+                return _json(
+                    {"detail": f'Method "{request.method}" not allowed.'},
+                    status=405, headers={"Allow": ", ".join(sorted(allowed))},
+                )
+
+            challenge = {"WWW-Authenticate": _authenticator.authenticate_header(request)}
+            try:
+                found = await sync_to_async(_authenticator.authenticate)(request)
+            except AuthenticationFailed as exc:
+                detail = exc.detail if isinstance(exc.detail, dict) else {"detail": exc.detail}
+                return _json(detail, status=401, headers=challenge)
+
+            request.user = found[0] if found else AnonymousUser()
+            if authenticated and not request.user.is_authenticated:
+                return _json({"detail": "Authentication credentials were not provided."}, status=401, headers=challenge)
+            return await view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@async_api_view(["GET", "PATCH", "PUT", "DELETE"])
+@conditional(views.course_fingerprint)
+async def course_detail(request, pk):
+    if request.method not in ("GET", "HEAD"):
+        # Writes stay on the DRF view (parsers, serializer validation).
+        return await sync_to_async(views.course_detail)(request, pk=pk)
+
+    data = await sync_to_async(views._course_detail_payload)(request, pk)
+    if data is None:
+        return _json({"detail": "Course not found"}, status=404)
+    return _json(data)
+
+
+@async_api_view(["GET"])
+@replica_reads
+@conditional(views.course_lessons_fingerprint)
+async def get_course_lessons(request, course_id):
+    data = await sync_to_async(cached_payload)(
+        "course_lessons", [("course", course_id)], lambda: views._course_lessons_payload(course_id)
+    )
+    if data is None:
+        return _json({"error": "Course not found"}, status=404)
+    return _json(data)
+
+
+@async_api_view(["GET"], authenticated=True)
+async def student_enrolled_courses(request):
+    if request.user.role != "student":
+        return _json({"detail": "Only students can access this endpoint."}, status=403)
+
+    enrollments = [
+        enrollment
+        async for enrollment in Enrollment.objects.filter(user=request.user, is_active=True).prefetch_related(
+            Prefetch("course", queryset=Course.objects.for_listing())
+        )
+    ]
+    serializer = EnrollmentSerializer(enrollments, many=True, context={"request": request})
+    return _json(serializer.data)
+
+
+@async_api_view(["GET"], authenticated=True)
+async def get_course_progress(request, course_id):
+    try:
+        enrollment = await Enrollment.objects.aget(user=request.user, course_id=course_id)
+    except Enrollment.DoesNotExist:
+        return _json({"progress_percent": 0})
+    return _json({
+        "progress_percent": enrollment.progress,
+        "is_completed": enrollment.is_completed
+    })
+
+
+@async_api_view(["GET"], authenticated=True)
+async def completed_lessons(request, course_id):
+    if getattr(request.user, "role", None) != "student":
+        return _json({"error": "Only students can view completed lessons"}, status=403)
+
+    lesson_ids = LessonCompletion.objects.filter(
+        student=request.user,
+        course_id=course_id
+    ).values_list("lesson_id", flat=True)
+    return _json([lesson_id async for lesson_id in lesson_ids])
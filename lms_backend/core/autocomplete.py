@@ -0,0 +1,272 @@
+"""
+In-process prefix index for course/category title autocomplete.
+
+Titles are normalized and split into tokens; the index is a sorted list of
+tokens with a parallel array of entry ids, so a prefix lookup is two bisects
+and a slice. Results are ranked by active enrollment count (for categories,
+the sum over their courses). Short prefixes match a large share of the index,
+so their top-k answers are memoized until an entry under them changes.
+
+Each worker builds its own copy on start (see wsgi.py/asgi.py), applies
+Course/Category/Enrollment signals incrementally and rebuilds in the
+background every ``AUTOCOMPLETE_REFRESH_SECONDS`` to pick up writes made by
+other processes. Until the first build finishes, lookups return nothing
+rather than loading the catalog in the request thread.
+
+The index holds at most ``AUTOCOMPLETE_MAX_ENTRIES`` courses and categories
+together; past that, the lowest-ranked entries are left out, and a new entry
+replaces the lowest-ranked one unless it ranks lower still.
+"""
+
+import heapq
+import re
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+from django.db.models import Sum
+
+from .models import Category, Course
+
+MAX_TOKENS_PER_TITLE = 8
+MAX_TOKEN_LENGTH = 24
+MEMO_PREFIX_LENGTH = 3
+# How many of the lowest-ranked entries are found per scan when making room.
+EVICTION_BATCH = 256
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    tokens = "".join(ch if ch.isalnum() else " " for ch in text).split()
+    # Interned so the sorted token list stores each distinct token once.
+    return [sys.intern(token[:MAX_TOKEN_LENGTH]) for token in tokens]
+
+
+def _title_tokens(title):
+    # Cheap path for the common ASCII case when filtering candidates.
+    if title.isascii():
+        return _WORD_RE.findall(title.lower())
+    return normalize(title)
+
+
+def _entry_id(kind, pk):
+    return pk * 2 + (1 if kind == "category" else 0)
+
+
+def _entry_ref(entry_id):
+    return ("category" if entry_id & 1 else "course"), entry_id >> 1
+
+
+class PrefixIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._tokens = []
+        self._ids = array("q")
+        self._entries = {}
+        self._memo = {}
+        self._evictable = []
+        self._built_at = None
+        self._refreshing = False
+
+    # ---- building ----
+
+    def _limit(self):
+        return getattr(settings, "AUTOCOMPLETE_MAX_ENTRIES", 1_000_000)
+
+    def _load(self):
+        limit = self._limit()
+        entries = {}
+        courses = (
+            Course.objects.filter(is_active=True)
+            .order_by("-active_enrollment_count")
+            .values_list("pk", "title", "active_enrollment_count")[:limit]
+        )
+        for pk, title, score in courses.iterator(chunk_size=5000):
+            entries[_entry_id("course", pk)] = (title, score)
+        categories = Category.objects.filter(is_active=True).annotate(
+            score=Sum("course__active_enrollment_count")
+        ).values_list("pk", "title", "score")
+        for pk, title, score in categories.iterator(chunk_size=5000):
+            entries[_entry_id("category", pk)] = (title, score or 0)
+        if len(entries) > limit:
+            entries = dict(heapq.nlargest(limit, entries.items(), key=lambda item: item[1][1]))
+
+        pairs = sorted(
+            (token, entry_id)
+            for entry_id, (title, _) in entries.items()
+            for token in set(normalize(title)[:MAX_TOKENS_PER_TITLE])
+        )
+        tokens = [token for token, _ in pairs]
+        ids = array("q", (entry_id for _, entry_id in pairs))
+        del pairs
+        return tokens, ids, entries
+
+    def build(self):
+        tokens, ids, entries = self._load()
+        with self._lock:
+            self._tokens, self._ids, self._entries = tokens, ids, entries
+            self._memo = {}
+            self._evictable = []
+            self._built_at = time.monotonic()
+            self._refreshing = False
+
+    def warm(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._safe_build, name="autocomplete-build", daemon=True).start()
+
+    def _safe_build(self):
+        try:
+            self.build()
+        except Exception:
+            # The database may not be migrated yet; the next query retries.
+            with self._lock:
+                self._refreshing = False
+
+    def _ensure_fresh(self):
+        if self._built_at is None:
+            self.warm()
+            return False
+        refresh = getattr(settings, "AUTOCOMPLETE_REFRESH_SECONDS", 300)
+        if refresh and time.monotonic() - self._built_at > refresh:
+            self.warm()
+        return True
+
+    # ---- incremental updates ----
+
+    def _forget_memo(self, tokens):
+        for token in tokens:
+            for length in range(1, MEMO_PREFIX_LENGTH + 1):
+                self._memo.pop(token[:length], None)
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        tokens = set(normalize(entry[0])[:MAX_TOKENS_PER_TITLE])
+        for token in tokens:
+            lo, hi = bisect_left(self._tokens, token), bisect_right(self._tokens, token)
+            for position in range(lo, hi):
+                if self._ids[position] == entry_id:
+                    del self._tokens[position]
+                    del self._ids[position]
+                    break
+        self._forget_memo(tokens)
+
+    def _make_room(self, score):
+        # Evicts the lowest-ranked entry for a new one scoring ``score``.
+        # Candidates are found a batch at a time; those whose score changed
+        # since are skipped.
+        while True:
+            if not self._evictable:
+                lowest = heapq.nsmallest(
+                    EVICTION_BATCH, ((entry[1], entry_id) for entry_id, entry in self._entries.items())
+                )
+                if not lowest:
+                    return False
+                self._evictable = lowest[::-1]
+            floor, entry_id = self._evictable[-1]
+            entry = self._entries.get(entry_id)
+            if entry is None or entry[1] != floor:
+                self._evictable.pop()
+                continue
+            if score < floor:
+                return False
+            self._evictable.pop()
+            self._remove(entry_id)
+            return True
+
+    def upsert(self, kind, pk, title, score=None):
+        if self._built_at is None:
+            return
+        entry_id = _entry_id(kind, pk)
+        with self._lock:
+            previous = self._entries.get(entry_id)
+            if score is None:
+                score = previous[1] if previous else 0
+            if previous is None and len(self._entries) >= self._limit() and not self._make_room(score):
+                return
+            self._remove(entry_id)
+            self._entries[entry_id] = (title, score)
+            tokens = set(normalize(title)[:MAX_TOKENS_PER_TITLE])
+            for token in tokens:
+                position = bisect_right(self._tokens, token)
+                self._tokens.insert(position, token)
+                self._ids.insert(position, entry_id)
+            self._forget_memo(tokens)
+
+    def remove(self, kind, pk):
+        if self._built_at is None:
+            return
+        with self._lock:
+            self._remove(_entry_id(kind, pk))
+
+    def adjust_score(self, kind, pk, delta):
+        entry_id = _entry_id(kind, pk)
+        with self._lock:
+            entry = self._entries.get(entry_id)
+            if entry is None:
+                return
+            self._entries[entry_id] = (entry[0], max(entry[1] + delta, 0))
+            self._forget_memo(normalize(entry[0])[:MAX_TOKENS_PER_TITLE])
+
+    # ---- lookups ----
+
+    def _range(self, prefix):
+        return bisect_left(self._tokens, prefix), bisect_left(self._tokens, prefix + "\uffff")
+
+    def _rank(self, candidates, limit):
+        return heapq.nsmallest(limit, candidates, key=lambda entry_id: (-self._entries[entry_id][1], entry_id))
+
+    def _top(self, prefix, limit):
+        lo, hi = self._range(prefix)
+        return self._rank(set(self._ids[lo:hi]), limit)
+
+    def suggest(self, query, limit=8):
+        terms = normalize(query)
+        if not terms:
+            return []
+        if not self._ensure_fresh():
+            return []
+        with self._lock:
+            if len(terms) == 1 and len(terms[0]) <= MEMO_PREFIX_LENGTH and limit <= 20:
+                top = self._memo.get(terms[0])
+                if top is None:
+                    top = self._memo[terms[0]] = self._top(terms[0], 20)
+                top = top[:limit]
+            else:
+                # Every term must prefix-match some title token. Start from the
+                # narrowest term and intersect with the others' id ranges,
+                # falling back to checking titles when a range is much wider
+                # than the remaining candidate set.
+                spans = sorted((hi - lo, lo, hi, term) for term in terms for lo, hi in [self._range(term)])
+                _, lo, hi, _ = spans[0]
+                candidates = set(self._ids[lo:hi])
+                for size, lo, hi, term in spans[1:]:
+                    if not candidates:
+                        break
+                    if size <= 32 * len(candidates):
+                        candidates &= set(self._ids[lo:hi])
+                    else:
+                        candidates = {
+                            entry_id for entry_id in candidates
+                            if any(token.startswith(term) for token in _title_tokens(self._entries[entry_id][0]))
+                        }
+                top = self._rank(candidates, limit)
+            return [
+                {"type": kind, "id": pk, "title": self._entries[entry_id][0]}
+                for entry_id in top
+                for kind, pk in [_entry_ref(entry_id)]
+            ]
+
+
+index = PrefixIndex()
@@ -0,0 +1,126 @@
+"""
+Versioned response cache for the read-mostly catalog endpoints.
+
+Every cached payload is keyed by the version numbers of the objects it was
+built from (``("course", 12)``, ``("category", 3)``, ...). Model signals bump
+those versions, so invalidation is a single cache write and a stale payload is
+simply never looked up again; old entries age out through the cache timeout.
+
+Payloads may sit in a per-process cache (``CATALOG_CACHE_ALIAS``), but the
+versions (``CATALOG_VERSION_CACHE_ALIAS``) have to be shared by all processes,
+or a bump made by another worker, the job runner or a management command
+never reaches the process holding the payload; ``check_version_cache``
+refuses per-process backends for them.
+"""
+
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from .routers import reading_from_replica
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def _cache():
+    return caches[getattr(settings, "CATALOG_CACHE_ALIAS", "default")]
+
+
+def _version_cache():
+    return caches[getattr(settings, "CATALOG_VERSION_CACHE_ALIAS", "default")]
+
+
+@checks.register(checks.Tags.caches)
+def check_version_cache(app_configs=None, **kwargs):
+    alias = getattr(settings, "CATALOG_VERSION_CACHE_ALIAS", "default")
+    if isinstance(caches[alias], (LocMemCache, DummyCache)):
+        return [checks.Error(
+            f"Cache {alias!r} holds the catalog cache versions but is local to each process.",
+            hint="Use a shared backend (database, file-based, Redis, Memcached) for CATALOG_VERSION_CACHE_ALIAS, "
+                 "or bumps made by other workers, run_jobs and management commands are missed.",
+            id="core.E001",
+        )]
+    return []
+
+
+def _version_key(scope, pk):
+    return f"lms:ver:{scope}:{pk}"
+
+
+def _record(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def cache_stats():
+    with _stats_lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_ratio": round(hits / total, 4) if total else 0.0}
+
+
+def get_versions(scopes):
+    cache = _version_cache()
+    keys = {_version_key(scope, pk): (scope, pk) for scope, pk in scopes}
+    found = cache.get_many(keys)
+    for key in keys.keys() - found.keys():
+        # Seed unknown (or evicted) versions from the clock so a re-created
+        # counter can never collide with a version used before it was lost.
+        cache.add(key, time.time_ns(), None)
+        found[key] = cache.get(key)
+    return {f"{scope}:{pk}": found[key] for key, (scope, pk) in keys.items()}
+
+
+def bump_version(scope, pk):
+    cache = _version_cache()
+    key = _version_key(scope, pk)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def cached_payload(name, scopes, build, vary="", dependencies=None):
+    """
+    Return ``build()``'s payload, served from cache while none of the
+    ``scopes`` (or the scopes returned by ``dependencies()``) have changed.
+
+    ``dependencies`` is only evaluated on a miss, before ``build``; the
+    versions it resolves to are stored alongside the payload and re-checked
+    on every hit. A ``build`` result of ``None`` (e.g. not found) is not cached.
+    """
+    cache = _cache()
+    versions = get_versions(scopes)
+    digest = hashlib.md5(vary.encode()).hexdigest()
+    key = f"lms:resp:{name}:{digest}:" + ",".join(f"{k}={v}" for k, v in sorted(versions.items()))
+
+    entry = cache.get(key)
+    if entry is not None:
+        deps = entry["deps"]
+        if not deps or get_versions([dep.split(":", 1) for dep in deps]) == deps:
+            _record("hits")
+            return entry["data"]
+
+    _record("misses")
+    deps = {}
+    if dependencies is not None:
+        dep_scopes = dependencies()
+        if dep_scopes is None:
+            return None
+        deps = get_versions(dep_scopes)
+    data = build()
+    if data is not None:
+        timeout = getattr(settings, "CATALOG_CACHE_TIMEOUT", 300)
+        if reading_from_replica():
+            # A lagging replica can still return rows older than the versions
+            # just read, so don't keep its payloads past the pin window.
+            timeout = min(timeout, settings.REPLICA_PIN_SECONDS)
+        cache.set(key, {"deps": deps, "data": data}, timeout)
+    return data
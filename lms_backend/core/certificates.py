@@ -0,0 +1,233 @@
+"""
+Course completion certificates.
+
+A certificate is a one-page PDF rendered with Pillow from ``LAYOUT`` (plus an
+optional ``CERTIFICATE_BACKGROUND`` image and ``CERTIFICATE_FONT``). Files are
+cached under ``CERTIFICATE_ROOT/<template version>/``, keyed by enrollment, so
+after a change to the layout, background or font each certificate is
+re-rendered the next time it is downloaded (or by
+``generate_certificates --force``).
+
+``issue`` renders every completed enrollment that has no certificate yet in
+keyset-paginated batches, optionally across a process pool, and sets
+``Enrollment.is_certificate_ready`` one batch at a time. The issue date is
+stamped into ``Enrollment.certificate_issued_at`` before the first render,
+so re-rendering after a template change keeps the date the student got. Only a bounded number
+of batches are in flight, so a 50k-student cohort runs in constant memory.
+It runs from ``manage.py generate_certificates`` and, per course, as the
+``core.tasks.issue_certificates`` job queued when a student finishes a course;
+the download view renders a single missing certificate on demand.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import lru_cache
+from string import Formatter
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from PIL import Image, ImageDraw, ImageFont
+
+from .models import Enrollment
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 200
+
+# A4 landscape at 150 dpi. Each line is (text, baseline y, font size); lines
+# whose placeholders are empty for an enrollment are left out.
+LAYOUT = {
+    "page": [1754, 1240],
+    "dpi": 150,
+    "lines": [
+        ["Certificate of Completion", 260, 96],
+        ["This certifies that", 440, 40],
+        ["{name}", 540, 80],
+        ["has successfully completed", 680, 40],
+        ["{course}", 780, 64],
+        ["Final mark: {mark}", 920, 36],
+        ["Issued {date}", 990, 30],
+    ],
+}
+
+_FIELDS = (
+    "pk", "user__first_name", "user__last_name", "user__username", "course__title", "total_mark",
+    "certificate_issued_at",
+)
+
+
+def template_version():
+    """Short digest of everything that affects how a certificate looks."""
+    digest = hashlib.sha256(json.dumps(LAYOUT, sort_keys=True).encode())
+    for path in (settings.CERTIFICATE_BACKGROUND, settings.CERTIFICATE_FONT):
+        if path:
+            info = os.stat(path)
+            digest.update(f"{path}:{info.st_mtime_ns}:{info.st_size}".encode())
+    return digest.hexdigest()[:12]
+
+
+def certificate_path(enrollment_id, version):
+    # Shard by id so a large cohort doesn't end up in one directory.
+    return os.path.join(settings.CERTIFICATE_ROOT, version, f"{enrollment_id // 1000:04d}", f"{enrollment_id}.pdf")
+
+
+@lru_cache(maxsize=None)
+def _font(size):
+    if settings.CERTIFICATE_FONT:
+        return ImageFont.truetype(settings.CERTIFICATE_FONT, size)
+    return ImageFont.load_default(size=size)
+
+
+def _placeholders(text):
+    return [name for _, name, _, _ in Formatter().parse(text) if name]
+
+
+@lru_cache(maxsize=1)
+def _base_page():
+    """The background with the lines that are the same on every certificate already drawn."""
+    size = tuple(LAYOUT["page"])
+    if settings.CERTIFICATE_BACKGROUND:
+        with Image.open(settings.CERTIFICATE_BACKGROUND) as image:
+            page = image.convert("RGB").resize(size, Image.LANCZOS)
+    else:
+        page = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(page)
+    for text, y, font_size in LAYOUT["lines"]:
+        if not _placeholders(text):
+            draw.text((page.width / 2, y), text, font=_font(font_size), fill="black", anchor="ms")
+    return page
+
+
+def _values(row):
+    _, first_name, last_name, username, course, mark, issued_at = row
+    return {
+        "name": f"{first_name} {last_name}".strip() or username,
+        "course": course,
+        "mark": f"{mark:g}" if mark else "",
+        "date": timezone.localtime(issued_at).strftime("%d %B %Y"),
+    }
+
+
+def render(row, path):
+    """Render the certificate for one ``_FIELDS`` row to ``path`` (atomically)."""
+    values = _values(row)
+    page = _base_page().copy()
+    draw = ImageDraw.Draw(page)
+    for text, y, size in LAYOUT["lines"]:
+        names = _placeholders(text)
+        if not names or not all(values[name] for name in names):
+            continue
+        draw.text((page.width / 2, y), text.format(**values), font=_font(size), fill="black", anchor="ms")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handle, partial = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+    try:
+        with os.fdopen(handle, "wb") as out:
+            page.save(out, "PDF", resolution=LAYOUT["dpi"])
+        os.replace(partial, path)
+    except BaseException:
+        os.remove(partial)
+        raise
+
+
+def render_batch(rows, version, force=False):
+    """Render ``rows`` (no database access); return the ids that now have a file."""
+    done = []
+    for row in rows:
+        path = certificate_path(row[0], version)
+        try:
+            if force or not os.path.exists(path):
+                render(row, path)
+        except Exception:
+            logger.exception("Certificate for enrollment %s failed", row[0])
+            continue
+        done.append(row[0])
+    return done
+
+
+def _stamp(rows):
+    """Give rows that have never been issued an issue date, in the database and in ``rows``."""
+    unstamped = [row[0] for row in rows if row[-1] is None]
+    if not unstamped:
+        return rows
+    now = timezone.now()
+    Enrollment.objects.filter(pk__in=unstamped, certificate_issued_at__isnull=True).update(certificate_issued_at=now)
+    stamped = dict(
+        Enrollment.objects.filter(pk__in=unstamped).values_list("pk", "certificate_issued_at")
+    )
+    return [row if row[-1] is not None else (*row[:-1], stamped[row[0]]) for row in rows]
+
+
+def _batches(enrollments):
+    last = 0
+    while True:
+        batch = list(enrollments.filter(pk__gt=last).order_by("pk").values_list(*_FIELDS)[:BATCH_SIZE])
+        if not batch:
+            return
+        last = batch[-1][0]
+        yield _stamp(batch)
+
+
+def _mark_ready(enrollment_ids):
+    Enrollment.objects.filter(pk__in=enrollment_ids).update(is_certificate_ready=True, updated_at=timezone.now())
+    return len(enrollment_ids)
+
+
+def issue(enrollments, workers=0, force=False):
+    """
+    Render certificates for the completed enrollments in ``enrollments`` that
+    don't have one yet (all of them with ``force``). ``workers`` > 0 renders
+    in that many processes. Return ``(issued, failed)``.
+    """
+    version = template_version()
+    pending = enrollments.filter(is_completed=True)
+    if not force:
+        pending = pending.filter(is_certificate_ready=False)
+
+    issued = failed = 0
+    if not workers:
+        for batch in _batches(pending):
+            done = render_batch(batch, version, force)
+            issued += _mark_ready(done)
+            failed += len(batch) - len(done)
+        return issued, failed
+
+    # Workers only touch files; batches are read and flags written here.
+    # Don't let forked children inherit open database connections.
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = {}
+        batches = _batches(pending)
+        while True:
+            while len(in_flight) < workers * 2 and (batch := next(batches, None)) is not None:
+                in_flight[pool.submit(render_batch, batch, version, force)] = len(batch)
+            if not in_flight:
+                break
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                size = in_flight.pop(future)
+                try:
+                    done = future.result()
+                except Exception:
+                    logger.exception("Certificate batch failed")
+                    done = []
+                issued += _mark_ready(done)
+                failed += size - len(done)
+    return issued, failed
+
+
+def ensure(enrollment):
+    """Return the path of ``enrollment``'s certificate, rendering it if needed."""
+    version = template_version()
+    path = certificate_path(enrollment.pk, version)
+    if not os.path.exists(path):
+        row = Enrollment.objects.filter(pk=enrollment.pk).values_list(*_FIELDS).get()
+        render(_stamp([row])[0], path)
+    if not enrollment.is_certificate_ready:
+        _mark_ready([enrollment.pk])
+    return path
@@ -0,0 +1,70 @@
+"""
+Conditional GET support (ETag / Last-Modified / 304) for DRF function views.
+
+A view opts in with ``@conditional(fingerprint)``, placed under ``@api_view``
+so authentication and permissions still run first. ``fingerprint`` is a cheap
+query returning ``(parts, last_modified)`` for the resource, or ``None`` when
+it doesn't exist; the body is only serialized when the client's copy is stale.
+Async views are supported too; the fingerprint query then runs in a thread.
+"""
+
+import calendar
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def _check(request, found):
+    parts, last_modified = found
+    etag = quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+    timestamp = calendar.timegm(last_modified.utctimetuple()) if last_modified else None
+    return etag, timestamp, get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def _stamp(response, etag, timestamp):
+    if response.status_code == 200:
+        response.headers.setdefault("ETag", etag)
+        if timestamp is not None:
+            response.headers.setdefault("Last-Modified", http_date(timestamp))
+    return response
+
+
+def conditional(fingerprint):
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method not in ("GET", "HEAD"):
+                    return await view(request, *args, **kwargs)
+
+                found = await sync_to_async(fingerprint)(request, *args, **kwargs)
+                if found is None:
+                    return await view(request, *args, **kwargs)
+
+                etag, timestamp, not_modified = _check(request, found)
+                if not_modified is not None:
+                    return not_modified
+                return _stamp(await view(request, *args, **kwargs), etag, timestamp)
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+
+            found = fingerprint(request, *args, **kwargs)
+            if found is None:
+                return view(request, *args, **kwargs)
+
+            etag, timestamp, not_modified = _check(request, found)
+            if not_modified is not None:
+                return not_modified
+            return _stamp(view(request, *args, **kwargs), etag, timestamp)
+
+        return wrapper
+
+    return decorator
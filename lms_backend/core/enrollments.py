@@ -0,0 +1,172 @@
+"""
+Bulk enrollment of a cohort into one course.
+
+Identifiers (user ids, emails or usernames) are consumed lazily in chunks of
+``CHUNK_SIZE``. Each chunk costs a handful of queries however large it is:
+one ``IN`` query resolves the users, one finds who is already actively
+enrolled, one batched ``INSERT ... ON CONFLICT DO NOTHING`` adds the rest
+(priced at the course's current price) and one count confirms how many rows
+went in. Chunks commit separately, so rerunning an interrupted import just
+skips whoever is already enrolled.
+
+The insert bypasses the per-row signals, so the course's
+``active_enrollment_count``, its autocomplete score and its cache version are
+adjusted here once per chunk.
+"""
+
+import csv
+import io
+from itertools import islice
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from users.models import User
+
+from .autocomplete import index as autocomplete_index
+from .models import Course, Enrollment
+from .signals import invalidate
+
+CHUNK_SIZE = 5000
+# Identifier kind -> CSV column names it may appear under.
+LOOKUPS = {"id": ("id", "user_id"), "email": ("email",), "username": ("username",)}
+MAX_REPORTED = 1000
+
+
+def _normalize(by, value):
+    if by == "id":
+        return int(value)
+    value = str(value).strip()
+    return value.lower() if by == "email" else value
+
+
+def read_identifiers(stream, by):
+    """
+    Yield identifiers from a binary CSV ``stream``: the column named for
+    ``by`` if the first row is a header, otherwise the first column.
+    """
+    reader = csv.reader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+    header = next(reader, None)
+    if header is None:
+        return
+    names = [name.strip().lower() for name in header]
+    column = next((names.index(name) for name in LOOKUPS[by] if name in names), None)
+    if column is None:
+        column = 0
+        if header and header[0].strip():
+            yield header[0]
+    for row in reader:
+        if len(row) > column and row[column].strip():
+            yield row[column]
+
+
+def _resolve(by, chunk):
+    """Map each identifier in ``chunk`` to ``[(user_id, role), ...]``."""
+    users = User.objects.all()
+    if by == "email":
+        # Registrar exports rarely match the case users signed up with.
+        users = users.annotate(key=Lower("email")).filter(key__in=chunk)
+    else:
+        users = users.annotate(key=F(by)).filter(key__in=chunk)
+    found = {}
+    for key, user_id, role in users.values_list("key", "id", "role"):
+        found.setdefault(key, []).append((user_id, role))
+    return found
+
+
+def _insert(course, user_ids):
+    """
+    INSERT one active enrollment per user, ignoring ones that already exist.
+    Rows are built from a single template instance and sent with
+    executemany: constructing and preparing a model instance per row (as
+    bulk_create does) costs several times more than the insert itself.
+    """
+    if not user_ids:
+        return
+    template = Enrollment(course=course, is_active=True, price=course.price)
+    now = timezone.now()
+    fields = [field for field in Enrollment._meta.concrete_fields if not field.primary_key]
+    for field in fields:
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False):
+            setattr(template, field.attname, now)
+    values = [field.get_db_prep_save(getattr(template, field.attname), connection) for field in fields]
+    user_column = fields.index(Enrollment._meta.get_field("user"))
+
+    quote = connection.ops.quote_name
+    columns = ", ".join(quote(field.column) for field in fields)
+    placeholders = ", ".join(["%s"] * len(fields))
+    sql = (
+        f"INSERT INTO {quote(Enrollment._meta.db_table)} ({columns}) VALUES ({placeholders})"
+        " ON CONFLICT DO NOTHING"
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            sql, [values[:user_column] + [user_id] + values[user_column + 1:] for user_id in user_ids]
+        )
+
+
+def _enroll_chunk(course, chunk, by, report):
+    found = _resolve(by, chunk)
+    candidates = []
+    for identifier in chunk:
+        matches = found.get(identifier)
+        if not matches:
+            problem = "not_found"
+        elif len(matches) > 1:
+            problem = "ambiguous"
+        elif matches[0][1] != "student":
+            problem = "not_student"
+        else:
+            candidates.append(matches[0][0])
+            continue
+        report[problem] += 1
+        if len(report["problems"]) < MAX_REPORTED:
+            report["problems"].append({"identifier": identifier, "problem": problem})
+    if not candidates:
+        return
+
+    with transaction.atomic():
+        enrolled = Enrollment.objects.filter(course=course, is_active=True, user_id__in=candidates)
+        existing = set(enrolled.values_list("user_id", flat=True))
+        _insert(course, [user_id for user_id in candidates if user_id not in existing])
+        # Rows that lost a race with a concurrent enrollment were ignored by
+        # the insert; count what is there now rather than what was sent.
+        created = enrolled.count() - len(existing)
+        if created:
+            Course.objects.filter(pk=course.pk).bump_counter("active_enrollment_count", created)
+            invalidate("course", course.pk)
+            transaction.on_commit(lambda: autocomplete_index.adjust_score("course", course.pk, created))
+    report["enrolled"] += created
+    report["already_enrolled"] += len(candidates) - created
+
+
+def enroll_cohort(course, identifiers, by="id", chunk_size=CHUNK_SIZE):
+    """
+    Enroll the students named by ``identifiers`` (an iterable of user ids,
+    emails or usernames, per ``by``) in ``course``. Return a report with
+    counts per outcome and up to ``MAX_REPORTED`` problem rows.
+    """
+    report = {
+        "requested": 0, "enrolled": 0, "already_enrolled": 0,
+        "not_found": 0, "not_student": 0, "ambiguous": 0, "invalid": 0, "duplicate": 0, "problems": [],
+    }
+    identifiers = iter(identifiers)
+    while raw := list(islice(identifiers, chunk_size)):
+        report["requested"] += len(raw)
+        chunk = []
+        for value in raw:
+            try:
+                chunk.append(_normalize(by, value))
+            except (TypeError, ValueError):
+                report["invalid"] += 1
+                if len(report["problems"]) < MAX_REPORTED:
+                    report["problems"].append({"identifier": str(value), "problem": "invalid"})
+        # A cohort list may repeat someone; enroll them once.
+        unique = list(dict.fromkeys(chunk))
+        report["duplicate"] += len(chunk) - len(unique)
+        chunk = unique
+        if chunk:
+            _enroll_chunk(course, chunk, by, report)
+    return report
@@ -0,0 +1,124 @@
+"""
+Resized course banner variants.
+
+When a course's banner changes, core.signals queues a background job
+(core.tasks.generate_banner_variants) that renders thumbnail, card and hero
+widths in the source format and as WebP. Variant names carry a digest of
+their bytes, so they are served as immutable by core.media. The result is recorded in
+``Course.banner_variants`` only if the banner hasn't changed meanwhile, and
+CourseSerializer turns it into srcset strings. Variants of a banner that no
+course shows any more (replaced or deleted) are removed with
+``discard_variants``.
+
+``render_variants`` does no database work, so ``manage.py
+generate_banner_variants`` can also run it in worker processes to backfill
+existing banners across cores.
+"""
+
+import hashlib
+import io
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+# Variant name -> target width in pixels. Widths above the source's are skipped.
+SIZES = {"thumb": 320, "card": 640, "hero": 1600}
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+
+def _has_alpha(image):
+    return image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+
+
+def _encode(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == "webp":
+        image.save(buffer, "WEBP", quality=WEBP_QUALITY, method=4)
+    elif fmt == "png":
+        image.save(buffer, "PNG", optimize=True)
+    else:
+        image.convert("RGB").save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def _store(banner_name, size, fmt, data):
+    stem = os.path.splitext(os.path.basename(banner_name))[0]
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    name = f"course_banners/variants/{stem}-{size}.{digest}.{fmt}"
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(data))
+    return name
+
+
+def render_variants(banner_name):
+    """Render and store every variant of ``banner_name``; return the ``banner_variants`` mapping."""
+    with default_storage.open(banner_name, "rb") as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+    fallback = "png" if _has_alpha(image) else "jpeg"
+    if not _has_alpha(image) and image.mode != "RGB":
+        image = image.convert("RGB")
+
+    variants = {"source": banner_name}
+    for size, width in sorted(SIZES.items(), key=lambda item: item[1]):
+        if width > image.width and size != "thumb":
+            continue
+        resized = image.copy()
+        resized.thumbnail((width, round(width * image.height / image.width)), Image.LANCZOS)
+        entry = {"width": resized.width}
+        for fmt in ("webp", fallback):
+            entry[fmt] = _store(banner_name, size, fmt, _encode(resized, fmt))
+        variants[size] = entry
+    return variants
+
+
+def apply_variants(course_id, variants):
+    """Record ``variants`` unless the banner changed since they were rendered."""
+    from .models import Course
+    from .signals import invalidate
+
+    # updated_at moves too, so conditional GETs of the course see the change.
+    updated = Course.objects.filter(pk=course_id, banner=variants["source"]).update(
+        banner_variants=variants, updated_at=timezone.now()
+    )
+    if updated:
+        invalidate("course", course_id)
+    return bool(updated)
+
+
+def variant_names(variants):
+    return [
+        name
+        for size, entry in (variants or {}).items() if size != "source"
+        for fmt, name in entry.items() if fmt != "width"
+    ]
+
+
+def discard_variants(variants):
+    """Delete the files of ``variants`` unless a course still shows their source banner."""
+    from .models import Course
+
+    source = (variants or {}).get("source")
+    if not source or Course.objects.filter(banner=source).exists():
+        return
+    for name in variant_names(variants):
+        default_storage.delete(name)
+
+
+def srcset(course, url):
+    """Map each format to a srcset string, or ``None`` when variants aren't ready yet."""
+    variants = course.banner_variants or {}
+    if not course.banner or variants.get("source") != course.banner.name:
+        return None
+    sets = {}
+    for size, entry in variants.items():
+        if size == "source":
+            continue
+        for fmt, name in entry.items():
+            if fmt != "width":
+                sets.setdefault(fmt, []).append((entry["width"], f"{url(default_storage.url(name))} {entry['width']}w"))
+    return {fmt: ", ".join(item for _, item in sorted(items)) for fmt, items in sets.items()}
@@ -0,0 +1,263 @@
+"""
+Database-backed background jobs.
+
+Jobs are rows in ``core_job``. ``enqueue`` inserts one inside the caller's
+transaction, so a job exists exactly when the change that asked for it was
+committed. Workers claim due jobs with a conditional UPDATE, which works on
+SQLite as well as on databases with row locks. They run as
+``manage.py run_jobs`` (threads and/or processes), or as the embedded worker
+threads that wsgi.py/asgi.py start. An idle worker only reads: it looks for a
+due job before taking the write lock, and polls less often the longer the
+queue stays empty (up to ``max_poll`` seconds); a job enqueued in the same
+process wakes it at once.
+
+- Tasks are plain functions registered with ``@task(queue=..., ...)``; their
+  keyword arguments must be JSON-serializable.
+- A ``key`` makes enqueueing idempotent: while a job with that key is still
+  waiting, enqueueing it again returns the waiting job.
+- Failures are retried with exponential backoff and jitter up to
+  ``max_attempts``. A worker that dies mid-job loses its lease after the
+  task's ``timeout`` and the job is picked up again.
+- ``JOB_QUEUES`` caps how many jobs of a queue run at once across all workers.
+- A task's return value (JSON-serializable) is stored on the job as
+  ``result`` for clients polling ``jobs/<id>/``.
+- With ``JOBS_EAGER`` jobs run inline once the transaction commits.
+"""
+
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+import weakref
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max, Min, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 3600
+
+_registry = {}
+# Workers running in this process, woken when a job is enqueued here.
+_workers = weakref.WeakSet()
+
+
+def task(queue="default", max_attempts=5, timeout=300):
+    def decorator(fn):
+        fn.job_name = f"{fn.__module__}.{fn.__name__}"
+        fn.job_options = {"queue": queue, "max_attempts": max_attempts, "timeout": timeout}
+        _registry[fn.job_name] = fn
+        return fn
+
+    return decorator
+
+
+def enqueue(fn, key=None, delay=0, **kwargs):
+    """Queue ``fn(**kwargs)``; return the Job (the waiting one if ``key`` is already queued)."""
+    if getattr(settings, "JOBS_EAGER", False):
+        transaction.on_commit(lambda: fn(**kwargs))
+        return None
+
+    transaction.on_commit(_wake)
+    options = fn.job_options
+    if key is not None:
+        waiting = Job.objects.filter(key=key, status="queued").first()
+        if waiting is not None:
+            return waiting
+    try:
+        with transaction.atomic():
+            return Job.objects.create(
+                queue=options["queue"], task=fn.job_name, kwargs=kwargs, key=key,
+                max_attempts=options["max_attempts"], run_at=timezone.now() + timedelta(seconds=delay),
+            )
+    except IntegrityError:
+        # Lost a race with another enqueue of the same key.
+        return Job.objects.filter(key=key, status="queued").first()
+
+
+def _wake():
+    for worker in list(_workers):
+        worker.wakeup.set()
+
+
+def _backoff(attempts):
+    delay = min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+    return random.uniform(delay / 2, delay)
+
+
+def _full_queues(now):
+    limits = getattr(settings, "JOB_QUEUES", {})
+    running = dict(
+        Job.objects.filter(status="running", locked_until__gt=now, queue__in=list(limits))
+        .values_list("queue").annotate(n=Count("id"))
+    )
+    return [queue for queue, limit in limits.items() if limit and running.get(queue, 0) >= limit]
+
+
+def claim(worker_id, queues=None):
+    """Mark the next due job as running for ``worker_id`` and return it, or ``None``."""
+    now = timezone.now()
+    due = Job.objects.filter(status="queued", run_at__lte=now)
+    if queues:
+        due = due.filter(queue__in=queues)
+    # A plain read first, so idle workers don't queue up for the write lock.
+    if not due.exists():
+        return None
+    # One transaction for the limit check and the claim: on SQLite it holds the
+    # write lock (transaction_mode IMMEDIATE), so per-queue limits are exact.
+    with transaction.atomic():
+        due = due.exclude(queue__in=_full_queues(now))
+        candidate = due.order_by("run_at", "id").values_list("pk", "task").first()
+        if candidate is None:
+            return None
+        pk, name = candidate
+        timeout = _registry[name].job_options["timeout"] if name in _registry else 300
+        claimed = Job.objects.filter(pk=pk, status="queued").update(
+            status="running", attempts=F("attempts") + 1, started_at=now,
+            locked_by=worker_id, locked_until=now + timedelta(seconds=timeout),
+        )
+    return Job.objects.get(pk=pk) if claimed else None
+
+
+def _finish_failed(job, error):
+    now = timezone.now()
+    running = Job.objects.filter(pk=job.pk, status="running", locked_by=job.locked_by)
+    if job.attempts < job.max_attempts:
+        try:
+            with transaction.atomic():
+                running.update(
+                    status="queued", run_at=now + timedelta(seconds=_backoff(job.attempts)),
+                    locked_by="", locked_until=None, last_error=error,
+                )
+            return
+        except IntegrityError:
+            # A newer job with the same key is already waiting and will redo the work.
+            error += "\nNot retried: superseded by a newer job with the same key."
+    running.update(status="failed", finished_at=now, locked_until=None, last_error=error)
+
+
+def execute(job):
+    try:
+        fn = _registry.get(job.task)
+        if fn is None:
+            raise LookupError(f"Unknown task {job.task!r}")
+        result = fn(**job.kwargs)
+    except Exception:
+        logger.exception("Job %s (%s) failed on attempt %s", job.pk, job.task, job.attempts)
+        _finish_failed(job, traceback.format_exc())
+    else:
+        Job.objects.filter(pk=job.pk, status="running", locked_by=job.locked_by).update(
+            status="succeeded", finished_at=timezone.now(), locked_until=None, result=result,
+        )
+    finally:
+        close_old_connections()
+
+
+def requeue_expired():
+    """Hand jobs whose worker vanished (lease expired) back to the queue."""
+    expired = Job.objects.filter(status="running", locked_until__lte=timezone.now())
+    for job in expired:
+        _finish_failed(job, f"Lease expired on worker {job.locked_by}.")
+
+
+def prune():
+    hours = getattr(settings, "JOB_RETENTION_HOURS", 24)
+    Job.objects.filter(status="succeeded", finished_at__lt=timezone.now() - timedelta(hours=hours)).delete()
+
+
+class Worker:
+    """Claims jobs and runs up to ``threads`` of them at a time."""
+
+    def __init__(self, threads=2, queues=None, poll=1.0, max_poll=30.0):
+        self.threads = threads
+        self.queues = queues
+        self.poll = poll
+        self.max_poll = max(max_poll, poll)
+        self.id = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        self.stopping = threading.Event()
+        self.wakeup = threading.Event()
+        _workers.add(self)
+
+    def stop(self):
+        self.stopping.set()
+        self.wakeup.set()
+
+    def run(self, once=False):
+        housekeeping_at = timezone.now()
+        idle = self.poll
+        with ThreadPoolExecutor(self.threads, thread_name_prefix="job") as pool:
+            in_flight = set()
+            while not self.stopping.is_set():
+                if timezone.now() >= housekeeping_at:
+                    requeue_expired()
+                    prune()
+                    housekeeping_at = timezone.now() + timedelta(seconds=60)
+
+                claimed = None
+                while len(in_flight) < self.threads and (claimed := claim(self.id, self.queues)):
+                    in_flight.add(pool.submit(execute, claimed))
+                close_old_connections()
+
+                if once and not in_flight and claimed is None:
+                    break
+                if in_flight:
+                    idle = self.poll
+                    _, in_flight = wait(in_flight, timeout=self.poll, return_when=FIRST_COMPLETED)
+                else:
+                    if self.wakeup.wait(idle):
+                        idle = self.poll
+                    else:
+                        idle = min(idle * 2, self.max_poll)
+                    self.wakeup.clear()
+
+
+def start_embedded_worker():
+    """Run a worker in a daemon thread of this web process (``JOB_EMBEDDED_WORKERS`` threads)."""
+    threads = getattr(settings, "JOB_EMBEDDED_WORKERS", 0)
+    if threads and not getattr(settings, "JOBS_EAGER", False):
+        worker = Worker(threads=threads)
+        threading.Thread(target=worker.run, name="job-worker", daemon=True).start()
+        return worker
+    return None
+
+
+def stats(window_seconds=3600):
+    """Per-queue depth, throughput, failure and latency figures for the last ``window_seconds``."""
+    now = timezone.now()
+    since = now - timedelta(seconds=window_seconds)
+    latency = ExpressionWrapper(F("started_at") - F("run_at"), output_field=DurationField())
+    # A retry moves run_at past the last start, so only count rows whose
+    # started_at belongs to the current run_at.
+    started = Q(started_at__gte=since) & Q(started_at__gte=F("run_at"))
+    rows = Job.objects.values("queue").annotate(
+        queued=Count("id", filter=Q(status="queued")),
+        due=Count("id", filter=Q(status="queued", run_at__lte=now)),
+        running=Count("id", filter=Q(status="running")),
+        enqueued=Count("id", filter=Q(created_at__gte=since)),
+        succeeded=Count("id", filter=Q(status="succeeded", finished_at__gte=since)),
+        failed=Count("id", filter=Q(status="failed", finished_at__gte=since)),
+        retrying=Count("id", filter=Q(status="queued", attempts__gt=0)),
+        oldest_due=Min("run_at", filter=Q(status="queued", run_at__lte=now)),
+        latency_avg=Avg(latency, filter=started),
+        latency_max=Max(latency, filter=started),
+    ).order_by("queue")
+
+    queues = {}
+    for row in rows:
+        queue = row.pop("queue")
+        oldest_due = row.pop("oldest_due")
+        row["oldest_due_seconds"] = round((now - oldest_due).total_seconds(), 3) if oldest_due else 0.0
+        for field in ("latency_avg", "latency_max"):
+            value = row.pop(field)
+            row[f"{field}_seconds"] = round(value.total_seconds(), 3) if value is not None else None
+        queues[queue] = row
+    return {"window_seconds": window_seconds, "queues": queues}
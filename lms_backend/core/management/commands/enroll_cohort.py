@@ -0,0 +1,36 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import enrollments
+from core.models import Course
+
+
+class Command(BaseCommand):
+    help = "Enroll a cohort of students in a course from a CSV of user ids, emails or usernames."
+
+    def add_arguments(self, parser):
+        parser.add_argument("course_id", type=int)
+        parser.add_argument("path", help="CSV file (header optional), or - for stdin.")
+        parser.add_argument("--by", choices=list(enrollments.LOOKUPS), default="id")
+        parser.add_argument("--chunk-size", type=int, default=enrollments.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        course = Course.objects.filter(pk=options["course_id"]).first()
+        if course is None:
+            raise CommandError(f"Course {options['course_id']} not found.")
+        path = options["path"]
+        try:
+            stream = sys.stdin.buffer if path == "-" else open(path, "rb")
+        except OSError as exc:
+            raise CommandError(exc)
+
+        with stream:
+            report = enrollments.enroll_cohort(
+                course, enrollments.read_identifiers(stream, options["by"]), options["by"], options["chunk_size"]
+            )
+        for problem in report.pop("problems"):
+            self.stderr.write(f"{problem['identifier']}: {problem['problem']}")
+        self.stdout.write(self.style.SUCCESS(
+            ", ".join(f"{count} {outcome.replace('_', ' ')}" for outcome, count in report.items())
+        ))
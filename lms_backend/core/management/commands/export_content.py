@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import transfer
+
+
+class Command(BaseCommand):
+    help = "Export categories, courses, lessons and materials (with their files) as a restartable JSONL stream."
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", help="Export directory; an unfinished export there is resumed.")
+        parser.add_argument("--course", type=int, action="append", dest="courses", help="Only this course (repeatable).")
+        parser.add_argument("--people", action="store_true", help="Include enrollments and lesson completions.")
+        parser.add_argument("--fresh", action="store_true", help="Start over instead of resuming.")
+
+    def handle(self, *args, **options):
+        try:
+            counts = transfer.export(
+                options["directory"], course_ids=options["courses"], people=options["people"], fresh=options["fresh"]
+            )
+        except transfer.TransferError as exc:
+            raise CommandError(exc)
+        self.stdout.write(self.style.SUCCESS(
+            "Exported " + ", ".join(f"{count} {model}(s)" for model, count in counts.items())
+        ))
@@ -0,0 +1,67 @@
+import os
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from core.models import Blob, Material
+from core.storage import material_storage
+
+
+class Command(BaseCommand):
+    help = "Recount Material references to content-addressed blobs and delete the unreferenced ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report what would be deleted without deleting.")
+        parser.add_argument(
+            "--grace", type=float, default=1,
+            help="Hours since a blob was last stored before it may be deleted (default 1), so uploads "
+                 "that have stored a blob but not yet saved their Material are left alone.",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+
+        # Signals keep ref_count current, but bulk writes and raw SQL skip
+        # them, so recount from Material before trusting a zero.
+        actual = dict(
+            Material.objects.filter(file__in=Blob.objects.values("name"))
+            .values_list("file").annotate(n=Count("id"))
+        )
+        drifted = 0
+        for blob in Blob.objects.iterator():
+            count = actual.get(blob.name, 0)
+            if blob.ref_count != count:
+                drifted += 1
+                if not dry_run:
+                    Blob.objects.filter(pk=blob.pk).update(ref_count=count)
+
+        cutoff = timezone.now() - timedelta(hours=options["grace"])
+        orphans = Blob.objects.filter(last_stored_at__lt=cutoff).exclude(name__in=actual.keys())
+        deleted = freed = 0
+        for blob in orphans.iterator():
+            if Material.objects.filter(file=blob.name).exists():
+                continue
+            deleted += 1
+            freed += blob.size
+            if not dry_run:
+                material_storage.delete(blob.name)
+                blob.delete()
+
+        # Staging files left behind by interrupted saves.
+        staging = material_storage.path(f"{material_storage.prefix}/.incoming")
+        stale = []
+        if os.path.isdir(staging):
+            horizon = time.time() - options["grace"] * 3600
+            stale = [entry.path for entry in os.scandir(staging) if entry.stat().st_mtime < horizon]
+            if not dry_run:
+                for path in stale:
+                    os.remove(path)
+
+        verb = "Would delete" if dry_run else "Deleted"
+        self.stdout.write(self.style.SUCCESS(
+            f"Fixed {drifted} ref count(s). {verb} {deleted} blob(s) ({freed} bytes) "
+            f"and {len(stale)} staging file(s)."
+        ))
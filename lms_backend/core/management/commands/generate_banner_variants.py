@@ -0,0 +1,52 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import images
+from core.models import Course
+
+
+class Command(BaseCommand):
+    help = "Render resized/WebP variants for existing course banners, in parallel across processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count() or 1,
+            help="Worker processes (default: one per CPU).",
+        )
+        parser.add_argument("--force", action="store_true", help="Re-render banners that already have variants.")
+
+    def handle(self, *args, **options):
+        pending = [
+            (pk, banner)
+            for pk, banner, variants in Course.objects.exclude(banner="").values_list("pk", "banner", "banner_variants")
+            if options["force"] or (variants or {}).get("source") != banner
+        ]
+        if not pending:
+            self.stdout.write(self.style.SUCCESS("All banners already have variants."))
+            return
+
+        # Workers only touch files; results are written from this process.
+        # Don't let forked children inherit open database connections.
+        connections.close_all()
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=options["workers"]) as pool:
+            futures = {pool.submit(images.render_variants, banner): pk for pk, banner in pending}
+            for future in as_completed(futures):
+                pk = futures[future]
+                try:
+                    variants = future.result()
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f"Course {pk}: {exc}")
+                    continue
+                if images.apply_variants(pk, variants):
+                    done += 1
+                else:
+                    images.discard_variants(variants)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rendered variants for {done} of {len(pending)} banner(s) with {options['workers']} worker(s); {failed} failed."
+        ))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import transfer
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Import a directory written by export_content; rerunning it resumes an interrupted import."
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory")
+        parser.add_argument("--no-people", action="store_true", help="Skip enrollments and lesson completions.")
+        parser.add_argument("--instructor", help="Username to own courses whose instructor doesn't exist here.")
+        parser.add_argument("--batch-size", type=int, default=transfer.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        instructor = None
+        if options["instructor"]:
+            instructor = User.objects.filter(username=options["instructor"]).values_list("pk", flat=True).first()
+            if instructor is None:
+                raise CommandError(f"User {options['instructor']} not found.")
+        try:
+            report = transfer.import_content(
+                options["directory"],
+                people=not options["no_people"],
+                instructor=instructor,
+                batch_size=options["batch_size"],
+            )
+        except transfer.TransferError as exc:
+            raise CommandError(exc)
+        for problem in report.pop("problems"):
+            self.stderr.write(f"{problem['model']} {problem['id']}: {problem['problem']}")
+        for model, counts in report.items():
+            self.stdout.write(self.style.SUCCESS(
+                f"{model}: " + ", ".join(f"{count} {outcome.replace('_', ' ')}" for outcome, count in counts.items())
+            ))
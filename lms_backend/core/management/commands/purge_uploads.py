@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import uploads
+from core.models import Upload
+
+
+class Command(BaseCommand):
+    help = "Delete resumable uploads (and their part files) that haven't received data for a while."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than", type=float, default=24,
+            help="Hours since the last chunk before an upload is abandoned (default 24).",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options["older_than"])
+        purged = 0
+        for upload in Upload.objects.filter(updated_at__lt=cutoff).iterator():
+            uploads.discard(upload)
+            purged += 1
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} upload(s)."))
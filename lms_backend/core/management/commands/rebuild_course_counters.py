@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Course, counter_expressions
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized lesson/enrollment/completion counters on Course and report drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report drift without writing.")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        courses = Course.objects.only("id", *Course.COUNTER_FIELDS).annotate(
+            **{f"actual_{field}": expression for field, expression in counter_expressions().items()}
+        )
+
+        drifted = []
+        for course in courses.iterator(chunk_size=options["batch_size"]):
+            changed = False
+            for field in Course.COUNTER_FIELDS:
+                actual = getattr(course, f"actual_{field}")
+                stored = getattr(course, field)
+                if stored != actual:
+                    self.stdout.write(f"Course {course.pk}: {field} {stored} -> {actual}")
+                    setattr(course, field, actual)
+                    changed = True
+            if changed:
+                drifted.append(course)
+
+        if drifted and not options["dry_run"]:
+            with transaction.atomic():
+                Course.objects.bulk_update(drifted, Course.COUNTER_FIELDS, batch_size=options["batch_size"])
+
+        verb = "would be fixed" if options["dry_run"] else "fixed"
+        self.stdout.write(self.style.SUCCESS(f"{len(drifted)} course(s) with drifted counters {verb}."))
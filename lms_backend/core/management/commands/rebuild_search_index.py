@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the FTS5 course search index from the Course, Lesson and Category tables."
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError("Full-text search needs an SQLite database.")
+        indexed = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} course(s)."))
@@ -0,0 +1,63 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import tasks  # noqa: F401  (registers the tasks)
+from core.jobs import Worker
+from users import tasks as user_tasks  # noqa: F401
+
+
+def _run_worker(threads, queues, poll, max_poll, once):
+    worker = Worker(threads=threads, queues=queues, poll=poll, max_poll=max_poll)
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    try:
+        worker.run(once=once)
+    except KeyboardInterrupt:
+        pass
+
+
+class Command(BaseCommand):
+    help = "Run background jobs from the database queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=4, help="Jobs run concurrently per process (default 4).")
+        parser.add_argument(
+            "--processes", type=int, default=1,
+            help="Worker processes, for CPU-bound tasks such as image rendering (default 1).",
+        )
+        parser.add_argument("--queues", help="Comma-separated queues to serve (default: all).")
+        parser.add_argument("--poll", type=float, default=1.0, help="Seconds between polls while busy (default 1).")
+        parser.add_argument(
+            "--max-poll", type=float, default=30.0,
+            help="Idle polls back off up to this many seconds (default 30).",
+        )
+        parser.add_argument("--once", action="store_true", help="Exit once no job is due.")
+
+    def handle(self, *args, **options):
+        queues = [queue.strip() for queue in options["queues"].split(",")] if options["queues"] else None
+        worker_args = (options["threads"], queues, options["poll"], options["max_poll"], options["once"])
+        self.stdout.write(
+            f"Running jobs with {options['processes']} process(es) x {options['threads']} thread(s)"
+            f" on {', '.join(queues) if queues else 'all queues'}."
+        )
+        if options["processes"] <= 1:
+            _run_worker(*worker_args)
+            return
+
+        # Don't let forked children inherit open database connections.
+        connections.close_all()
+        children = [
+            multiprocessing.Process(target=_run_worker, args=worker_args, daemon=False)
+            for _ in range(options["processes"])
+        ]
+        for child in children:
+            child.start()
+        try:
+            for child in children:
+                child.join()
+        except KeyboardInterrupt:
+            for child in children:
+                child.terminate()
+                child.join()
@@ -0,0 +1,43 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database onto each read replica (a local stand-in for replication)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval", type=float, default=0,
+            help="Keep syncing every N seconds instead of running once.",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.READ_REPLICAS:
+            raise CommandError("No replicas configured; set DATABASE_REPLICAS.")
+        if settings.DATABASES["default"]["ENGINE"] != "django.db.backends.sqlite3":
+            raise CommandError("sync_replicas only supports SQLite primaries.")
+
+        while True:
+            started = time.monotonic()
+            self._sync_once()
+            self.stdout.write(f"Synced {len(settings.READ_REPLICAS)} replica(s) in {time.monotonic() - started:.3f}s")
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
+
+    def _sync_once(self):
+        # The online backup API takes a consistent snapshot without blocking
+        # writers on the primary for the whole copy.
+        source = sqlite3.connect(str(settings.DATABASES["default"]["NAME"]))
+        try:
+            for alias in settings.READ_REPLICAS:
+                target = sqlite3.connect(str(settings.DATABASES[alias]["NAME"]))
+                try:
+                    source.backup(target, pages=1024)
+                finally:
+                    target.close()
+        finally:
+            source.close()
@@ -0,0 +1,241 @@
+"""
+Media delivery with byte ranges, conditional requests and optional offload.
+
+Replaces ``django.conf.urls.static.static`` for MEDIA_URL. A single ``Range``
+(honouring ``If-Range``) gets a 206, so video seeking and resumed downloads
+only transfer what was asked for. Under WSGI the body is a bounded file handed
+to ``wsgi.file_wrapper``, which gunicorn sends with ``sendfile()``; under ASGI
+it is read in blocks off the event loop. With ``MEDIA_OFFLOAD`` set Django only
+checks access and the front-end server sends the file.
+
+Files under ``materials/`` are only served to the course instructor, staff and
+actively enrolled students: either with the JWT in the ``Authorization``
+header, or through a link from ``signed_url`` (``?sig=``), which is what
+``<a href>`` and ``<video src>`` need since they can't send headers. A signed
+link is handed out only after the same access check and expires after
+``MEDIA_SIGNED_URL_SECONDS``.
+"""
+
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import Q
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import AuthenticationFailed
+
+from users.authentication import ClaimsJWTAuthentication
+
+from .models import Material
+
+BLOCK_SIZE = 256 * 1024
+PRIVATE_PREFIXES = ("materials/",)
+
+# Names carrying a content hash (e.g. ``a1b2c3d4e5f60718.pdf``) never change
+# content, so they can be cached for good.
+_HASHED_NAME_RE = re.compile(r"(?:^|[._-])[0-9a-f]{16,}(?:[._-]|$)")
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+_authenticator = ClaimsJWTAuthentication()
+_SIGNING_SALT = "core.media"
+
+
+class _FileRange:
+    """A file object that stops reading after ``length`` bytes from its current offset."""
+
+    def __init__(self, file, length):
+        self._file = file
+        self._remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def fileno(self):
+        # gunicorn's sendfile() starts at the current offset and stops at
+        # Content-Length, so the range is sent zero-copy as well.
+        return self._file.fileno()
+
+    def close(self):
+        self._file.close()
+
+
+async def _aread(file_range):
+    try:
+        while data := await sync_to_async(file_range.read, thread_sensitive=False)(BLOCK_SIZE):
+            yield data
+    finally:
+        file_range.close()
+
+
+def byte_range(header, size):
+    """
+    Parse a ``Range`` header against a file of ``size`` bytes.
+
+    Return ``(start, end)`` (inclusive), ``None`` to ignore the header and
+    send the whole file, or ``False`` when the range can't be satisfied.
+    Multiple ranges are not supported and fall back to the whole file.
+    """
+    match = _RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            return False
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        return False
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+
+def _if_range_matches(request, etag, mtime):
+    value = request.headers.get("If-Range")
+    if value is None:
+        return True
+    if value.startswith(('"', "W/")):
+        return value == etag
+    return parse_http_date_safe(value) == mtime
+
+
+def readable_materials(user):
+    """The materials whose files ``user`` may download."""
+    if user.is_staff:
+        return Material.objects.all()
+    return Material.objects.filter(
+        Q(course__instructor=user) | Q(course__enrollment__user=user, course__enrollment__is_active=True)
+    )
+
+
+def signed_url(name):
+    """A link to media file ``name`` that works without credentials until it expires."""
+    sig = signing.dumps(name, salt=_SIGNING_SALT, compress=True)
+    return f"{settings.MEDIA_URL}{quote(name)}?sig={sig}"
+
+
+def _may_access(request, path):
+    """Return ``None`` when allowed, otherwise the error response."""
+    sig = request.GET.get("sig")
+    if sig is not None:
+        try:
+            signed = signing.loads(sig, salt=_SIGNING_SALT, max_age=settings.MEDIA_SIGNED_URL_SECONDS)
+        except signing.BadSignature:
+            signed = None
+        if signed != path:
+            return JsonResponse({"detail": "This link is invalid or has expired."}, status=403)
+        return None
+
+    try:
+        found = _authenticator.authenticate(request)
+    except AuthenticationFailed as exc:
+        return JsonResponse(exc.detail if isinstance(exc.detail, dict) else {"detail": exc.detail}, status=401)
+    if found is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+
+    if not readable_materials(found[0]).filter(file=path).exists():
+        return JsonResponse({"detail": "You do not have access to this file."}, status=403)
+    return None
+
+
+def _cache_control(path, private):
+    scope = "private" if private else "public"
+    if _HASHED_NAME_RE.search(os.path.basename(path)):
+        return f"{scope}, max-age=31536000, immutable"
+    return f"{scope}, no-cache"
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("File not found")
+    path = os.path.relpath(full_path, settings.MEDIA_ROOT).replace(os.sep, "/")
+
+    private = path.startswith(PRIVATE_PREFIXES)
+    if private:
+        denied = _may_access(request, path)
+        if denied is not None:
+            return denied
+
+    try:
+        info = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404("File not found")
+    if not stat.S_ISREG(info.st_mode):
+        raise Http404("File not found")
+
+    size, mtime = info.st_size, int(info.st_mtime)
+    etag = f'"{info.st_mtime_ns:x}-{size:x}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(mtime),
+        "Cache-Control": _cache_control(path, private),
+        "Accept-Ranges": "bytes",
+    }
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=mtime)
+    if not_modified is not None:
+        for header, value in headers.items():
+            not_modified[header] = value
+        return not_modified
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = "application/octet-stream" if encoding or not content_type else content_type
+
+    offload = getattr(settings, "MEDIA_OFFLOAD", "")
+    if offload:
+        # The front-end server handles Range itself from here on.
+        response = HttpResponse(content_type=content_type, headers=headers)
+        if offload == "x-accel-redirect":
+            response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_PREFIX + quote(path)
+        else:
+            response["X-Sendfile"] = full_path
+        return response
+
+    start, end, status = 0, size - 1, 200
+    range_header = request.headers.get("Range")
+    if range_header and _if_range_matches(request, etag, mtime):
+        requested = byte_range(range_header, size)
+        if requested is False:
+            headers["Content-Range"] = f"bytes */{size}"
+            return HttpResponse(status=416, headers=headers)
+        if requested is not None:
+            start, end = requested
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    length = end - start + 1 if size else 0
+
+    if request.method == "HEAD":
+        response = HttpResponse(status=status, content_type=content_type, headers=headers)
+        response["Content-Length"] = length
+        return response
+
+    file = open(full_path, "rb")
+    file.seek(start)
+    body = _FileRange(file, length)
+    if getattr(request, "scope", None) is not None:
+        response = StreamingHttpResponse(_aread(body), status=status, content_type=content_type, headers=headers)
+    else:
+        response = FileResponse(body, status=status, content_type=content_type, headers=headers)
+        response.block_size = BLOCK_SIZE
+    response["Content-Length"] = length
+    return response
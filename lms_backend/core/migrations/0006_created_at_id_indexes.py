@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-18 17:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_lessoncompletion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['created_at', 'id'], name='core_course_created_45bd79_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['created_at', 'id'], name='core_lesson_created_410bf4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='material',
+            index=models.Index(fields=['created_at', 'id'], name='core_materi_created_1fe0a6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='questionanswer',
+            index=models.Index(fields=['created_at', 'id'], name='core_questi_created_13b43d_idx'),
+        ),
+    ]
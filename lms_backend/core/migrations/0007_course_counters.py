@@ -0,0 +1,49 @@
+# Generated by Django 5.2 on 2026-10-18 17:33
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_counters(apps, schema_editor):
+    Course = apps.get_model('core', 'Course')
+    Lesson = apps.get_model('core', 'Lesson')
+    Enrollment = apps.get_model('core', 'Enrollment')
+    LessonCompletion = apps.get_model('core', 'LessonCompletion')
+
+    counts = {}
+    for field, rows in (
+        ('lesson_count', Lesson.objects.values('course_id').annotate(n=Count('id'))),
+        ('active_enrollment_count', Enrollment.objects.filter(is_active=True).values('course_id').annotate(n=Count('id'))),
+        ('completion_count', LessonCompletion.objects.values(course_id=models.F('lesson__course_id')).annotate(n=Count('id'))),
+    ):
+        for row in rows:
+            counts.setdefault(row['course_id'], {})[field] = row['n']
+
+    for course_id, values in counts.items():
+        Course.objects.filter(pk=course_id).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_created_at_id_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='active_enrollment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='completion_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='lesson_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-18 17:34
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_completed_lessons(apps, schema_editor):
+    Enrollment = apps.get_model('core', 'Enrollment')
+    LessonCompletion = apps.get_model('core', 'LessonCompletion')
+
+    completed = (
+        LessonCompletion.objects.filter(student=OuterRef('user'), lesson__course=OuterRef('course'))
+        .order_by()
+        .values('student')
+        .annotate(n=Count('id'))
+        .values('n')
+    )
+    Enrollment.objects.update(completed_lessons=Coalesce(Subquery(completed), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_course_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrollment',
+            name='completed_lessons',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_completed_lessons, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2 on 2026-10-18 17:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+# Keeps pk__in lists well under SQLite's bound-variable limit.
+BATCH_SIZE = 500
+
+
+def backfill_completion_course(apps, schema_editor):
+    Lesson = apps.get_model('core', 'Lesson')
+    LessonCompletion = apps.get_model('core', 'LessonCompletion')
+
+    LessonCompletion.objects.update(
+        course=Subquery(Lesson.objects.filter(pk=OuterRef('lesson_id')).values('course_id')[:1])
+    )
+
+
+def deactivate_duplicate_enrollments(apps, schema_editor):
+    # Keep the oldest active enrollment per (user, course) so the unique
+    # constraint added in the next migration can be created.
+    Enrollment = apps.get_model('core', 'Enrollment')
+
+    Course = apps.get_model('core', 'Course')
+
+    seen = set()
+    duplicates = []
+    affected = set()
+    for pk, user_id, course_id in Enrollment.objects.filter(is_active=True).order_by('id').values_list(
+        'id', 'user_id', 'course_id'
+    ).iterator():
+        if (user_id, course_id) in seen:
+            duplicates.append(pk)
+            affected.add(course_id)
+        else:
+            seen.add((user_id, course_id))
+    for start in range(0, len(duplicates), BATCH_SIZE):
+        Enrollment.objects.filter(pk__in=duplicates[start:start + BATCH_SIZE]).update(is_active=False)
+
+    # 0007 counted the duplicates into active_enrollment_count.
+    affected = sorted(affected)
+    for start in range(0, len(affected), BATCH_SIZE):
+        course_ids = affected[start:start + BATCH_SIZE]
+        counts = dict(
+            Enrollment.objects.filter(course_id__in=course_ids, is_active=True)
+            .values('course_id').annotate(n=Count('id')).values_list('course_id', 'n')
+        )
+        for course_id in course_ids:
+            Course.objects.filter(pk=course_id).update(active_enrollment_count=counts.get(course_id, 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_enrollment_completed_lessons'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lessoncompletion',
+            name='course',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.course'),
+        ),
+        migrations.RunPython(backfill_completion_course, migrations.RunPython.noop),
+        migrations.RunPython(deactivate_duplicate_enrollments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2 on 2026-10-18 17:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_lessoncompletion_course'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='lessoncompletion',
+            name='course',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, to='core.course'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['instructor', 'created_at', 'id'], name='core_course_instruc_00f61e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['user', 'course', 'is_active'], name='core_enroll_user_id_22a238_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['course'], name='core_enroll_active_course_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['course', 'created_at', 'id'], name='core_lesson_course__369de5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lessoncompletion',
+            index=models.Index(fields=['student', 'course'], name='core_lesson_student_80b090_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='material',
+            index=models.Index(fields=['course', 'created_at', 'id'], name='core_materi_course__e990c1_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='enrollment',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('user', 'course'), name='core_enroll_unique_active'),
+        ),
+    ]
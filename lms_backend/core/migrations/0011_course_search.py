@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 is SQLite-only; other backends fall back to icontains search.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE core_course_search USING fts5("
+        "title, description, category, lessons, tokenize='unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        "INSERT INTO core_course_search(rowid, title, description, category, lessons) "
+        "SELECT c.id, c.title, c.description, cat.title, "
+        "(SELECT group_concat(l.title || ' ' || l.description, ' ') FROM core_lesson l WHERE l.course_id = c.id) "
+        "FROM core_course c JOIN core_category cat ON cat.id = c.category_id"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS core_course_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_content_addressed_materials'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='banner_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 18:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(condition=models.Q(('is_certificate_ready', False), ('is_completed', True)), fields=['course'], name='core_enroll_cert_pending_idx'),
+        ),
+    ]
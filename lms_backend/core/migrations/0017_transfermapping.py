@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-18 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_enrollment_certificate_pending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransferMapping',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.UUIDField()),
+                ('model', models.CharField(max_length=20)),
+                ('old_id', models.BigIntegerField()),
+                ('new_id', models.BigIntegerField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('source', 'model', 'old_id'), name='core_transfer_unique_old_id')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-18 18:43
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_certificate_issued_at(apps, schema_editor):
+    # Certificates issued so far were last marked ready at updated_at, the
+    # closest thing to an issue date there is.
+    Enrollment = apps.get_model('core', 'Enrollment')
+    Enrollment.objects.filter(is_certificate_ready=True).update(certificate_issued_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_job_result'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrollment',
+            name='certificate_issued_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_certificate_issued_at, migrations.RunPython.noop),
+    ]
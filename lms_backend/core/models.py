@@ -1,6 +1,11 @@
+import uuid
 
 from django.db import models
+from django.db.models import BooleanField, Count, ExpressionWrapper, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils import timezone
 from users.models import User
+from .storage import material_storage
 from django.contrib.auth import get_user_model
 
 class Category(models.Model):
@@ -12,6 +17,43 @@ class Category(models.Model):
     def __str__(self):
         return self.title
 
+class CourseQuerySet(models.QuerySet):
+    def for_listing(self):
+        # Join category/instructor up front so list serialization doesn't
+        # hit the database once per course.
+        return self.select_related("category", "instructor")
+
+    def bump_counter(self, field, delta):
+        # Single UPDATE ... SET field = field + delta, so concurrent writers
+        # never lose an increment. Clamped at zero in case the column drifted.
+        return self.update(**{field: Greatest(F(field) + delta, 0)})
+
+    def recount_counters(self, *fields):
+        """Set ``fields`` (every counter by default) from a fresh count, e.g. after bulk inserts that skipped the signals."""
+        expressions = counter_expressions()
+        return self.update(**{field: expressions[field] for field in fields or expressions})
+
+
+def _count_subquery(queryset, course_field):
+    subquery = (
+        queryset.filter(**{course_field: OuterRef("pk")})
+        .order_by()
+        .values(course_field)
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return Coalesce(Subquery(subquery, output_field=models.IntegerField()), Value(0))
+
+
+def counter_expressions():
+    """Course counter field -> expression counting it from the source rows."""
+    return {
+        "lesson_count": _count_subquery(Lesson.objects.all(), "course"),
+        "active_enrollment_count": _count_subquery(Enrollment.objects.filter(is_active=True), "course"),
+        "completion_count": _count_subquery(LessonCompletion.objects.all(), "course"),
+    }
+
+
 class Course(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField()
@@ -23,7 +65,38 @@ class Course(models.Model):
     instructor = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'role': 'teacher'})
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    # Maintained by core.signals; rebuild with `manage.py rebuild_course_counters`.
+    lesson_count = models.PositiveIntegerField(default=0, editable=False)
+    active_enrollment_count = models.PositiveIntegerField(default=0, editable=False)
+    completion_count = models.PositiveIntegerField(default=0, editable=False)
+
+    COUNTER_FIELDS = ("lesson_count", "active_enrollment_count", "completion_count")
+
+    # Resized banner renditions written by core.images once generated in the
+    # background: {"source": banner name, "<size>": {"width": ..., "<format>": name}}.
+    banner_variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    objects = CourseQuerySet.as_manager()
     
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"]),
+            models.Index(fields=["instructor", "created_at", "id"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Counters are only ever changed with F() updates, and banner variants
+        # by the background resizer; a plain save of a stale instance must not
+        # write either back over those updates.
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            skip = set(self.COUNTER_FIELDS) | {"banner_variants"} | self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.attname not in skip and f.name not in skip
+            ]
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.title
 
@@ -36,6 +109,12 @@ class Lesson(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"]),
+            models.Index(fields=["course", "created_at", "id"]),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -43,15 +122,61 @@ class Material(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField()
     file_type = models.CharField(max_length=100)
-    file = models.FileField(upload_to='materials/')
+    file = models.FileField(upload_to='materials/', storage=material_storage)
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"]),
+            models.Index(fields=["course", "created_at", "id"]),
+        ]
+
     def __str__(self):
         return self.title
 
+def _progress_fields(completed, total_lessons, done):
+    # progress/is_completed as SQL expressions of the completed-lesson count,
+    # so they can be written in the same UPDATE that changes the counter.
+    if not total_lessons:
+        return {"progress": Value(0), "is_completed": Value(False)}
+    return {
+        "progress": Least(Greatest(completed * 100 / total_lessons, 0), 100),
+        "is_completed": ExpressionWrapper(done, output_field=BooleanField()),
+    }
+
+
+class EnrollmentQuerySet(models.QuerySet):
+    def advance_progress(self, delta, total_lessons):
+        """Shift completed_lessons by ``delta`` and re-derive progress in one UPDATE."""
+        completed = F("completed_lessons") + delta
+        return self.update(
+            completed_lessons=Greatest(completed, 0),
+            updated_at=timezone.now(),
+            # F() refers to the pre-update value, hence the ``- delta``.
+            **_progress_fields(completed, total_lessons, Q(completed_lessons__gte=total_lessons - delta)),
+        )
+
+    def recompute_progress(self):
+        """Full recount for these enrollments, for bulk or structural changes."""
+        completed = (
+            LessonCompletion.objects.filter(student=OuterRef("user"), course=OuterRef("course"))
+            .order_by()
+            .values("student")
+            .annotate(n=Count("pk"))
+            .values("n")
+        )
+        self.update(completed_lessons=Coalesce(Subquery(completed), 0))
+        totals = Course.objects.filter(pk__in=self.values("course_id")).values_list("pk", "lesson_count")
+        for course_id, total_lessons in totals:
+            self.filter(course_id=course_id).update(
+                updated_at=timezone.now(),
+                **_progress_fields(F("completed_lessons"), total_lessons, Q(completed_lessons__gte=total_lessons)),
+            )
+
+
 class Enrollment(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'role': 'student'})
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
@@ -61,10 +186,30 @@ class Enrollment(models.Model):
 
     price = models.FloatField(null=True, blank=True)  # ✅ fixed here
     progress = models.IntegerField(default=0)
+    completed_lessons = models.PositiveIntegerField(default=0, editable=False)
     is_completed = models.BooleanField(default=False)
     total_mark = models.FloatField(default=0)
     is_certificate_ready = models.BooleanField(default=False)
+    # The date printed on the certificate; set once, kept across re-renders.
+    certificate_issued_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = EnrollmentQuerySet.as_manager()
     
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "course", "is_active"]),
+            models.Index(fields=["course"], condition=Q(is_active=True), name="core_enroll_active_course_idx"),
+            models.Index(
+                fields=["course"], condition=Q(is_completed=True, is_certificate_ready=False),
+                name="core_enroll_cert_pending_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "course"], condition=Q(is_active=True), name="core_enroll_unique_active"
+            ),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.course.title}"
 
@@ -77,6 +222,9 @@ class QuestionAnswer(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [models.Index(fields=["created_at", "id"])]
+
     def __str__(self):
         return f"{self.user}-->{self.lesson}-->{self.description}"
 
@@ -84,7 +232,110 @@ class QuestionAnswer(models.Model):
 class LessonCompletion(models.Model):
     student = models.ForeignKey(User, on_delete=models.CASCADE)
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE)
+    # Copy of lesson.course so course-scoped lookups skip the join.
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, editable=False)
     completed_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ('student', 'lesson')
+        indexes = [models.Index(fields=["student", "course"])]
+
+    def save(self, *args, **kwargs):
+        if self.course_id is None:
+            self.course_id = self.lesson.course_id
+        super().save(*args, **kwargs)
+
+
+UPLOAD_KINDS = (
+    ("material", "Material"),
+    ("banner", "Banner"),
+)
+
+
+class Upload(models.Model):
+    """A resumable upload in progress; see core.uploads."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=UPLOAD_KINDS)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True)
+    received = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
+
+
+class Blob(models.Model):
+    """A file in content-addressed storage and the number of Materials using it."""
+    name = models.CharField(max_length=255, unique=True)
+    digest = models.CharField(max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    # Refreshed whenever identical content is saved again, so gc_blobs
+    # leaves blobs alone while a new Material may be about to reference them.
+    last_stored_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name} (x{self.ref_count})"
+
+
+JOB_STATUSES = (
+    ("queued", "Queued"),
+    ("running", "Running"),
+    ("succeeded", "Succeeded"),
+    ("failed", "Failed"),
+)
+
+
+class Job(models.Model):
+    """A unit of background work; see core.jobs."""
+    queue = models.CharField(max_length=50, default="default")
+    task = models.CharField(max_length=200)
+    kwargs = models.JSONField(default=dict, blank=True)
+    key = models.CharField(max_length=200, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=JOB_STATUSES, default="queued")
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    # What the task returned, for callers that poll the job.
+    result = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_at"]),
+            models.Index(fields=["queue", "status"]),
+        ]
+        constraints = [
+            # Idempotent enqueue: one waiting job per key.
+            models.UniqueConstraint(
+                fields=["key"], condition=Q(status="queued"), name="core_job_unique_queued_key"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.task} [{self.status}]"
+
+
+class TransferMapping(models.Model):
+    """Which row an object from a content export (see core.transfer) was imported as."""
+    source = models.UUIDField()
+    model = models.CharField(max_length=20)
+    old_id = models.BigIntegerField()
+    new_id = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["source", "model", "old_id"], name="core_transfer_unique_old_id"),
+        ]
+
+    def __str__(self):
+        return f"{self.model} {self.old_id} -> {self.new_id}"
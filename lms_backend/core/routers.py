@@ -0,0 +1,93 @@
+"""
+Primary/replica routing for GET-heavy catalog endpoints.
+
+Reads only go to a replica inside views wrapped with ``@replica_reads``;
+everything else, and every write, uses ``default``. A user who has just
+written (enrolled, completed a lesson) is pinned to the primary for
+``REPLICA_PIN_SECONDS`` so they always read their own writes. The pin lives
+in the shared ``versions`` cache, so it holds whichever worker process
+serves their next request.
+"""
+
+import random
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+_use_replica = ContextVar("use_replica", default=False)
+
+
+def reading_from_replica():
+    return _use_replica.get() and bool(settings.READ_REPLICAS)
+
+
+def _pin_key(user_id):
+    return f"lms:pin:{user_id}"
+
+
+def _pins():
+    return caches[getattr(settings, "REPLICA_PIN_CACHE_ALIAS", "versions")]
+
+
+def pin_to_primary(user):
+    if settings.READ_REPLICAS and user.is_authenticated:
+        _pins().set(_pin_key(user.pk), True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user):
+    return user.is_authenticated and _pins().get(_pin_key(user.pk)) is not None
+
+
+def replica_reads(view):
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if (
+                request.method not in ("GET", "HEAD")
+                or not settings.READ_REPLICAS
+                or await sync_to_async(is_pinned)(request.user)
+            ):
+                return await view(request, *args, **kwargs)
+            # The flag is copied into the threads the async ORM runs queries in.
+            token = _use_replica.set(True)
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _use_replica.reset(token)
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD") or not settings.READ_REPLICAS or is_pinned(request.user):
+            return view(request, *args, **kwargs)
+        token = _use_replica.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+
+    return wrapper
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # The database cache holds the catalog cache versions, which must
+        # never be read stale from a lagging replica.
+        if reading_from_replica() and model._meta.app_label != "django_cache":
+            return random.choice(settings.READ_REPLICAS)
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas are copies of the primary, so objects are interchangeable.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema along with the data from sync_replicas.
+        return db == "default"
@@ -0,0 +1,122 @@
+"""
+Full-text course search on an SQLite FTS5 index.
+
+``core_course_search`` holds one row per course (rowid = course id) with the
+course title and description, its category title and the concatenated titles
+and descriptions of its lessons. core.signals keeps it in step with the
+models; ``manage.py rebuild_search_index`` rebuilds it from scratch.
+"""
+
+import base64
+import json
+import re
+
+from django.db import connections, router
+
+from .models import Course
+
+TABLE = "core_course_search"
+
+# bm25 column weights: title, description, category, lessons.
+WEIGHTS = (10.0, 2.0, 4.0, 1.0)
+
+_DOCUMENT_SQL = f"""
+    INSERT INTO {TABLE}(rowid, title, description, category, lessons)
+    SELECT c.id, c.title, c.description, cat.title,
+           (SELECT group_concat(l.title || ' ' || l.description, ' ')
+              FROM core_lesson l WHERE l.course_id = c.id)
+      FROM core_course c JOIN core_category cat ON cat.id = c.category_id
+"""
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _write_connection():
+    return connections[router.db_for_write(Course)]
+
+
+def is_available(connection=None):
+    connection = connection or connections[router.db_for_read(Course)]
+    return connection.vendor == "sqlite"
+
+
+def index_courses(course_ids):
+    connection = _write_connection()
+    if not is_available(connection) or not course_ids:
+        return
+    course_ids = list(course_ids)
+    placeholders = ",".join(["%s"] * len(course_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE} WHERE rowid IN ({placeholders})", course_ids)
+        cursor.execute(f"{_DOCUMENT_SQL} WHERE c.id IN ({placeholders})", course_ids)
+
+
+def remove_course(course_id):
+    connection = _write_connection()
+    if not is_available(connection):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE} WHERE rowid = %s", [course_id])
+
+
+def rebuild():
+    connection = _write_connection()
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+        cursor.execute(_DOCUMENT_SQL)
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
+        cursor.execute(f"SELECT count(*) FROM {TABLE}")
+        return cursor.fetchone()[0]
+
+
+def build_match(query):
+    """Turn free text into an FTS5 query: every term must match, as a prefix."""
+    terms = _TOKEN_RE.findall(query.lower())
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def encode_cursor(score, course_id):
+    raw = json.dumps([score, course_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        score, course_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(score), int(course_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def search(query, limit, after=None):
+    """
+    Return ``([(course_id, score), ...], has_more)`` ranked best-first.
+
+    Paging is keyset on (score, course id), so a later page never re-reads
+    the rows of earlier ones through an OFFSET.
+    """
+    match = build_match(query)
+    if not match:
+        return [], False
+
+    params = [*WEIGHTS, match]
+    keyset = ""
+    if after is not None:
+        keyset = "AND (s.score > %s OR (s.score = %s AND s.id > %s))"
+        params += [after[0], after[0], after[1]]
+    params.append(limit + 1)
+
+    sql = f"""
+        SELECT s.id, s.score FROM (
+            SELECT rowid AS id, bm25({TABLE}, %s, %s, %s, %s) AS score
+              FROM {TABLE} WHERE {TABLE} MATCH %s
+        ) s
+        JOIN core_course c ON c.id = s.id AND c.is_active
+        WHERE 1 = 1 {keyset}
+        ORDER BY s.score, s.id
+        LIMIT %s
+    """
+    with connections[router.db_for_read(Course)].cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    return rows[:limit], len(rows) > limit
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from . import images
 from .models import Category, Course, Lesson, Material, Enrollment, QuestionAnswer, LessonCompletion
 
 
@@ -11,16 +12,18 @@ class CategorySerializer(serializers.ModelSerializer):
 class CourseSerializer(serializers.ModelSerializer):
     category = serializers.SerializerMethodField()
     instructor = serializers.SerializerMethodField()
-    lessons = serializers.SerializerMethodField()
+    lessons = serializers.IntegerField(source="lesson_count", read_only=True)
     image = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Course
         fields = [
             "id", "title", "description", "price", "duration", "category",
-            "instructor", "lessons", "image", "is_active", "created_at", "updated_at"
+            "instructor", "lessons", "active_enrollment_count", "completion_count",
+            "image", "image_srcset", "is_active", "created_at", "updated_at"
         ]
-        read_only_fields = ["instructor"]
+        read_only_fields = ["instructor", "active_enrollment_count", "completion_count"]
 
     def get_category(self, obj):
         return {
@@ -35,18 +38,18 @@ class CourseSerializer(serializers.ModelSerializer):
             "full_name": obj.instructor.get_full_name()
         } if obj.instructor else None
 
-    def get_lessons(self, obj):
-        from .models import Lesson
-        count = Lesson.objects.filter(course=obj).count()
-        print(f"[DEBUG] Course: {obj.id} - '{obj.title}' has {count} lessons.")
-        return count
-
     def get_image(self, obj):
         request = self.context.get("request")
         if obj.banner and request:
             return request.build_absolute_uri(obj.banner.url)
         return None
 
+    def get_image_srcset(self, obj):
+        request = self.context.get("request")
+        if not request:
+            return None
+        return images.srcset(obj, request.build_absolute_uri)
+
 
 class LessonSerializer(serializers.ModelSerializer):
     course = serializers.PrimaryKeyRelatedField(queryset=Course.objects.all())
@@ -0,0 +1,226 @@
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from users.models import User
+
+from . import images, jobs, search, tasks
+from .autocomplete import index as autocomplete_index
+from .cache import bump_version
+from .models import Blob, Category, Course, Lesson, Material, Enrollment, LessonCompletion
+
+
+def invalidate(scope, pk):
+    # Bump after commit so a concurrent reader can't rebuild the new cache
+    # version from rows that are still uncommitted.
+    transaction.on_commit(lambda: bump_version(scope, pk))
+
+
+def _bump(course_id, field, delta):
+    Course.objects.filter(pk=course_id).bump_counter(field, delta)
+    invalidate("course", course_id)
+
+
+def _recompute_progress_later(course_id):
+    # Adding or removing a lesson changes every enrollment's denominator (and
+    # a removal drops completions), so fall back to a full recount in the
+    # background. The key folds a burst of lesson edits into one job.
+    jobs.enqueue(tasks.recompute_progress, key=f"progress:{course_id}", course_id=course_id)
+
+
+@receiver(post_save, sender=Lesson)
+def lesson_created(sender, instance, created, **kwargs):
+    if created:
+        _bump(instance.course_id, "lesson_count", 1)
+        _recompute_progress_later(instance.course_id)
+
+
+def _deleted_with(origin, model):
+    """Whether the deletion that started at ``origin`` removes a ``model`` row (or queryset of them)."""
+    if isinstance(origin, models.QuerySet):
+        return origin.model is model
+    return isinstance(origin, model)
+
+
+@receiver(post_delete, sender=Lesson)
+def lesson_deleted(sender, instance, origin=None, **kwargs):
+    if _deleted_with(origin, Course):
+        return
+    # The lesson's completions were deleted just before it without touching
+    # the counters (see completion_deleted); count everything once instead.
+    Course.objects.filter(pk=instance.course_id).recount_counters()
+    invalidate("course", instance.course_id)
+    _recompute_progress_later(instance.course_id)
+
+
+@receiver(post_save, sender=Enrollment)
+def enrollment_created(sender, instance, created, **kwargs):
+    if created and instance.is_active:
+        _bump(instance.course_id, "active_enrollment_count", 1)
+        _adjust_autocomplete(instance.course_id, 1)
+
+
+@receiver(post_delete, sender=Enrollment)
+def enrollment_deleted(sender, instance, origin=None, **kwargs):
+    if instance.is_active and not _deleted_with(origin, Course):
+        _bump(instance.course_id, "active_enrollment_count", -1)
+        _adjust_autocomplete(instance.course_id, -1)
+
+
+def _adjust_autocomplete(course_id, delta):
+    transaction.on_commit(lambda: autocomplete_index.adjust_score("course", course_id, delta))
+
+
+def _lesson_count(completion):
+    # complete_lesson hands over the lesson with its course already loaded.
+    if LessonCompletion.lesson.is_cached(completion) and Lesson.course.is_cached(completion.lesson):
+        return completion.lesson.course.lesson_count
+    return Course.objects.filter(pk=completion.course_id).values_list("lesson_count", flat=True).first() or 0
+
+
+def _advance_enrollment(completion, delta):
+    course_id = completion.course_id
+    _bump(course_id, "completion_count", delta)
+    lesson_count = _lesson_count(completion)
+    Enrollment.objects.filter(user_id=completion.student_id, course_id=course_id).advance_progress(
+        delta, lesson_count
+    )
+
+
+@receiver(post_save, sender=LessonCompletion)
+def completion_created(sender, instance, created, **kwargs):
+    if created:
+        _advance_enrollment(instance, 1)
+
+
+@receiver(post_delete, sender=LessonCompletion)
+def completion_deleted(sender, instance, origin=None, **kwargs):
+    # Cascades from a course or lesson are accounted for once by the
+    # deleted parent, not once per completion.
+    if not (_deleted_with(origin, Course) or _deleted_with(origin, Lesson)):
+        _advance_enrollment(instance, -1)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def course_changed(sender, instance, **kwargs):
+    invalidate("course", instance.pk)
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+@receiver(post_save, sender=Material)
+@receiver(post_delete, sender=Material)
+def course_content_changed(sender, instance, origin=None, **kwargs):
+    if not _deleted_with(origin, Course):
+        invalidate("course", instance.course_id)
+
+
+def _ref_blob(name, delta):
+    if name:
+        Blob.objects.filter(name=name).update(ref_count=Greatest(F("ref_count") + delta, 0))
+
+
+@receiver(pre_save, sender=Material)
+def material_remember_file(sender, instance, **kwargs):
+    instance._previous_file = (
+        Material.objects.filter(pk=instance.pk).values_list("file", flat=True).first() if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Material)
+def material_file_refs(sender, instance, **kwargs):
+    previous, current = getattr(instance, "_previous_file", None), instance.file.name
+    if previous != current:
+        _ref_blob(current, 1)
+        _ref_blob(previous, -1)
+
+
+@receiver(post_delete, sender=Material)
+def material_file_released(sender, instance, **kwargs):
+    _ref_blob(instance.file.name, -1)
+
+
+@receiver(post_save, sender=Course)
+def course_banner_changed(sender, instance, **kwargs):
+    banner = instance.banner.name
+    if (instance.banner_variants or {}).get("source") == banner:
+        return
+    # save() never writes banner_variants, and a job may have filled them in
+    # since the instance was loaded.
+    previous = Course.objects.filter(pk=instance.pk).values_list("banner_variants", flat=True).first() or {}
+    if previous.get("source") == banner:
+        instance.banner_variants = previous
+        return
+    if previous:
+        Course.objects.filter(pk=instance.pk).update(banner_variants={})
+        instance.banner_variants = {}
+        transaction.on_commit(lambda: images.discard_variants(previous))
+    if banner:
+        jobs.enqueue(
+            tasks.generate_banner_variants, key=f"banner:{instance.pk}:{banner}", course_id=instance.pk, banner=banner
+        )
+
+
+@receiver(post_delete, sender=Course)
+def course_banner_deleted(sender, instance, **kwargs):
+    variants = instance.banner_variants
+    if variants:
+        transaction.on_commit(lambda: images.discard_variants(variants))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    invalidate("category", instance.pk)
+    invalidate("categories", "all")
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    # Instructor names are embedded in course payloads.
+    invalidate("user", instance.pk)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def reindex_course(sender, instance, origin=None, **kwargs):
+    if sender is Lesson and _deleted_with(origin, Course):
+        return
+    course_id = instance.pk if sender is Course else instance.course_id
+    transaction.on_commit(lambda: search.index_courses([course_id]))
+
+
+@receiver(post_delete, sender=Course)
+def unindex_course(sender, instance, **kwargs):
+    course_id = instance.pk
+    transaction.on_commit(lambda: search.remove_course(course_id))
+
+
+@receiver(post_save, sender=Category)
+def reindex_category(sender, instance, **kwargs):
+    course_ids = list(Course.objects.filter(category=instance).values_list("pk", flat=True))
+    transaction.on_commit(lambda: search.index_courses(course_ids))
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=Category)
+def update_autocomplete(sender, instance, **kwargs):
+    kind = "course" if sender is Course else "category"
+    pk, title, is_active = instance.pk, instance.title, instance.is_active
+    if is_active:
+        transaction.on_commit(lambda: autocomplete_index.upsert(kind, pk, title))
+    else:
+        transaction.on_commit(lambda: autocomplete_index.remove(kind, pk))
+
+
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=Category)
+def remove_from_autocomplete(sender, instance, **kwargs):
+    kind = "course" if sender is Course else "category"
+    pk = instance.pk
+    transaction.on_commit(lambda: autocomplete_index.remove(kind, pk))
@@ -0,0 +1,131 @@
+"""
+Content-addressed storage for material files.
+
+Every file is hashed (SHA-256) as it is written and stored once, under
+``materials/<d[:2]>/<digest><ext>``; saving the same bytes again returns the
+existing name instead of another copy. The digest in the name also makes the
+URL immutable, so core.media serves it with a year-long cache lifetime.
+
+A :class:`~core.models.Blob` row records each stored file and how many
+``Material`` rows point at it (kept up to date by core.signals); blobs that
+drop to zero references are removed by ``manage.py gc_blobs``.
+"""
+
+import errno
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+BLOCK_SIZE = 1024 * 1024
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def __init__(self, prefix="materials", **kwargs):
+        self.prefix = prefix
+        super().__init__(**kwargs)
+
+    def blob_name(self, digest, name):
+        extension = os.path.splitext(name)[1].lower()
+        return f"{self.prefix}/{digest[:2]}/{digest}{extension}"
+
+    def get_available_name(self, name, max_length=None):
+        # The final name comes from the content in _save(); identical
+        # content is meant to land on the same name.
+        return name
+
+    def _save(self, name, content):
+        if hasattr(content, "temporary_file_path"):
+            # Already on disk (resumable or large multipart uploads): hash it
+            # in place and move it, unless the upload passed along a digest
+            # it already verified.
+            digest = getattr(content, "sha256", None) or _digest_file(content.temporary_file_path())
+            size = os.path.getsize(content.temporary_file_path())
+            target = self.blob_name(digest, name)
+            if not self.exists(target):
+                self._move(content, target)
+        else:
+            digest, size, staged = self._stage(content)
+            target = self.blob_name(digest, name)
+            full_path = self.path(target)
+            if os.path.exists(full_path):
+                os.remove(staged)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                os.replace(staged, full_path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(full_path, self.file_permissions_mode)
+        _register_blob(digest, target, size)
+        return target
+
+    def _move(self, content, target):
+        """
+        Move the file behind ``content`` to ``target`` unless the same blob
+        got there first. FileSystemStorage._save would retry the unchanged
+        name forever in that race, since get_available_name() keeps it.
+        """
+        full_path = self.path(target)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        source = content.temporary_file_path()
+        try:
+            # link() is atomic and never overwrites: losing the race to an
+            # identical blob is simply a dedup hit.
+            os.link(source, full_path)
+        except FileExistsError:
+            return
+        except OSError as exc:
+            if exc.errno not in (errno.EXDEV, errno.EPERM, errno.ENOTSUP):
+                raise
+            # Temp dir on another filesystem (or no hard links): copy next
+            # to the blobs first.
+            _, _, staged = self._stage(content)
+            try:
+                os.link(staged, full_path)
+            except FileExistsError:
+                return
+            finally:
+                os.remove(staged)
+        else:
+            os.remove(source)
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+
+    def _stage(self, content):
+        """Copy ``content`` to a temp file next to the blobs, hashing as it streams."""
+        staging = self.path(f"{self.prefix}/.incoming")
+        os.makedirs(staging, exist_ok=True)
+        digest, size = hashlib.sha256(), 0
+        handle, staged = tempfile.mkstemp(dir=staging)
+        try:
+            with os.fdopen(handle, "wb") as out:
+                for chunk in content.chunks(BLOCK_SIZE):
+                    out.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.remove(staged)
+            raise
+        return digest.hexdigest(), size, staged
+
+
+def _digest_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        while block := source.read(BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _register_blob(digest, name, size):
+    from .models import Blob
+
+    blob, created = Blob.objects.get_or_create(name=name, defaults={"digest": digest, "size": size})
+    if not created:
+        Blob.objects.filter(pk=blob.pk).update(last_stored_at=timezone.now())
+
+
+material_storage = ContentAddressedStorage()
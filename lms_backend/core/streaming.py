@@ -0,0 +1,64 @@
+"""
+Streaming JSON arrays for unbounded listings.
+
+Rows are read with a chunked iterator, serialized ``chunk_size`` at a time and
+written out as they are produced, so memory use depends on the chunk size
+rather than on the number of rows. Under ASGI the body is produced by an async
+generator; Django would otherwise buffer a sync iterator in full before
+sending it.
+"""
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+
+CHUNK_SIZE = 500
+
+
+def use_streaming(request):
+    return request.query_params.get("pagination") == "stream"
+
+
+def _render(serializer_class, batch, context, first):
+    # Render the batch as one array and drop its brackets to splice it in.
+    body = JSONRenderer().render(serializer_class(batch, many=True, context=context).data)[1:-1]
+    return body if first else b"," + body
+
+
+def _sync_body(queryset, serializer_class, context, chunk_size):
+    yield b"["
+    batch, first = [], True
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        batch.append(obj)
+        if len(batch) == chunk_size:
+            yield _render(serializer_class, batch, context, first)
+            batch, first = [], False
+    if batch:
+        yield _render(serializer_class, batch, context, first)
+    yield b"]"
+
+
+async def _async_body(queryset, serializer_class, context, chunk_size):
+    yield b"["
+    batch, first = [], True
+    async for obj in queryset.aiterator(chunk_size=chunk_size):
+        batch.append(obj)
+        if len(batch) == chunk_size:
+            yield _render(serializer_class, batch, context, first)
+            batch, first = [], False
+    if batch:
+        yield _render(serializer_class, batch, context, first)
+    yield b"]"
+
+
+def stream_json_array(request, queryset, serializer_class, context=None, chunk_size=CHUNK_SIZE):
+    """
+    Return a response whose body is ``serializer_class(queryset, many=True)``
+    as a JSON array, rendered incrementally. The serializer must not issue
+    per-row queries; select_related/prefetch_related what it needs.
+    """
+    context = context or {}
+    if getattr(request, "scope", None) is not None:
+        body = _async_body(queryset, serializer_class, context, chunk_size)
+    else:
+        body = _sync_body(queryset, serializer_class, context, chunk_size)
+    return StreamingHttpResponse(body, content_type="application/json")
@@ -0,0 +1,34 @@
+"""Background tasks run by core.jobs workers."""
+
+import logging
+
+from PIL import UnidentifiedImageError
+
+from . import certificates, images
+from .jobs import task
+from .models import Enrollment
+
+logger = logging.getLogger(__name__)
+
+
+@task(queue="progress")
+def recompute_progress(course_id):
+    Enrollment.objects.filter(course_id=course_id).recompute_progress()
+
+
+@task(queue="images", max_attempts=3, timeout=600)
+def generate_banner_variants(course_id, banner):
+    try:
+        variants = images.render_variants(banner)
+    except UnidentifiedImageError:
+        # Retrying won't make it an image.
+        logger.warning("Banner %s of course %s is not a readable image", banner, course_id)
+        return
+    if not images.apply_variants(course_id, variants):
+        # The banner changed while rendering.
+        images.discard_variants(variants)
+
+
+@task(queue="certificates", max_attempts=3, timeout=1800)
+def issue_certificates(course_id):
+    certificates.issue(Enrollment.objects.filter(course_id=course_id))
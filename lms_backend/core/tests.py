@@ -1,3 +1,1478 @@
-from django.test import TestCase
+import base64
+import datetime
+import hashlib
+import io
+import json
+import os
+import shutil
+import signal
+import tempfile
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, connection, router, transaction
+from django.http import QueryDict
+from django.contrib.auth.models import AnonymousUser
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from users.authentication import ClaimsTokenObtainPairSerializer
+from users.models import User
+
+from . import autocomplete, certificates, images, enrollments, jobs, tasks, transfer, uploads
+from .cache import cache_stats, cached_payload, check_version_cache
+from .media import byte_range
+from .models import Blob, Category, Course, Enrollment, Job, Lesson, LessonCompletion, Material, QuestionAnswer
+from .routers import is_pinned, pin_to_primary, replica_reads
+from .serializers import CourseSerializer, QuestionAnswerSerializer
+from .signals import invalidate
+from .storage import ContentAddressedStorage
+from .streaming import stream_json_array
+from .uploads import _PartFile
+from .writequeue import WriteQueue
+
+
+def make_course(instructor, category=None, title="Course", lessons=0, **fields):
+    category = category or Category.objects.create(title="Category")
+    course = Course.objects.create(
+        title=title, description="d", banner="course_banners/b.png", price=10, duration=1,
+        category=category, instructor=instructor, **fields,
+    )
+    Lesson.objects.bulk_create(
+        Lesson(title=f"Lesson {index}", description="d", video="v", course=course) for index in range(lessons)
+    )
+    Course.objects.filter(pk=course.pk).recount_counters()
+    course.refresh_from_db()
+    return course
+
+
+def make_students(count, prefix="student"):
+    return User.objects.bulk_create(User(username=f"{prefix}{index}", role="student") for index in range(count))
+
+
+def png_bytes(size=(40, 30)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "red").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def bearer(user):
+    return f"Bearer {ClaimsTokenObtainPairSerializer.get_token(user).access_token}"
+
+
+@jobs.task(queue="test", max_attempts=2, timeout=60)
+def sample_task(fail=False):
+    if fail:
+        raise ValueError("boom")
+    return {"ok": True}
+
+
+class TempMediaMixin:
+    """Point MEDIA_ROOT and UPLOAD_TEMP_DIR at a throwaway directory."""
+
+    def setUp(self):
+        super().setUp()
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        override = self.settings(
+            MEDIA_ROOT=os.path.join(root, "media"), UPLOAD_TEMP_DIR=os.path.join(root, "uploads")
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+
+@contextmanager
+def deadline(seconds):
+    """Fail instead of hanging when the block takes longer than ``seconds``."""
+    def expire(signum, frame):
+        raise AssertionError(f"Did not finish within {seconds}s")
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.alarm(seconds)
+    try:
+        yield
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+class CascadeDeleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher", password="x", role="teacher")
+        cls.course = make_course(cls.teacher, lessons=5)
+        cls.lessons = list(Lesson.objects.filter(course=cls.course))
+        students = make_students(200)
+        Enrollment.objects.bulk_create(Enrollment(user=student, course=cls.course) for student in students)
+        LessonCompletion.objects.bulk_create(
+            LessonCompletion(student=student, lesson=lesson, course=cls.course)
+            for student in students for lesson in cls.lessons
+        )
+        Course.objects.filter(pk=cls.course.pk).recount_counters()
+        Enrollment.objects.filter(course=cls.course).recompute_progress()
+
+    def test_course_delete_skips_per_row_bookkeeping(self):
+        # Collecting and batch-deleting the related rows (100 per DELETE);
+        # no counter or progress update per enrollment or completion.
+        with self.assertNumQueries(20):
+            self.course.delete()
+        self.assertFalse(LessonCompletion.objects.exists())
+
+    def test_lesson_delete_recounts_once(self):
+        # Delete the completions and the lesson, one recount, one progress job.
+        with self.assertNumQueries(10):
+            self.lessons[0].delete()
+        self.course.refresh_from_db()
+        self.assertEqual(
+            (self.course.lesson_count, self.course.active_enrollment_count, self.course.completion_count),
+            (4, 200, 800),
+        )
+        job = Job.objects.get(key=f"progress:{self.course.pk}")
+        jobs.execute(job)
+        self.assertEqual(set(Enrollment.objects.values_list("completed_lessons", "progress")), {(4, 100)})
+
+    def test_completion_delete_still_updates_progress(self):
+        completion = LessonCompletion.objects.filter(lesson=self.lessons[0]).select_related("student").first()
+        completion.delete()
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.completion_count, 999)
+        enrollment = Enrollment.objects.get(user=completion.student, course=self.course)
+        self.assertEqual((enrollment.completed_lessons, enrollment.progress), (4, 80))
+
+
+class ResumableUploadTests(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher", password="x", role="teacher")
+        cls.course = make_course(cls.teacher)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+
+    def _start(self, kind, filename, size, **fields):
+        response = self.client.post("/api/uploads/", {"kind": kind, "filename": filename, "size": size, **fields})
+        self.assertEqual(response.status_code, 201, response.data)
+        return f"/api/uploads/{response.data['id']}/"
+
+    def _patch(self, url, chunk, offset, **headers):
+        return self.client.generic(
+            "PATCH", url, chunk, content_type="application/offset+octet-stream",
+            HTTP_UPLOAD_OFFSET=str(offset), **headers,
+        )
+
+    def _upload(self, kind, filename, data, **fields):
+        url = self._start(kind, filename, len(data))
+        for offset in range(0, len(data), 100):
+            response = self._patch(url, data[offset:offset + 100], offset)
+            self.assertEqual(response.status_code, 200, response.data)
+        return self.client.post(f"{url}finalize/", {"course": self.course.pk, **fields})
+
+    def test_banner_upload_is_stored(self):
+        response = self._upload("banner", "cover.png", png_bytes())
+        self.assertEqual(response.status_code, 200, response.data)
+        self.course.refresh_from_db()
+        self.assertTrue(self.course.banner.name.endswith(".png"))
+        self.assertTrue(os.path.exists(self.course.banner.path))
+
+    def test_banner_with_non_image_extension_is_refused_up_front(self):
+        response = self.client.post("/api/uploads/", {"kind": "banner", "filename": "evil.html", "size": 10})
+        self.assertEqual(response.status_code, 400)
+
+    def test_non_image_banner_is_rejected(self):
+        response = self._upload("banner", "evil.png", b"<script>alert(document.cookie)</script>" * 10)
+        self.assertEqual(response.status_code, 400)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.banner.name, "course_banners/b.png")
+
+    def test_banner_extension_must_match_content(self):
+        response = self._upload("banner", "cover.gif", png_bytes())
+        self.assertEqual(response.status_code, 400)
+
+    def test_material_upload_is_not_image_checked(self):
+        response = self._upload(
+            "material", "notes.pdf", b"%PDF-1.4 notes" * 30, title="Notes", description="d", file_type="pdf"
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def test_resume_from_the_server_offset(self):
+        data = b"x" * 300
+        url = self._start("material", "a.pdf", 300)
+        self.assertEqual(self._patch(url, data[:100], 0).status_code, 200)
+        # A retried chunk the server already has is refused with the real offset.
+        response = self._patch(url, data[:100], 0)
+        self.assertEqual((response.status_code, response.data["offset"]), (409, 100))
+        self.assertEqual(self.client.get(url)["Upload-Offset"], "100")
+
+        bad = "sha256 " + base64.b64encode(hashlib.sha256(b"other").digest()).decode()
+        self.assertEqual(self._patch(url, data[100:], 100, HTTP_UPLOAD_CHECKSUM=bad).status_code, 460)
+        good = "sha256 " + base64.b64encode(hashlib.sha256(data[100:]).digest()).decode()
+        response = self._patch(url, data[100:], 100, HTTP_UPLOAD_CHECKSUM=good)
+        self.assertEqual(response["Upload-Offset"], "300")
+
+    def test_declared_digest_is_checked_on_finalize(self):
+        url = self._start("material", "a.pdf", 3, sha256="0" * 64)
+        self._patch(url, b"abc", 0)
+        response = self.client.post(
+            f"{url}finalize/", {"course": self.course.pk, "title": "A", "description": "d", "file_type": "pdf"}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Material.objects.exists())
+
+    def test_large_upload_memory_is_bounded(self):
+        class Zeros:
+            def read(self, size):
+                return bytes(size)
+
+        chunk = settings.UPLOAD_CHUNK_MAX_BYTES
+        size = 4 * chunk
+        upload = uploads.start(self.teacher, "material", "lecture.mp4", size)
+        tracemalloc.start()
+        try:
+            for offset in range(0, size, chunk):
+                uploads.append(upload, offset, Zeros(), chunk)
+            material = Material(title="Lecture", description="d", file_type="video", course=self.course)
+            uploads.finish(upload, material.file)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        # A few read blocks at most, never a chunk or the whole file.
+        self.assertLess(peak, 4 * uploads.BLOCK_SIZE)
+        self.assertEqual(material.file.size, size)
+        self.assertFalse(os.path.exists(uploads.part_path(upload)))
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        self.storage = ContentAddressedStorage(location=os.path.join(self.root, "media"))
+
+    def _part(self, data):
+        handle, path = tempfile.mkstemp(dir=self.root)
+        with os.fdopen(handle, "wb") as part:
+            part.write(data)
+        part_file = _PartFile(open(path, "rb"))
+        self.addCleanup(part_file.close)
+        return part_file
+
+    def test_identical_content_is_stored_once(self):
+        first = self.storage.save("a.pdf", self._part(b"same"))
+        second = self.storage.save("b.pdf", self._part(b"same"))
+        self.assertEqual(first, second)
+        self.assertEqual(Blob.objects.get().name, first)
+
+    def test_concurrent_identical_move_is_a_dedup_hit(self):
+        first = self.storage.save("a.pdf", self._part(b"same"))
+        # Simulate the other writer landing between the exists() check and
+        # the move.
+        with mock.patch.object(self.storage, "exists", return_value=False), deadline(5):
+            second = self.storage.save("b.pdf", self._part(b"same"))
+        self.assertEqual(second, first)
+        with self.storage.open(first) as stored:
+            self.assertEqual(stored.read(), b"same")
+
+
+class ListingQueryTests(TestCase):
+    # Queries per listing once the token version is cached: courses with
+    # their category and instructor joined, plus the enrollments for students.
+    BUDGETS = {
+        "/api/courses/": 1,
+        "/api/courses/?pagination=cursor": 1,
+        "/api/teacher/courses/": 1,
+        "/api/teacher/courses/?pagination=cursor": 1,
+        "/api/student/courses/": 2,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher", password="x", role="teacher")
+        cls.student = User.objects.create_user("student", password="x", role="student")
+
+    def setUp(self):
+        caches["default"].clear()
+        self.client = APIClient()
+
+    def _add_courses(self, count):
+        for index in range(count):
+            instructor = User.objects.create_user(f"i{Course.objects.count()}", role="teacher")
+            for owner in (instructor, self.teacher):
+                course = make_course(owner, title=f"Course {index}", lessons=2)
+                Enrollment.objects.create(user=self.student, course=course)
+
+    def _queries(self, url):
+        user = self.student if "student" in url else self.teacher
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(user))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            # Streamed listings query while the body is produced.
+            b"".join(response.streaming_content) if response.streaming else response.content
+        return len(queries)
+
+    def test_listing_query_budget_does_not_grow_with_courses(self):
+        self._add_courses(2)
+        for url in self.BUDGETS:
+            self._queries(url)  # warm the token version cache
+        self.assertEqual({url: self._queries(url) for url in self.BUDGETS}, self.BUDGETS)
+        self._add_courses(10)
+        self.assertEqual({url: self._queries(url) for url in self.BUDGETS}, self.BUDGETS)
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher", password="x", role="teacher")
+        cls.category = Category.objects.create(title="Category")
+        for index in range(23):
+            make_course(cls.teacher, cls.category, title=f"Course {index}")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+
+    def _walk(self, url, on_page=None):
+        ids, sql = [], []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                page = self.client.get(url).json()
+            sql.append([query["sql"] for query in queries])
+            ids += [course["id"] for course in page["results"]]
+            url = page["next"]
+            if on_page:
+                on_page(url)
+        return ids, sql
+
+    def test_pages_cover_the_catalog_newest_first(self):
+        ids, _ = self._walk("/api/courses/?pagination=cursor&limit=5")
+        self.assertEqual(ids, list(Course.objects.order_by("-created_at", "-id").values_list("id", flat=True)))
+
+    def test_inserts_while_paging_neither_repeat_nor_skip(self):
+        before = list(Course.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+
+        def insert(next_url):
+            self.assertNotRegex(next_url or "", r"cursor=\d+(&|$)")  # opaque, not an offset
+            make_course(self.teacher, self.category, title="New")
+
+        ids, _ = self._walk("/api/courses/?pagination=cursor&limit=5", insert)
+        self.assertEqual(ids, before)
+
+    def test_deep_pages_cost_the_same_as_the_first(self):
+        _, sql = self._walk("/api/courses/?pagination=cursor&limit=5")
+        self.assertEqual(len(sql), 5)
+        self.assertEqual({len(queries) for queries in sql}, {1})
+        # Later pages seek on created_at instead of skipping rows.
+        self.assertNotIn("OFFSET", sql[-1][0])
+        self.assertIn('"created_at" <', sql[-1][0])
+
+
+@skipUnless(connection.vendor == "sqlite", "Query plans are SQLite's")
+class HotPathIndexTests(TestCase):
+    def _plan(self, queryset):
+        plan = queryset.explain()
+        self.assertNotRegex(plan, r"\bSCAN\b")  # no full table scans
+        return plan
+
+    def _index(self, model, fields):
+        return next(index.name for index in model._meta.indexes if index.fields == fields)
+
+    def test_hot_queries_use_the_composite_and_partial_indexes(self):
+        cases = [
+            # enroll_in_course / complete_lesson: the active enrollment.
+            (Enrollment.objects.filter(user_id=1, course_id=1, is_active=True), "core_enroll_unique_active"),
+            # Active enrollment counts per course.
+            (Enrollment.objects.filter(course_id=1, is_active=True), "core_enroll_active_course_idx"),
+            # Certificates still to issue for a course.
+            (
+                Enrollment.objects.filter(course_id=1, is_completed=True, is_certificate_ready=False),
+                "core_enroll_cert_pending_idx",
+            ),
+            # A student's completions in a course, without joining Lesson.
+            (
+                LessonCompletion.objects.filter(student_id=1, course_id=1),
+                self._index(LessonCompletion, ["student", "course"]),
+            ),
+        ]
+        for queryset, index in cases:
+            with self.subTest(index=index):
+                self.assertIn(f"USING INDEX {index} ", self._plan(queryset))
+
+    def test_per_parent_listings_are_read_in_index_order(self):
+        cases = [
+            (Lesson.objects.filter(course_id=1), self._index(Lesson, ["course", "created_at", "id"])),
+            (Course.objects.filter(instructor_id=1), self._index(Course, ["instructor", "created_at", "id"])),
+        ]
+        for queryset, index in cases:
+            with self.subTest(index=index):
+                plan = self._plan(queryset.order_by("-created_at", "-id"))
+                self.assertIn(f"USING INDEX {index} ", plan)
+                self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_only_one_active_enrollment_per_student_and_course(self):
+        teacher = User.objects.create_user("teacher", password="x", role="teacher")
+        course = make_course(teacher)
+        student = make_students(1)[0]
+        Enrollment.objects.create(user=student, course=course, is_active=False)
+        Enrollment.objects.create(user=student, course=course)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Enrollment.objects.create(user=student, course=course)
+
+    def test_teacher_materials_are_found_through_their_courses(self):
+        plan = self._plan(Material.objects.filter(course__instructor_id=1))
+        self.assertIn("SEARCH core_course", plan)
+        self.assertIn("SEARCH core_material", plan)
+
+
+@skipUnless(connection.vendor == "sqlite", "SQLite connection settings")
+class SQLiteTuningTests(TestCase):
+    def test_connections_are_tuned(self):
+        with connection.cursor() as cursor:
+            pragmas = {}
+            for name in ("synchronous", "temp_store", "busy_timeout"):
+                cursor.execute(f"PRAGMA {name}")
+                pragmas[name] = cursor.fetchone()[0]
+        # NORMAL, MEMORY, and the configured timeout in milliseconds.
+        self.assertEqual(pragmas, {"synchronous": 1, "temp_store": 2, "busy_timeout": 20000})
+
+
+class WriteQueueTests(TransactionTestCase):
+    def test_concurrent_writes_are_committed_in_batches(self):
+        queue = WriteQueue(max_batch=64, max_wait=0.05)
+        batches = []
+        next_batch = queue._next_batch
+
+        def record():
+            batch = next_batch()
+            batches.append(len(batch))
+            return batch
+
+        def create(index):
+            if index == 7:
+                raise ValueError("bad row")
+            return Category.objects.create(title=f"Category {index}").pk
+
+        with mock.patch.object(queue, "_next_batch", record), ThreadPoolExecutor(20) as pool:
+            futures = [pool.submit(lambda index=index: queue.submit(create, index).result()) for index in range(20)]
+            results = [future.exception() or future.result() for future in futures]
+
+        # The failed write is reported to its caller alone; the rest commit.
+        self.assertIsInstance(results.pop(7), ValueError)
+        self.assertEqual(sorted(results), sorted(Category.objects.values_list("pk", flat=True)))
+        self.assertEqual(sum(batches), 20)
+        self.assertLess(len(batches), 20)
+
+
+@override_settings(READ_REPLICAS=["replica1"], REPLICA_PIN_SECONDS=5)
+class ReplicaRoutingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher", password="x", role="teacher")
+        cls.student = User.objects.create_user("student", password="x", role="student")
+        cls.course = make_course(cls.teacher)
+
+    def setUp(self):
+        caches["default"].clear()
+
+    def _routed(self, method="get", user=None):
+        # Which database a catalog read would use inside a @replica_reads view.
+        @replica_reads
+        def view(request):
+            return router.db_for_read(Course), router.db_for_read(caches["versions"].cache_model_class)
+
+        request = getattr(RequestFactory(), method)("/")
+        request.user = user or AnonymousUser()
+        return view(request)
+
+    def test_catalog_reads_go_to_a_replica(self):
+        self.assertEqual(self._routed(), ("replica1", "default"))
+        # Outside such views, and for writes, everything uses the primary.
+        self.assertEqual(router.db_for_read(Course), "default")
+        self.assertEqual(self._routed("post"), ("default", "default"))
+
+    def test_writers_read_their_own_writes(self):
+        client = APIClient()
+        client.force_authenticate(self.student)
+        response = client.post("/api/student/enroll/", {"course_id": self.course.pk}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(is_pinned(self.student))
+        self.assertEqual(self._routed(user=self.student), ("default", "default"))
+        self.assertEqual(self._routed(user=self.teacher), ("replica1", "default"))
+
+    def test_pins_are_shared_between_processes(self):
+        pin_to_primary(self.student)
+        # A fresh backend instance stands in for another worker process.
+        other = caches.create_connection("versions")
+        with mock.patch("core.routers._pins", return_value=other):
+            self.assertTrue(is_pinned(self.student))
+            self.assertFalse(is_pinned(self.teacher))
+
+
+@skipUnless(connection.vendor == "sqlite", "FTS5 index")
+class CourseSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher", password="x", role="teacher")
+        cls.category = Category.objects.create(title="Mathematics")
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def _course(self, title, description="d", **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Course.objects.create(
+                title=title, description=description, banner="course_banners/b.png", price=1, duration=1,
+                category=self.category, instructor=self.teacher, **fields,
+            )
+
+    def _search(self, query, **params):
+        response = self.client.get("/api/courses/search/", {"q": query, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def _titles(self, query):
+        return [course["title"] for course in self._search(query)["results"]]
+
+    def test_prefix_terms_ranked_by_field(self):
+        self._course("Linear algebra", "Vectors and matrices")
+        self._course("Statistics", "Uses a little algebra")
+        self._course("Poetry", "Sonnets")
+        self._course("Hidden algebra", is_active=False)
+        # Title hits outrank description hits; inactive courses never show.
+        self.assertEqual(self._titles("alg"), ["Linear algebra", "Statistics"])
+        self.assertEqual(self._titles("algebra matri"), ["Linear algebra"])
+        self.assertEqual(len(self._titles("mathematics")), 3)
+
+    def test_index_follows_lessons_and_deletes(self):
+        course = self._course("Chemistry")
+        self.assertEqual(self._titles("titration"), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Lesson.objects.create(title="Titration", description="d", video="v", course=course)
+        self.assertEqual(self._titles("titration"), ["Chemistry"])
+        with self.captureOnCommitCallbacks(execute=True):
+            course.delete()
+        self.assertEqual(self._titles("chemistry"), [])
+
+    def test_keyset_pages(self):
+        for index in range(5):
+            self._course(f"Geometry {index}", "geometry " * index)
+        everything = [course["id"] for course in self._search("geometry")["results"]]
+        paged, params = [], {"limit": 2}
+        while True:
+            page = self._search("geometry", **params)
+            paged += [course["id"] for course in page["results"]]
+            if not page["next"]:
+                break
+            params["cursor"] = QueryDict(page["next"].split("?", 1)[1])["cursor"]
+        self.assertEqual(paged, everything)
+        self.assertEqual(len(paged), 5)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.get("/api/courses/search/").status_code, 400)
+        self.assertEqual(self.client.get("/api/courses/search/", {"q": "x", "cursor": "nope"}).status_code, 400)
+
+
+class AutocompleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher", password="x", role="teacher")
+        cls.category = Category.objects.create(title="Programming")
+        cls.basics = make_course(cls.teacher, cls.category, "Python Basics")
+        cls.patterns = make_course(cls.teacher, cls.category, "Pythonic Patterns")
+        java = make_course(cls.teacher, cls.category, "Java Streams")
+        for course, count in ((cls.basics, 5), (cls.patterns, 9), (java, 1)):
+            Course.objects.filter(pk=course.pk).update(active_enrollment_count=count)
+
+    def setUp(self):
+        self.addCleanup(autocomplete.index.__init__)
+        autocomplete.index.build()
+
+    def _titles(self, query, limit=8):
+        response = APIClient().get("/api/courses/autocomplete/", {"q": query, "limit": limit})
+        self.assertEqual(response.status_code, 200)
+        return [result["title"] for result in response.json()["results"]]
+
+    def test_prefix_match_ranked_by_enrollments(self):
+        self.assertEqual(self._titles("PYT"), ["Pythonic Patterns", "Python Basics"])
+        self.assertEqual(self._titles("pyt", limit=1), ["Pythonic Patterns"])
+        self.assertEqual(self._titles("python ba"), ["Python Basics"])
+        # Categories rank by the enrollments of their courses.
+        self.assertEqual(self._titles("pro"), ["Programming"])
+        self.assertEqual(self._titles("st"), ["Java Streams"])
+        self.assertEqual(self._titles("ruby"), [])
+
+    def test_signals_keep_the_index_current(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.basics.title = "Rust Basics"
+            self.basics.save()
+        self.assertEqual(self._titles("pyt"), ["Pythonic Patterns"])
+        self.assertEqual(self._titles("rus"), ["Rust Basics"])
+
+        course = make_course(self.teacher, self.category, "Pyramids")
+        self.assertEqual(self._titles("pyr"), [])  # not committed yet
+        with self.captureOnCommitCallbacks(execute=True):
+            course.save()
+            for student in make_students(10):
+                Enrollment.objects.create(user=student, course=course)
+        self.assertEqual(self._titles("py"), ["Pyramids", "Pythonic Patterns"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            course.delete()
+            self.patterns.is_active = False
+            self.patterns.save()
+        self.assertEqual(self._titles("py"), [])
+
+    @override_settings(AUTOCOMPLETE_MAX_ENTRIES=3)
+    def test_entries_are_capped(self):
+        autocomplete.index.build()
+        # Three courses and a category: the lowest-ranked course is left out.
+        self.assertEqual(self._titles("java"), [])
+        self.assertEqual(self._titles("pro"), ["Programming"])
+
+        autocomplete.index.upsert("course", 1000, "Python Advanced", 0)
+        self.assertEqual(self._titles("python a"), [])
+        autocomplete.index.upsert("course", 1000, "Python Advanced", 7)
+        self.assertEqual(self._titles("pyt"), ["Pythonic Patterns", "Python Advanced"])
+        self.assertEqual(len(autocomplete.index._entries), 3)
+
+    def test_cold_lookups_do_not_build_inline(self):
+        autocomplete.index.__init__()
+        with mock.patch("core.autocomplete.threading.Thread") as thread:
+            with self.assertNumQueries(0):
+                self.assertEqual(self._titles("pyt"), [])
+                self.assertEqual(self._titles("pyt"), [])
+        thread.return_value.start.assert_called_once_with()
+
+
+class AsyncReadViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher", password="x", role="teacher")
+        cls.student = User.objects.create_user("student", password="x", role="student")
+        cls.course = make_course(cls.teacher, lessons=4)
+        lessons = list(Lesson.objects.filter(course=cls.course).order_by("pk"))
+        Enrollment.objects.create(user=cls.student, course=cls.course, progress=50)
+        LessonCompletion.objects.bulk_create(
+            LessonCompletion(student=cls.student, lesson=lesson, course=cls.course) for lesson in lessons[:2]
+        )
+        cls.completed = [lesson.pk for lesson in lessons[:2]]
+
+    async def test_student_endpoints(self):
+        headers = {"Authorization": await sync_to_async(bearer)(self.student)}
+        response = await self.async_client.get("/api/student/courses/", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["course"]["id"] for row in response.json()], [self.course.pk])
+
+        response = await self.async_client.get(f"/api/student/progress/{self.course.pk}/", headers=headers)
+        self.assertEqual(response.json(), {"progress_percent": 50, "is_completed": False})
+
+        response = await self.async_client.get(f"/api/student/completed-lessons/{self.course.pk}/", headers=headers)
+        self.assertEqual(sorted(response.json()), self.completed)
+
+    async def test_authentication_and_methods(self):
+        response = await self.async_client.get("/api/student/courses/")
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("Bearer", response["WWW-Authenticate"])
+        response = await self.async_client.get("/api/student/courses/", headers={"Authorization": "Bearer junk"})
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.post(f"/api/courses/{self.course.pk}/lessons/")
+        self.assertEqual((response.status_code, response["Allow"]), (405, "GET, HEAD"))
+
+    async def test_public_reads(self):
+        response = await self.async_client.get(f"/api/courses/{self.course.pk}/")
+        self.assertEqual(response.json()["lessons"], 4)
+        response = await self.async_client.get(f"/api/courses/{self.course.pk}/lessons/")
+        self.assertEqual(response.status_code, 200)
+        response = await self.async_client.get("/api/courses/0/")
+        self.assertEqual(response.status_code, 404)
+
+
+class CohortEnrollmentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher", password="x", role="teacher")
+        cls.course = make_course(cls.teacher)
+        cls.students = make_students(5)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+
+    def _enroll(self, data, **kwargs):
+        return self.client.post(f"/api/courses/{self.course.pk}/enrollments/", data, **kwargs)
+
+    def test_enroll_by_ids(self):
+        Enrollment.objects.create(user=self.students[0], course=self.course)
+        ids = [student.pk for student in self.students] + [self.students[1].pk, self.teacher.pk, 0, "x"]
+        response = self._enroll({"user_ids": ids}, format="json")
+        self.assertEqual(response.status_code, 201)
+        expected = {
+            "requested": 9, "enrolled": 4, "already_enrolled": 1, "duplicate": 1,
+            "not_student": 1, "not_found": 1, "invalid": 1,
+        }
+        report = response.json()
+        self.assertEqual({key: report[key] for key in expected}, expected)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.active_enrollment_count, 5)
+        # Priced at the course price; the one enrolled beforehand keeps its own.
+        self.assertEqual(set(Enrollment.objects.values_list("price", flat=True)), {None, 10})
+
+    def test_enroll_from_csv_by_email(self):
+        User.objects.filter(pk=self.students[2].pk).update(email="Ann@Example.com")
+        upload = SimpleUploadedFile("cohort.csv", b"name,email\nAnn,ann@example.COM\nBob,bob@example.com\n")
+        report = self._enroll({"file": upload, "by": "email"}, format="multipart").json()
+        self.assertEqual((report["enrolled"], report["not_found"]), (1, 1))
+        self.assertTrue(Enrollment.objects.filter(user=self.students[2], course=self.course).exists())
+
+    def test_queries_per_chunk_do_not_grow_with_the_cohort(self):
+        small = [student.pk for student in self.students]
+        large = [student.pk for student in make_students(200, prefix="cohort")]
+        with CaptureQueriesContext(connection) as first:
+            enrollments.enroll_cohort(self.course, small)
+        with CaptureQueriesContext(connection) as second:
+            enrollments.enroll_cohort(self.course, large)
+        self.assertEqual(len(first), len(second))
+        self.assertEqual(Enrollment.objects.filter(course=self.course).count(), 205)
+
+    def test_only_the_instructor_or_staff(self):
+        self.client.force_authenticate(User.objects.create_user("other", password="x", role="teacher"))
+        self.assertEqual(self._enroll({"user_ids": [self.students[0].pk]}, format="json").status_code, 403)
+
+
+class CourseCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher", password="x", role="teacher")
+        cls.course = make_course(cls.teacher)
+        cls.student = make_students(1)[0]
+
+    def _counters(self):
+        self.course.refresh_from_db()
+        return tuple(getattr(self.course, field) for field in Course.COUNTER_FIELDS)
+
+    def test_counters_follow_creates_and_deletes(self):
+        lesson = Lesson.objects.create(title="L", description="d", video="v", course=self.course)
+        Lesson.objects.create(title="M", description="d", video="v", course=self.course)
+        enrollment = Enrollment.objects.create(user=self.student, course=self.course)
+        Enrollment.objects.create(user=make_students(1, prefix="inactive")[0], course=self.course, is_active=False)
+        completion = LessonCompletion.objects.create(student=self.student, lesson=lesson)
+        self.assertEqual(self._counters(), (2, 1, 1))
+        completion.delete()
+        enrollment.delete()
+        lesson.delete()
+        self.assertEqual(self._counters(), (1, 0, 0))
+
+    def test_rebuild_command_reports_and_fixes_drift(self):
+        Lesson.objects.create(title="L", description="d", video="v", course=self.course)
+        Course.objects.filter(pk=self.course.pk).update(lesson_count=7, completion_count=3)
+        out = io.StringIO()
+        call_command("rebuild_course_counters", "--dry-run", stdout=out)
+        self.assertIn(f"Course {self.course.pk}: lesson_count 7 -> 1", out.getvalue())
+        self.assertEqual(self._counters(), (7, 0, 3))
+        call_command("rebuild_course_counters", stdout=io.StringIO())
+        self.assertEqual(self._counters(), (1, 0, 0))
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher", password="x", role="teacher")
+        cls.course = make_course(cls.teacher, lessons=2)
+        cls.lesson = Lesson.objects.filter(course=cls.course).first()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+
+    def test_unchanged_resources_get_304(self):
+        course, lesson = self.course.pk, self.lesson.pk
+        for url in (f"/api/courses/{course}/", f"/api/courses/{course}/lessons/", f"/api/lessons/{lesson}/"):
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                self.assertEqual(first.status_code, 200)
+                # Only the fingerprint query; nothing is serialized.
+                with self.assertNumQueries(1):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+                self.assertEqual((response.status_code, response.content), (304, b""))
+
+    def test_etag_changes_with_the_course(self):
+        url = f"/api/courses/{self.course.pk}/lessons/"
+        etag = self.client.get(url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_last_modified(self):
+        url = f"/api/lessons/{self.lesson.pk}/"
+        last_modified = self.client.get(url)["Last-Modified"]
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+
+class ContentTransferTests(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher", password="x", role="teacher")
+        cls.student = User.objects.create_user("student", password="x", role="student")
+        cls.course = make_course(cls.teacher, title="Physics", lessons=3)
+        lesson = Lesson.objects.filter(course=cls.course).first()
+        Enrollment.objects.create(user=cls.student, course=cls.course)
+        LessonCompletion.objects.create(student=cls.student, lesson=lesson)
+
+    def setUp(self):
+        super().setUp()
+        with open(self._media("course_banners/b.png"), "wb") as banner:
+            banner.write(png_bytes())
+        material = Material(title="Notes", description="d", file_type="pdf", course=self.course)
+        material.file.save("notes.pdf", ContentFile(b"%PDF notes"), save=True)
+        self.directory = os.path.join(tempfile.mkdtemp(), "export")
+        self.addCleanup(shutil.rmtree, os.path.dirname(self.directory), True)
+
+    def _media(self, name):
+        path = os.path.join(settings.MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def test_round_trip_and_rerun(self):
+        counts = transfer.export(self.directory, people=True)
+        self.assertEqual(
+            counts, {"category": 1, "course": 1, "lesson": 3, "material": 1, "enrollment": 1, "completion": 1}
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            report = transfer.import_content(self.directory)
+        self.assertEqual(report["completion"], {"imported": 1, "already_imported": 0, "skipped": 0})
+
+        copy = Course.objects.exclude(pk=self.course.pk).get(title="Physics")
+        self.assertEqual((copy.lesson_count, copy.active_enrollment_count, copy.completion_count), (3, 1, 1))
+        self.assertEqual(LessonCompletion.objects.get(course=copy).lesson.course_id, copy.pk)
+        self.assertEqual(Enrollment.objects.get(course=copy).progress, 33)
+        self.assertEqual(Material.objects.get(course=copy).file.read(), b"%PDF notes")
+        self.assertEqual(copy.created_at, self.course.created_at)
+
+        # Rerunning imports nothing twice.
+        report = transfer.import_content(self.directory)
+        self.assertEqual(report["lesson"], {"imported": 0, "already_imported": 3, "skipped": 0})
+        self.assertEqual(Course.objects.count(), 2)
+
+    def test_interrupted_export_resumes(self):
+        transfer.export(self.directory)
+        path = os.path.join(self.directory, "content.jsonl")
+        with open(path) as content:
+            lines = content.readlines()
+        # Drop the trailer and tear the last record, as a crash would.
+        with open(path, "w") as content:
+            content.writelines(lines[:-2] + [lines[-2][:10]])
+        with self.assertRaisesMessage(transfer.TransferError, "unfinished"):
+            transfer.import_content(self.directory)
+        transfer.export(self.directory)
+        with open(path) as content:
+            self.assertEqual(content.readlines(), lines)
+
+
+class BannerVariantTests(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher", password="x", role="teacher")
+        cls.category = Category.objects.create(title="Category")
+
+    def _banner(self, name, data=None):
+        return default_storage.save(f"course_banners/{name}", ContentFile(data or png_bytes((2000, 1000))))
+
+    def _course(self, banner):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Course.objects.create(
+                title="Course", description="d", banner=banner, price=1, duration=1,
+                category=self.category, instructor=self.teacher,
+            )
+
+    def _run_jobs(self):
+        ran = []
+        with self.captureOnCommitCallbacks(execute=True):
+            while job := jobs.claim("test", queues=["images"]):
+                jobs.execute(job)
+                ran.append(job.pk)
+        return Job.objects.filter(pk__in=ran)
+
+    def test_variants_are_rendered(self):
+        course = self._course(self._banner("big.png"))
+        self.assertEqual(list(self._run_jobs().values_list("status", flat=True)), ["succeeded"])
+        course.refresh_from_db()
+        variants = course.banner_variants
+        self.assertEqual(variants["source"], course.banner.name)
+        self.assertEqual(
+            {size: entry["width"] for size, entry in variants.items() if size != "source"},
+            {"thumb": 320, "card": 640, "hero": 1600},
+        )
+        for size in images.SIZES:
+            self.assertEqual(set(variants[size]), {"width", "webp", "jpeg"})
+            with default_storage.open(variants[size]["webp"]) as variant:
+                image = Image.open(variant)
+                self.assertEqual((image.format, image.width), ("WEBP", variants[size]["width"]))
+        srcset = CourseSerializer(course, context={"request": RequestFactory().get("/")}).data["image_srcset"]
+        self.assertIn("1600w", srcset["webp"])
+
+    def test_small_banners_are_not_upscaled(self):
+        course = self._course(self._banner("small.png", png_bytes((400, 200))))
+        self._run_jobs()
+        course.refresh_from_db()
+        self.assertEqual(set(course.banner_variants) - {"source"}, {"thumb"})
+
+    def test_non_image_banner_is_skipped(self):
+        course = self._course(self._banner("broken.png", b"not an image"))
+        with self.assertLogs("core.tasks", "WARNING"):
+            job = self._run_jobs().get()
+        self.assertEqual((job.status, job.attempts), ("succeeded", 1))
+        course.refresh_from_db()
+        self.assertEqual(course.banner_variants, {})
+
+    def test_replaced_and_deleted_banners_lose_their_variants(self):
+        course = self._course(self._banner("first.png"))
+        self._run_jobs()
+        course.refresh_from_db()
+        first = images.variant_names(course.banner_variants)
+
+        course.banner = self._banner("second.png")
+        with self.captureOnCommitCallbacks(execute=True):
+            course.save()
+        self.assertFalse(any(default_storage.exists(name) for name in first))
+        self.assertEqual(Course.objects.get(pk=course.pk).banner_variants, {})
+        self._run_jobs()
+        course.refresh_from_db()
+        second = images.variant_names(course.banner_variants)
+        self.assertTrue(all(default_storage.exists(name) for name in second))
+
+        # Another course showing the same banner keeps the files alive.
+        other = self._course(course.banner.name)
+        self._run_jobs()
+        with self.captureOnCommitCallbacks(execute=True):
+            course.delete()
+        self.assertTrue(all(default_storage.exists(name) for name in second))
+        other.refresh_from_db()
+        self.assertEqual(images.variant_names(other.banner_variants), second)
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertFalse(any(default_storage.exists(name) for name in second))
+
+    def test_variants_of_a_banner_replaced_mid_render_are_dropped(self):
+        course = self._course(self._banner("first.png"))
+        Course.objects.filter(pk=course.pk).update(banner=self._banner("second.png"))
+        job = self._run_jobs().filter(kwargs__banner="course_banners/first.png").get()
+        self.assertEqual(job.status, "succeeded")
+        self.assertEqual(os.listdir(os.path.join(settings.MEDIA_ROOT, "course_banners", "variants")), [])
+
+    def test_backfill_command(self):
+        course = self._course(self._banner("big.png"))
+        Job.objects.all().delete()
+        out = io.StringIO()
+        call_command("generate_banner_variants", workers=2, stdout=out)
+        self.assertIn("Rendered variants for 1 of 1 banner(s)", out.getvalue())
+        course.refresh_from_db()
+        self.assertTrue(all(default_storage.exists(name) for name in images.variant_names(course.banner_variants)))
+
+
+class StreamingListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher", password="x", role="teacher")
+        cls.course = make_course(cls.teacher, lessons=1)
+        lesson = cls.course.lesson_set.get()
+        QuestionAnswer.objects.bulk_create(
+            QuestionAnswer(lesson=lesson, user=cls.teacher, description=f"Question {index}") for index in range(5)
+        )
+
+    def _stream(self, queryset, serializer_class, chunk_size):
+        response = stream_json_array(RequestFactory().get("/"), queryset, serializer_class, chunk_size=chunk_size)
+        with CaptureQueriesContext(connection) as queries:
+            body = b"".join(response.streaming_content)
+        return json.loads(body), len(queries)
+
+    def _expected(self, queryset, serializer_class):
+        return json.loads(JSONRenderer().render(serializer_class(queryset, many=True).data))
+
+    def test_chunks_match_the_serializer(self):
+        questions = QuestionAnswer.objects.order_by("id")
+        for rows, chunk_size in ((0, 2), (2, 2), (5, 2), (5, 500)):
+            with self.subTest(rows=rows, chunk_size=chunk_size):
+                queryset = questions.filter(description__lt=f"Question {rows}")
+                data, queries = self._stream(queryset, QuestionAnswerSerializer, chunk_size)
+                self.assertEqual(len(data), rows)
+                self.assertEqual(data, self._expected(queryset, QuestionAnswerSerializer))
+                # One read however many chunks; serializing a chunk adds none.
+                self.assertEqual(queries, 1)
+
+    def test_listing_endpoints_stream_on_request(self):
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        response = client.get("/api/questions/", {"pagination": "stream"})
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            json.loads(b"".join(response.streaming_content)),
+            self._expected(QuestionAnswer.objects.all(), QuestionAnswerSerializer),
+        )
+        response = client.get("/api/materials/", {"pagination": "stream"})
+        self.assertEqual(json.loads(b"".join(response.streaming_content)), [])
+
+    def test_teacher_courses_stream_only_on_request(self):
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        plain = client.get("/api/teacher/courses/")
+        self.assertFalse(plain.streaming)
+        streamed = client.get("/api/teacher/courses/", {"pagination": "stream"})
+        self.assertTrue(streamed.streaming)
+        self.assertEqual(json.loads(b"".join(streamed.streaming_content)), plain.json())
+        self.assertEqual([course["id"] for course in plain.json()], [self.course.pk])
+
+
+class CompleteLessonTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher", password="x", role="teacher")
+        cls.student = User.objects.create_user("student", password="x", role="student")
+        cls.course = make_course(cls.teacher, lessons=4)
+        cls.lessons = list(Lesson.objects.filter(course=cls.course))
+        cls.enrollment = Enrollment.objects.create(user=cls.student, course=cls.course)
+        # Completions by others must not make a completion any more expensive.
+        others = make_students(50, prefix="other")
+        Enrollment.objects.bulk_create(Enrollment(user=other, course=cls.course) for other in others)
+        LessonCompletion.objects.bulk_create(
+            LessonCompletion(student=other, lesson=lesson, course=cls.course) for other in others for lesson in cls.lessons
+        )
+        Course.objects.filter(pk=cls.course.pk).recount_counters()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def _complete(self, lesson):
+        return self.client.post("/api/student/complete-lesson/", {"lesson_id": lesson.pk}, format="json")
+
+    def test_constant_queries_and_incremental_progress(self):
+        for number, lesson in enumerate(self.lessons[:3], start=1):
+            with self.assertNumQueries(11):
+                response = self._complete(lesson)
+            self.assertEqual(response.data["progress"], 25 * number)
+
+    def test_repeat_completion_is_a_no_op(self):
+        self._complete(self.lessons[0])
+        response = self._complete(self.lessons[0])
+        self.assertEqual(response.data["message"], "Lesson already marked as complete")
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.completion_count, 201)
+
+    def test_inactive_enrollment_cannot_complete(self):
+        Enrollment.objects.filter(pk=self.enrollment.pk).update(is_active=False)
+        self.assertEqual(self._complete(self.lessons[0]).status_code, 404)
+        self.assertFalse(LessonCompletion.objects.filter(student=self.student).exists())
+
+
+class JobQueueTests(TestCase):
+    def test_idle_claim_does_not_take_the_write_lock(self):
+        # One SELECT; no transaction (no SAVEPOINT here, BEGIN IMMEDIATE in production).
+        with self.assertNumQueries(1):
+            self.assertIsNone(jobs.claim("test"))
+
+    def test_enqueue_wakes_workers_in_this_process(self):
+        worker = jobs.Worker(threads=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            queued = jobs.enqueue(tasks.recompute_progress, course_id=1)
+        self.assertTrue(worker.wakeup.is_set())
+        self.assertEqual(jobs.claim("test").pk, queued.pk)
+
+    def test_idle_worker_backs_off(self):
+        worker = jobs.Worker(threads=1, poll=1, max_poll=4)
+        waits = []
+
+        def fake_wait(timeout):
+            waits.append(timeout)
+            if len(waits) == 4:
+                worker.stopping.set()
+            return False
+
+        with mock.patch.object(worker.wakeup, "wait", fake_wait):
+            worker.run()
+        self.assertEqual(waits, [1, 2, 4, 4])
+
+    def _claim(self):
+        job = jobs.claim("test")
+        self.assertIsNotNone(job)
+        return job
+
+    def _make_due(self, job):
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+
+    def test_claim_marks_the_job_running(self):
+        queued = jobs.enqueue(sample_task)
+        job = self._claim()
+        self.assertEqual(job.pk, queued.pk)
+        self.assertEqual((job.status, job.attempts, job.locked_by), ("running", 1, "test"))
+        self.assertAlmostEqual((job.locked_until - job.started_at).total_seconds(), 60)
+        self.assertIsNone(jobs.claim("test"))
+
+    def test_claim_respects_run_at_and_queues(self):
+        jobs.enqueue(sample_task, delay=60)
+        self.assertIsNone(jobs.claim("test"))
+        jobs.enqueue(sample_task)
+        self.assertIsNone(jobs.claim("test", queues=["images"]))
+        self.assertEqual(jobs.claim("test", queues=["test"]).queue, "test")
+
+    def test_failures_are_retried_then_failed(self):
+        jobs.enqueue(sample_task, fail=True)
+        jobs.execute(self._claim())
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts, job.locked_by), ("queued", 1, ""))
+        self.assertIn("ValueError: boom", job.last_error)
+        # Backed off 2.5-5 seconds (RETRY_BASE_SECONDS with jitter).
+        self.assertGreater(job.run_at, timezone.now() + datetime.timedelta(seconds=2))
+        self.assertIsNone(jobs.claim("test"))
+
+        self._make_due(job)
+        jobs.execute(self._claim())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("failed", 2))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_backoff_grows_and_is_capped(self):
+        for attempts, delay in ((1, 5), (3, 20), (30, jobs.RETRY_MAX_SECONDS)):
+            self.assertTrue(delay / 2 <= jobs._backoff(attempts) <= delay)
+
+    def test_success_stores_the_result(self):
+        jobs.enqueue(sample_task)
+        jobs.execute(self._claim())
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.result, job.locked_until), ("succeeded", {"ok": True}, None))
+
+    def test_keyed_enqueue_is_idempotent(self):
+        first = jobs.enqueue(sample_task, key="sample")
+        self.assertEqual(jobs.enqueue(sample_task, key="sample").pk, first.pk)
+        # Once it runs, the same key queues a new job.
+        self._claim()
+        second = jobs.enqueue(sample_task, key="sample")
+        self.assertNotEqual(second.pk, first.pk)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Job.objects.create(task=sample_task.job_name, key="sample")
+
+    def test_retry_superseded_by_a_newer_keyed_job(self):
+        jobs.enqueue(sample_task, key="sample", fail=True)
+        running = self._claim()
+        newer = jobs.enqueue(sample_task, key="sample")
+        jobs.execute(running)
+        running.refresh_from_db()
+        self.assertEqual(running.status, "failed")
+        self.assertIn("superseded", running.last_error)
+        self.assertEqual(Job.objects.get(status="queued").pk, newer.pk)
+
+    @override_settings(JOB_QUEUES={"test": 1})
+    def test_queue_limit(self):
+        jobs.enqueue(sample_task)
+        jobs.enqueue(sample_task)
+        first = self._claim()
+        self.assertIsNone(jobs.claim("test"))
+        jobs.execute(first)
+        self.assertEqual(self._claim().status, "running")
+
+    def test_expired_leases_are_requeued(self):
+        jobs.enqueue(sample_task)
+        job = self._claim()
+        jobs.requeue_expired()
+        self.assertEqual(Job.objects.get().status, "running")
+
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - datetime.timedelta(seconds=1))
+        jobs.requeue_expired()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), ("queued", ""))
+        self.assertIn("Lease expired on worker test", job.last_error)
+
+        # Out of attempts, the job fails instead.
+        self._make_due(job)
+        self._claim()
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - datetime.timedelta(seconds=1))
+        jobs.requeue_expired()
+        self.assertEqual(Job.objects.get().status, "failed")
+
+    def test_stats(self):
+        jobs.enqueue(sample_task)
+        jobs.enqueue(sample_task, fail=True)
+        jobs.enqueue(sample_task, delay=600)
+        jobs.execute(self._claim())
+        jobs.execute(self._claim())
+        queue = jobs.stats()["queues"]["test"]
+        fields = ("queued", "due", "running", "enqueued", "succeeded", "failed", "retrying")
+        self.assertEqual(
+            {field: queue[field] for field in fields},
+            {"queued": 2, "due": 0, "running": 0, "enqueued": 3, "succeeded": 1, "failed": 0, "retrying": 1},
+        )
+        self.assertGreaterEqual(queue["latency_max_seconds"], 0)
+
+
+class JobClaimConcurrencyTests(TransactionTestCase):
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            # Shared-cache memory databases fail on lock contention instead of waiting.
+            self.skipTest("needs a file test database (DATABASES['default']['TEST']['NAME'])")
+
+    @override_settings(JOB_QUEUES={"test": 3})
+    def test_each_job_is_claimed_once(self):
+        for _ in range(30):
+            jobs.enqueue(sample_task)
+
+        def drain(worker):
+            claimed = []
+            try:
+                while job := jobs.claim(worker):
+                    claimed.append(job.pk)
+                    jobs.execute(job)
+            finally:
+                connection.close()
+            return claimed
+
+        with ThreadPoolExecutor(6) as pool:
+            claimed = [pk for pks in pool.map(drain, [f"worker{index}" for index in range(6)]) for pk in pks]
+        self.assertEqual(sorted(claimed), sorted(Job.objects.values_list("pk", flat=True)))
+        self.assertEqual(Job.objects.filter(status="succeeded", attempts=1).count(), 30)
+
+
+class BatchCompletionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher", password="x", role="teacher")
+        cls.student = User.objects.create_user("student", password="x", role="student")
+        cls.course = make_course(cls.teacher, lessons=20)
+        cls.lesson_ids = list(Lesson.objects.filter(course=cls.course).values_list("pk", flat=True))
+        cls.enrollment = Enrollment.objects.create(user=cls.student, course=cls.course)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def _complete(self, lesson_ids):
+        return self.client.post("/api/student/complete-lessons/", {"lesson_ids": lesson_ids}, format="json")
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        with self.assertNumQueries(11):
+            self._complete(self.lesson_ids[:2])
+        with self.assertNumQueries(11):
+            response = self._complete(self.lesson_ids[2:19])
+        self.assertEqual(response.data["progress"][0]["progress"], 95)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.completion_count, 19)
+
+    def test_finishing_the_course_queues_certificates(self):
+        response = self._complete(self.lesson_ids)
+        self.assertEqual(response.data["progress"], [{"course_id": self.course.pk, "progress": 100, "is_completed": True}])
+        self.assertTrue(Job.objects.filter(key=f"certificates:{self.course.pk}").exists())
+
+    def test_inactive_enrollment_cannot_complete(self):
+        Enrollment.objects.filter(pk=self.enrollment.pk).update(is_active=False)
+        response = self._complete(self.lesson_ids[:3])
+        self.assertEqual({result["status"] for result in response.data["results"]}, {"not_enrolled"})
+        self.assertFalse(LessonCompletion.objects.exists())
+
+    def test_completion_inserted_concurrently_is_not_counted_twice(self):
+        insert = LessonCompletion.objects.bulk_create
+
+        def racing_insert(objs, **kwargs):
+            # Another request completes the first lesson just before this insert.
+            LessonCompletion.objects.create(student=self.student, lesson_id=self.lesson_ids[0])
+            return insert(objs, **kwargs)
+
+        with mock.patch.object(LessonCompletion.objects, "bulk_create", side_effect=racing_insert):
+            self._complete(self.lesson_ids[:5])
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.completion_count, 5)
+        self.assertEqual(LessonCompletion.objects.count(), 5)
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.completed_lessons, 5)
+
+
+class CatalogCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher", password="x", role="teacher")
+        cls.course = make_course(cls.teacher, lessons=2)
+
+    def setUp(self):
+        caches["default"].clear()
+
+    def test_versions_are_shared_between_processes(self):
+        builds = []
+
+        def build():
+            builds.append(1)
+            return {"n": len(builds)}
+
+        self.assertEqual(cached_payload("thing", [("course", 1)], build), {"n": 1})
+        self.assertEqual(cached_payload("thing", [("course", 1)], build), {"n": 1})
+        # A bump made by another process only shares the versions store with
+        # this one, not its in-memory payloads.
+        other_process = caches.create_connection("versions")
+        other_process.incr("lms:ver:course:1")
+        self.assertEqual(cached_payload("thing", [("course", 1)], build), {"n": 2})
+
+    def test_per_process_version_cache_fails_the_check(self):
+        local = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+        with self.settings(CACHES={"default": local, "versions": local}):
+            self.assertEqual([error.id for error in check_version_cache()], ["core.E001"])
+        self.assertEqual(check_version_cache(), [])
+
+    def test_course_detail_is_served_from_cache_until_the_course_changes(self):
+        client = APIClient()
+        url = f"/api/courses/{self.course.pk}/"
+        with self.captureOnCommitCallbacks(execute=True):
+            first = client.get(url)
+        before = cache_stats()
+        with self.assertNumQueries(3):
+            # Conditional GET fingerprint, then the versions of the course and
+            # of its category and instructor; no course query.
+            self.assertEqual(client.get(url).content, first.content)
+        self.assertEqual(cache_stats()["hits"], before["hits"] + 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.filter(pk=self.course.pk).update(title="Renamed")
+            invalidate("course", self.course.pk)
+        self.assertEqual(client.get(url).json()["title"], "Renamed")
+        self.assertEqual(cache_stats()["misses"], before["misses"] + 1)
+
+
+class CertificateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher", password="x", role="teacher")
+        cls.course = make_course(cls.teacher, title="Algebra", lessons=1)
+        cls.student = User.objects.create_user("ann", password="x", role="student", first_name="Ann")
+        cls.enrollment = Enrollment.objects.create(user=cls.student, course=cls.course, is_completed=True)
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        override = self.settings(CERTIFICATE_ROOT=root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_issue_date_is_stamped_once(self):
+        with mock.patch.object(certificates, "render") as render:
+            self.assertEqual(certificates.issue(Enrollment.objects.all()), (1, 0))
+        self.enrollment.refresh_from_db()
+        issued_at = self.enrollment.certificate_issued_at
+        self.assertIsNotNone(issued_at)
+        self.assertEqual(render.call_args.args[0][-1], issued_at)
+
+        # Re-rendering, e.g. after a template change, prints the same date.
+        with mock.patch.object(certificates, "render") as render:
+            certificates.issue(Enrollment.objects.all(), force=True)
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.certificate_issued_at, issued_at)
+        self.assertEqual(render.call_args.args[0][-1], issued_at)
+
+    def test_rendered_date_comes_from_the_enrollment(self):
+        issued_at = datetime.datetime(2024, 3, 5, 12, tzinfo=datetime.timezone.utc)
+        Enrollment.objects.filter(pk=self.enrollment.pk).update(certificate_issued_at=issued_at)
+        row = Enrollment.objects.filter(pk=self.enrollment.pk).values_list(*certificates._FIELDS).get()
+        self.assertEqual(certificates._values(row)["date"], "05 March 2024")
+        self.assertTrue(os.path.exists(certificates.ensure(self.enrollment)))
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.certificate_issued_at, issued_at)
+
+
+class MediaDeliveryTests(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher", password="x", role="teacher")
+        cls.course = make_course(cls.teacher)
+        cls.student, cls.outsider = make_students(2)
+        Enrollment.objects.create(user=cls.student, course=cls.course)
+        cls.material = Material.objects.create(
+            title="Notes", description="d", file_type="pdf", file="materials/notes.pdf", course=cls.course
+        )
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, "materials"))
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, "course_banners"))
+        for name in ("materials/notes.pdf", "course_banners/b.png", "course_banners/b.0123456789abcdef.png"):
+            with open(os.path.join(settings.MEDIA_ROOT, name), "wb") as file:
+                file.write(b"0123456789")
+        self.client = APIClient()
+
+    def _body(self, response):
+        return b"".join(response.streaming_content)
+
+    def test_byte_range_parsing(self):
+        cases = {
+            "bytes=0-3": (0, 3), "bytes=7-": (7, 9), "bytes=-3": (7, 9), "bytes=5-100": (5, 9),
+            "bytes=10-": False, "bytes=-0": False, "bytes=4-2": None, "bytes=0-1,4-5": None, "items=0-1": None,
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(byte_range(header, 10), expected)
+
+    def test_ranges_and_conditional_requests(self):
+        url = "/media/course_banners/b.png"
+        full = self.client.get(url)
+        self.assertEqual((full.status_code, full["Accept-Ranges"], self._body(full)), (200, "bytes", b"0123456789"))
+        self.assertEqual(full["Cache-Control"], "public, no-cache")
+
+        partial = self.client.get(url, HTTP_RANGE="bytes=-3")
+        self.assertEqual((partial.status_code, partial["Content-Range"]), (206, "bytes 7-9/10"))
+        self.assertEqual((partial["Content-Length"], self._body(partial)), ("3", b"789"))
+
+        unsatisfiable = self.client.get(url, HTTP_RANGE="bytes=10-")
+        self.assertEqual((unsatisfiable.status_code, unsatisfiable["Content-Range"]), (416, "bytes */10"))
+        # A stale If-Range validator gets the whole (changed) file instead.
+        stale = self.client.get(url, HTTP_RANGE="bytes=0-1", HTTP_IF_RANGE='"old"')
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=full["ETag"]).status_code, 304)
+
+    def test_hashed_names_are_cached_for_good(self):
+        response = self.client.head("/media/course_banners/b.0123456789abcdef.png")
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        self.assertEqual(response["Content-Length"], "10")
+
+    def test_offload_to_the_front_end_server(self):
+        with self.settings(MEDIA_OFFLOAD="x-accel-redirect"):
+            response = self.client.get("/media/course_banners/b.png", HTTP_RANGE="bytes=0-1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/course_banners/b.png")
+        self.assertEqual(response.content, b"")
+
+    def test_materials_need_an_enrollment(self):
+        url = "/media/materials/notes.pdf"
+        response = self.client.get(url, HTTP_AUTHORIZATION=bearer(self.student))
+        self.assertEqual((response.status_code, response["Cache-Control"]), (200, "private, no-cache"))
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION=bearer(self.outsider)).status_code, 403)
+
+    def _link(self, user):
+        self.client.force_authenticate(user)
+        response = self.client.get(f"/api/materials/{self.material.pk}/link/")
+        self.client.force_authenticate(None)
+        return response
+
+    def test_signed_link_works_without_credentials(self):
+        self.assertEqual(self.client.get("/media/materials/notes.pdf").status_code, 401)
+        url = self._link(self.student).json()["url"]
+        response = self.client.get(url, HTTP_RANGE="bytes=2-4")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self._body(response), b"234")
+
+    def test_link_is_only_issued_to_readers(self):
+        self.assertEqual(self._link(self.outsider).status_code, 404)
+        self.assertEqual(self._link(self.teacher).status_code, 200)
+
+    def test_tampered_or_expired_links_are_refused(self):
+        sig = self._link(self.student).json()["url"].split("?sig=")[1]
+        self.assertEqual(self.client.get(f"/media/materials/other.pdf?sig={sig}").status_code, 403)
+        self.assertEqual(self.client.get(f"/media/materials/notes.pdf?sig={sig}x").status_code, 403)
+        with self.settings(MEDIA_SIGNED_URL_SECONDS=-1):
+            self.assertEqual(self.client.get(f"/media/materials/notes.pdf?sig={sig}").status_code, 403)
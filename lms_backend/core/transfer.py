@@ -0,0 +1,470 @@
+"""
+Streaming export and import of course content.
+
+An export is a directory holding ``content.jsonl`` and a ``blobs/`` store.
+The JSONL starts with a header line (format, version and a ``source`` uuid
+naming this export), then one ``{"model", "id", "fields"}`` record per
+category, course, lesson, material and, optionally, enrollment and lesson
+completion, in that order and by ascending id within each model, and ends
+with a ``{"complete": true}`` trailer. Foreign keys hold ids from the same
+export; users are referred to by username. Banner and material files are
+copied to ``blobs/<d[:2]>/<sha256>`` and referenced by digest, so a file
+shared by many materials is stored once.
+
+Both directions work ``BATCH_SIZE`` rows at a time and keep no per-row state
+in memory, so they can be restarted after an interruption:
+
+* ``export`` resumes after the last complete line of an unfinished
+  ``content.jsonl`` (a torn final line is dropped), and skips blobs that are
+  already in the store.
+* ``import_content`` inserts each batch with ``bulk_create`` and, in the
+  same transaction, records a :class:`~core.models.TransferMapping` from
+  every exported id to the new one. Parents are looked up there, and rows
+  already mapped are skipped, so rerunning an import carries on where it
+  stopped instead of duplicating anything.
+
+``bulk_create`` skips the model signals, so once the rows are in, the course
+counters, enrollment progress, blob reference counts, search index,
+autocomplete entries and caches of the imported courses are brought up to
+date, and their banner variants and certificates are queued as jobs.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import tempfile
+import uuid
+from itertools import islice
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from users.models import User
+
+from . import jobs, search, tasks
+from .autocomplete import index as autocomplete_index
+from .cache import bump_version
+from .models import Blob, Category, Course, Enrollment, Lesson, LessonCompletion, Material, TransferMapping
+from .signals import invalidate
+from .storage import material_storage
+
+FORMAT = "lms-content"
+FORMAT_VERSION = 1
+CONTENT = "content.jsonl"
+BATCH_SIZE = 1000
+BLOCK_SIZE = 1024 * 1024
+MAX_REPORTED = 1000
+
+MODELS = {
+    "category": Category,
+    "course": Course,
+    "lesson": Lesson,
+    "material": Material,
+    "enrollment": Enrollment,
+    "completion": LessonCompletion,
+}
+PEOPLE = ("enrollment", "completion")
+# Exported columns per model, as ``values_list`` lookups. Counters, progress
+# and banner variants are derived and rebuilt on import.
+FIELDS = {
+    "category": ("title", "is_active", "created_at", "updated_at"),
+    "course": (
+        "title", "description", "banner", "price", "duration", "is_active",
+        "category_id", "instructor__username", "created_at", "updated_at",
+    ),
+    "lesson": ("title", "description", "video", "course_id", "is_active", "created_at", "updated_at"),
+    "material": ("title", "description", "file_type", "file", "course_id", "is_active", "created_at", "updated_at"),
+    "enrollment": (
+        "user__username", "course_id", "is_active", "price", "total_mark", "certificate_issued_at",
+        "created_at", "updated_at",
+    ),
+    "completion": ("student__username", "lesson_id", "completed_at"),
+}
+# Foreign key -> exported model it points at.
+PARENTS = {
+    "course": {"category": "category"},
+    "lesson": {"course": "course"},
+    "material": {"course": "course"},
+    "enrollment": {"course": "course"},
+    "completion": {"lesson": "lesson"},
+}
+USER_FIELDS = {"course": "instructor", "enrollment": "user", "completion": "student"}
+FILE_FIELDS = {"course": "banner", "material": "file"}
+
+
+class TransferError(Exception):
+    pass
+
+
+class _Encoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder rounds to milliseconds; keep timestamps exact.
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _key(lookup):
+    return lookup.split("__")[0].removesuffix("_id")
+
+
+def _blob_path(directory, digest):
+    return os.path.join(directory, "blobs", digest[:2], digest)
+
+
+# ---- export ----
+
+def _querysets(course_ids):
+    courses = Course.objects.all() if course_ids is None else Course.objects.filter(pk__in=course_ids)
+    return {
+        "category": Category.objects.all() if course_ids is None else Category.objects.filter(
+            pk__in=courses.values("category")
+        ),
+        "course": courses,
+        "lesson": Lesson.objects.filter(course__in=courses),
+        "material": Material.objects.filter(course__in=courses),
+        "enrollment": Enrollment.objects.filter(course__in=courses),
+        "completion": LessonCompletion.objects.filter(course__in=courses),
+    }
+
+
+def _export_blob(directory, storage, name):
+    """Copy ``name`` from ``storage`` into the blob store; return its reference (``None`` if it's missing)."""
+    if not name:
+        return None
+    stem = os.path.splitext(os.path.basename(name))[0]
+    if storage is material_storage and len(stem) == 64:
+        # Content-addressed names already carry the digest.
+        path = _blob_path(directory, stem)
+        if os.path.exists(path):
+            return {"name": name, "sha256": stem, "size": os.path.getsize(path)}
+    try:
+        source = storage.open(name, "rb")
+    except FileNotFoundError:
+        return None
+
+    staging = os.path.join(directory, "blobs", ".incoming")
+    os.makedirs(staging, exist_ok=True)
+    digest, size = hashlib.sha256(), 0
+    handle, staged = tempfile.mkstemp(dir=staging)
+    try:
+        with source, os.fdopen(handle, "wb") as out:
+            while block := source.read(BLOCK_SIZE):
+                out.write(block)
+                digest.update(block)
+                size += len(block)
+        path = _blob_path(directory, digest.hexdigest())
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(staged, path)
+    except BaseException:
+        if os.path.exists(staged):
+            os.remove(staged)
+        raise
+    return {"name": name, "sha256": digest.hexdigest(), "size": size}
+
+
+def _record(directory, model, row):
+    pk, *values = row
+    fields = {_key(lookup): value for lookup, value in zip(FIELDS[model], values)}
+    if model in FILE_FIELDS:
+        field = FILE_FIELDS[model]
+        storage = material_storage if model == "material" else default_storage
+        fields[field] = _export_blob(directory, storage, fields[field])
+    return {"model": model, "id": pk, "fields": fields}
+
+
+def _read_progress(path):
+    """
+    Return ``(header, last record, complete)`` of an existing export at
+    ``path``, truncating a torn final line; ``header`` is ``None`` if there
+    is nothing to resume.
+    """
+    if not os.path.exists(path):
+        return None, None, False
+    header = last = None
+    with open(path, "r+b") as handle:
+        kept = 0
+        for line in handle:
+            if not line.endswith(b"\n"):
+                break
+            kept += len(line)
+            if header is None:
+                header = json.loads(line)
+            else:
+                last = json.loads(line)
+        handle.truncate(kept)
+    if last is not None and last.get("complete"):
+        return header, None, True
+    return header, last, False
+
+
+def export(directory, course_ids=None, people=False, fresh=False):
+    """
+    Write the courses in ``course_ids`` (every course when ``None``) to
+    ``directory``, with their enrollments and completions if ``people``.
+    Resume an unfinished export found there unless ``fresh``. Return the
+    number of records written per model.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, CONTENT)
+    if fresh and os.path.exists(path):
+        os.remove(path)
+    header, last, complete = _read_progress(path)
+    models = [model for model in MODELS if people or model not in PEOPLE]
+    selection = sorted(course_ids) if course_ids is not None else None
+    if header is not None and (header["courses"], header["models"]) != (selection, models):
+        raise TransferError(f"{path} holds an export with different options; start over with --fresh.")
+    counts = {model: 0 for model in models}
+    if complete:
+        return counts
+
+    with open(path, "a", encoding="utf-8") as out:
+        if header is None:
+            header = {
+                "format": FORMAT,
+                "version": FORMAT_VERSION,
+                "source": str(uuid.uuid4()),
+                "exported_at": timezone.now(),
+                "courses": selection,
+                "models": models,
+            }
+            out.write(json.dumps(header, cls=_Encoder) + "\n")
+
+        querysets = _querysets(course_ids)
+        resume_at = models.index(last["model"]) if last else 0
+        for model in models[resume_at:]:
+            after = last["id"] if last and model == last["model"] else 0
+            while True:
+                rows = list(
+                    querysets[model].filter(pk__gt=after).order_by("pk").values_list("pk", *FIELDS[model])[:BATCH_SIZE]
+                )
+                if not rows:
+                    break
+                # Blobs are copied before the lines referring to them are written.
+                lines = [json.dumps(_record(directory, model, row), cls=_Encoder) for row in rows]
+                out.write("\n".join(lines) + "\n")
+                out.flush()
+                counts[model] += len(rows)
+                after = rows[-1][0]
+        out.write(json.dumps({"complete": True}) + "\n")
+    return counts
+
+
+# ---- import ----
+
+def _read_header(path):
+    if not os.path.exists(path):
+        raise TransferError(f"{path} not found.")
+    with open(path, "rb") as handle:
+        header = json.loads(handle.readline() or b"{}")
+        handle.seek(max(handle.seek(0, os.SEEK_END) - 4096, 0))
+        tail = handle.read().rstrip(b"\n").rsplit(b"\n", 1)[-1]
+    if header.get("format") != FORMAT or header.get("version") != FORMAT_VERSION:
+        raise TransferError(f"{path} is not a version {FORMAT_VERSION} content export.")
+    try:
+        complete = json.loads(tail).get("complete") is True
+    except ValueError:
+        complete = False
+    if not complete:
+        raise TransferError(f"{path} is an unfinished export; run export_content again to complete it.")
+    return header
+
+
+def _mapped(source, model, old_ids):
+    """Map the exported ids in ``old_ids`` that were already imported to their new ids."""
+    return dict(
+        TransferMapping.objects.filter(source=source, model=model, old_id__in=set(old_ids))
+        .values_list("old_id", "new_id")
+    )
+
+
+class _Importer:
+    def __init__(self, directory, source, instructor):
+        self.directory = directory
+        self.source = source
+        self.instructor = instructor
+        self.report = {"problems": []}
+
+    def _count(self, model, outcome, n=1):
+        counts = self.report.setdefault(model, {"imported": 0, "already_imported": 0, "skipped": 0})
+        counts[outcome] += n
+
+    def _problem(self, model, record, problem):
+        self._count(model, "skipped")
+        if len(self.report["problems"]) < MAX_REPORTED:
+            self.report["problems"].append({"model": model, "id": record["id"], "problem": problem})
+
+    def _store(self, model, ref):
+        if ref is None:
+            return ""
+        path = _blob_path(self.directory, ref["sha256"])
+        if not os.path.exists(path):
+            raise TransferError(f"Blob {ref['sha256']} ({ref['name']}) is missing from the export.")
+        with open(path, "rb") as blob:
+            if model == "material":
+                # Stored under its digest, so a restarted import reuses it.
+                return material_storage.save(ref["name"], File(blob))
+            stem, extension = os.path.splitext(os.path.basename(ref["name"]))
+            name = f"course_banners/{stem}.{ref['sha256'][:12]}{extension}"
+            if default_storage.exists(name):
+                return name
+            return default_storage.save(name, File(blob))
+
+    def _build(self, model, records):
+        """Return ``[(record, instance)]`` for the records whose parents and users resolve."""
+        parents = {
+            field: _mapped(self.source, parent, (record["fields"][field] for record in records))
+            for field, parent in PARENTS.get(model, {}).items()
+        }
+        users = {}
+        if model in USER_FIELDS:
+            names = {record["fields"][USER_FIELDS[model]] for record in records}
+            users = dict(User.objects.filter(username__in=names).values_list("username", "pk"))
+        lesson_courses = {}
+        if model == "completion":
+            lesson_courses = dict(
+                Lesson.objects.filter(pk__in=parents["lesson"].values()).values_list("pk", "course_id")
+            )
+
+        opts = MODELS[model]._meta
+        built = []
+        for record in records:
+            fields = dict(record["fields"])
+            values = {}
+            for field in PARENTS.get(model, {}):
+                values[f"{field}_id"] = parents[field].get(fields.pop(field))
+            if None in values.values():
+                self._problem(model, record, "missing_parent")
+                continue
+            if model in USER_FIELDS:
+                user_id = users.get(fields.pop(USER_FIELDS[model]))
+                if user_id is None and model == "course":
+                    user_id = self.instructor
+                if user_id is None:
+                    self._problem(model, record, "missing_user")
+                    continue
+                values[f"{USER_FIELDS[model]}_id"] = user_id
+            if model in FILE_FIELDS:
+                values[FILE_FIELDS[model]] = self._store(model, fields.pop(FILE_FIELDS[model]))
+            if model == "completion":
+                values["course_id"] = lesson_courses[values["lesson_id"]]
+            for name, value in fields.items():
+                values[name] = opts.get_field(name).to_python(value)
+            built.append((record, MODELS[model](**values)))
+        return built
+
+    def run(self, model, records):
+        done = _mapped(self.source, model, (record["id"] for record in records))
+        self._count(model, "already_imported", len(done))
+        records = [record for record in records if record["id"] not in done]
+        if not records:
+            return
+        built = self._build(model, records)
+        if not built:
+            return
+
+        Model = MODELS[model]
+        stamps = [
+            field for field in Model._meta.concrete_fields
+            if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)
+        ]
+        records, instances = zip(*built)
+        original = [
+            [field.get_db_prep_save(getattr(instance, field.attname), connection) for field in stamps] + [None]
+            for instance in instances
+        ]
+        quote = connection.ops.quote_name
+        assignments = ", ".join(f"{quote(field.column)} = %s" for field in stamps)
+        restore = f"UPDATE {quote(Model._meta.db_table)} SET {assignments} WHERE {quote(Model._meta.pk.column)} = %s"
+        with transaction.atomic():
+            Model.objects.bulk_create(instances)
+            # bulk_create stamped every row with the current time. Put the
+            # exported timestamps back with one executemany; bulk_update's
+            # CASE expressions cost several times more than the insert.
+            for instance, values in zip(instances, original):
+                values[-1] = instance.pk
+            with connection.cursor() as cursor:
+                cursor.executemany(restore, original)
+            TransferMapping.objects.bulk_create(
+                TransferMapping(source=self.source, model=model, old_id=record["id"], new_id=instance.pk)
+                for record, instance in zip(records, instances)
+            )
+        self._count(model, "imported", len(instances))
+
+
+def _finish(source):
+    """Rebuild what the skipped signals would have maintained for every course imported from ``source``."""
+    courses = Course.objects.filter(
+        pk__in=TransferMapping.objects.filter(source=source, model="course").values("new_id")
+    )
+    course_ids = list(courses.values_list("pk", flat=True))
+    if not course_ids:
+        return
+    references = (
+        Material.objects.filter(file=OuterRef("name")).order_by().values("file").annotate(n=Count("pk")).values("n")
+    )
+    with transaction.atomic():
+        courses.recount_counters()
+        Enrollment.objects.filter(course__in=courses).recompute_progress()
+        Blob.objects.filter(name__in=Material.objects.filter(course__in=courses).values("file")).update(
+            ref_count=Coalesce(Subquery(references), Value(0))
+        )
+        for pk, banner, variants in courses.exclude(banner="").values_list("pk", "banner", "banner_variants"):
+            if (variants or {}).get("source") != banner:
+                jobs.enqueue(tasks.generate_banner_variants, key=f"banner:{pk}:{banner}", course_id=pk, banner=banner)
+        for pk in courses.filter(enrollment__is_completed=True).distinct().values_list("pk", flat=True):
+            jobs.enqueue(tasks.issue_certificates, key=f"certificates:{pk}", course_id=pk)
+        invalidate("categories", "all")
+
+    # A new row may reuse the id of a deleted course with cached payloads.
+    for pk in course_ids:
+        bump_version("course", pk)
+    ids = iter(course_ids)
+    while chunk := list(islice(ids, 500)):
+        search.index_courses(chunk)
+    active = courses.filter(is_active=True).values_list("pk", "title", "active_enrollment_count")
+    for pk, title, score in active.iterator(chunk_size=BATCH_SIZE):
+        autocomplete_index.upsert("course", pk, title, score)
+    categories = Category.objects.filter(
+        is_active=True, pk__in=TransferMapping.objects.filter(source=source, model="category").values("new_id")
+    )
+    for pk, title in categories.values_list("pk", "title").iterator(chunk_size=BATCH_SIZE):
+        autocomplete_index.upsert("category", pk, title)
+
+
+def import_content(directory, people=True, instructor=None, batch_size=BATCH_SIZE):
+    """
+    Import the export in ``directory``, skipping enrollments and completions
+    unless ``people``. Courses whose instructor username doesn't exist here
+    get ``instructor`` (a user id) if given, and are skipped otherwise;
+    enrollments and completions of unknown users are skipped. Return a
+    report with counts per model and up to ``MAX_REPORTED`` problem rows.
+    """
+    path = os.path.join(directory, CONTENT)
+    header = _read_header(path)
+    importer = _Importer(directory, uuid.UUID(header["source"]), instructor)
+    with open(path, encoding="utf-8") as lines:
+        next(lines)
+        batch, current = [], None
+        for line in lines:
+            record = json.loads(line)
+            model = record.get("model")
+            if model is None or (model in PEOPLE and not people):
+                continue
+            if model not in MODELS:
+                raise TransferError(f"Unknown model {model!r} in {path}.")
+            if batch and (model != current or len(batch) >= batch_size):
+                importer.run(current, batch)
+                batch = []
+            current = model
+            batch.append(record)
+        if batch:
+            importer.run(current, batch)
+    _finish(importer.source)
+    return importer.report
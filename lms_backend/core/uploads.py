@@ -0,0 +1,187 @@
+"""
+Resumable chunked uploads for material files and course banners.
+
+A client creates an :class:`~core.models.Upload` with the file name, total
+size and optionally its SHA-256, then PATCHes the bytes in order, each chunk
+carrying the ``Upload-Offset`` it starts at (and optionally an
+``Upload-Checksum: sha256 <base64>`` for that chunk). After a dropped
+connection it asks for the current offset and continues from there. Finalizing
+verifies the size and digest and moves the part file into media storage with
+a rename, so a multi-GB file is never copied or held in memory: chunk bodies
+are read from the request stream in ``BLOCK_SIZE`` pieces. Banners are
+checked with Pillow before they are attached, as the multipart path does.
+"""
+
+import base64
+import fcntl
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+from PIL import Image
+
+from .models import Upload
+
+BLOCK_SIZE = 1024 * 1024
+# Banner formats Pillow must recognize -> file extensions allowed for them.
+# Banners are served publicly with a type guessed from the extension, so
+# only image types may get through.
+BANNER_FORMATS = {
+    "JPEG": (".jpg", ".jpeg"),
+    "PNG": (".png",),
+    "GIF": (".gif",),
+    "WEBP": (".webp",),
+}
+
+
+class UploadError(Exception):
+    def __init__(self, detail, status=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status = status
+
+
+class _PartFile(File):
+    # FileSystemStorage moves files that expose temporary_file_path()
+    # instead of copying them.
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def part_path(upload):
+    return os.path.join(settings.UPLOAD_TEMP_DIR, f"{upload.pk}.part")
+
+
+def _banner_extension(filename):
+    extension = os.path.splitext(filename)[1].lower()
+    if not any(extension in extensions for extensions in BANNER_FORMATS.values()):
+        allowed = ", ".join(extension for extensions in BANNER_FORMATS.values() for extension in extensions)
+        raise UploadError(f"Banners must be images ({allowed}).")
+    return extension
+
+
+def verify_banner(upload):
+    """
+    Check that a finished banner upload is an image of an allowed format
+    whose extension matches its content, like ImageField does for multipart
+    uploads.
+    """
+    extension = _banner_extension(upload.filename)
+    try:
+        with Image.open(part_path(upload)) as image:
+            fmt = image.format
+            image.verify()
+    except Exception:
+        raise UploadError("Upload a valid image. The file you uploaded was either not an image or a corrupted image.")
+    if extension not in BANNER_FORMATS.get(fmt, ()):
+        raise UploadError(f"The file is a {fmt} image but is named {extension}.")
+
+
+def start(user, kind, filename, size, sha256=""):
+    if size > settings.UPLOAD_MAX_BYTES:
+        raise UploadError(f"Uploads are limited to {settings.UPLOAD_MAX_BYTES} bytes.", status=413)
+    if kind == "banner":
+        # Fail before the client sends the bytes.
+        _banner_extension(filename)
+    upload = Upload.objects.create(
+        user=user, kind=kind, filename=os.path.basename(filename), size=size, sha256=sha256.lower()
+    )
+    os.makedirs(settings.UPLOAD_TEMP_DIR, exist_ok=True)
+    open(part_path(upload), "wb").close()
+    return upload
+
+
+def _parse_checksum(header):
+    if not header:
+        return None
+    algorithm, _, value = header.partition(" ")
+    if algorithm.lower() != "sha256":
+        raise UploadError("Only sha256 chunk checksums are supported.")
+    try:
+        return base64.b64decode(value, validate=True)
+    except ValueError:
+        raise UploadError("Malformed Upload-Checksum header.")
+
+
+def append(upload, offset, stream, length, checksum_header=None):
+    """
+    Write ``length`` bytes from ``stream`` at ``offset`` and return the new
+    offset. The part file is locked for the write, so two requests racing on
+    the same upload can't interleave.
+    """
+    expected_digest = _parse_checksum(checksum_header)
+    if length > settings.UPLOAD_CHUNK_MAX_BYTES:
+        raise UploadError(f"Chunks are limited to {settings.UPLOAD_CHUNK_MAX_BYTES} bytes.", status=413)
+
+    with open(part_path(upload), "r+b") as part:
+        fcntl.flock(part, fcntl.LOCK_EX)
+        received = Upload.objects.filter(pk=upload.pk).values_list("received", flat=True).get()
+        if offset != received:
+            raise UploadError({"detail": "Offset mismatch.", "offset": received}, status=409)
+        if received + length > upload.size:
+            raise UploadError("Chunk runs past the declared upload size.")
+
+        digest = hashlib.sha256()
+        part.seek(received)
+        remaining = length
+        while remaining:
+            block = stream.read(min(BLOCK_SIZE, remaining)) if stream is not None else b""
+            if not block:
+                break
+            part.write(block)
+            digest.update(block)
+            remaining -= len(block)
+
+        # On failure drop the partial chunk so the client can simply resend it.
+        if remaining:
+            part.truncate(received)
+            raise UploadError("Request body ended before the declared chunk length.")
+        if expected_digest is not None and digest.digest() != expected_digest:
+            part.truncate(received)
+            raise UploadError("Chunk failed its checksum.", status=460)
+        part.flush()
+        os.fsync(part.fileno())
+
+        upload.received = received + length
+        Upload.objects.filter(pk=upload.pk).update(received=upload.received, updated_at=timezone.now())
+    return upload.received
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as part:
+        while block := part.read(BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def finish(upload, field_file):
+    """
+    Verify the completed upload and move it into ``field_file`` (a
+    FileField/ImageField on an unsaved or saved model instance). The caller
+    saves the instance and then deletes ``upload``.
+    """
+    if upload.received != upload.size:
+        raise UploadError({"detail": "Upload is incomplete.", "offset": upload.received}, status=409)
+    path = part_path(upload)
+    digest = file_digest(path)
+    if upload.sha256 and digest != upload.sha256:
+        raise UploadError("File does not match the declared sha256.")
+    if upload.kind == "banner":
+        verify_banner(upload)
+    with open(path, "rb") as part:
+        part_file = _PartFile(part)
+        # Content-addressed storage reuses the digest instead of rehashing.
+        part_file.sha256 = digest
+        field_file.save(upload.filename, part_file, save=False)
+    return digest
+
+
+def discard(upload):
+    try:
+        os.remove(part_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.delete()
@@ -1,36 +1,64 @@
 from django.urls import path
+from .async_views import (
+    course_detail,
+    student_enrolled_courses,
+    get_course_progress,
+    get_course_lessons,
+    completed_lessons,
+)
 from .views import (
     category_list_create,
     course_list_create,
-    course_detail,
+    course_search,
+    course_autocomplete,
     lesson_list_create,
     material_list_create,
     question_list_create,
-    student_enrolled_courses,
     enroll_in_course,
+    enroll_cohort,
     lesson_detail,
+    material_detail,
+    material_link,
     teacher_courses,
     mark_lesson_complete,
-    get_course_progress,
-    get_course_lessons,
     complete_lesson,
-    completed_lessons,
+    complete_lessons_batch,
+    catalog_cache_stats,
+    certificate_download,
+    job_stats,
+    job_detail,
+    upload_start,
+    upload_detail,
+    upload_finalize,
 )
 
 urlpatterns = [
     path("categories/", category_list_create),
     path("courses/", course_list_create),
+    path("courses/search/", course_search),
+    path("courses/autocomplete/", course_autocomplete),
     path("courses/<int:pk>/", course_detail),
     path("lessons/", lesson_list_create),
     path("materials/", material_list_create),
     path("questions/", question_list_create),
     path("student/courses/", student_enrolled_courses),
     path("student/enroll/", enroll_in_course),
+    path("courses/<int:course_id>/enrollments/", enroll_cohort),
     path("lessons/<int:pk>/", lesson_detail),
+    path("materials/<int:pk>/", material_detail),
+    path("materials/<int:pk>/link/", material_link),
     path("teacher/courses/", teacher_courses),
     path("student/lesson-complete/", mark_lesson_complete),
     path("student/progress/<int:course_id>/", get_course_progress),
     path("courses/<int:course_id>/lessons/", get_course_lessons),  # ✅ fixed here
     path("student/complete-lesson/", complete_lesson),
+    path("student/complete-lessons/", complete_lessons_batch),
     path("student/completed-lessons/<int:course_id>/", completed_lessons),
+    path("certificates/<int:enrollment_id>/", certificate_download),
+    path("cache/stats/", catalog_cache_stats),
+    path("jobs/stats/", job_stats),
+    path("jobs/<int:pk>/", job_detail),
+    path("uploads/", upload_start),
+    path("uploads/<uuid:pk>/", upload_detail),
+    path("uploads/<uuid:pk>/finalize/", upload_finalize),
 ]
@@ -1,16 +1,29 @@
+import logging
+
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes, parser_classes
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework.pagination import PageNumberPagination
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
+from rest_framework.pagination import PageNumberPagination, CursorPagination
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
 from drf_yasg.utils import swagger_auto_schema
-from django.db import IntegrityError
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Max, Q
+from django.http import FileResponse
 from rest_framework import viewsets
 from .models import Course
 from .serializers import CourseSerializer
 
-from .models import Category, Course, Lesson, Material, Enrollment, QuestionAnswer, LessonCompletion
+from . import certificates, enrollments, jobs, media, search, tasks, uploads
+from .autocomplete import index as autocomplete_index
+from .cache import bump_version, cache_stats, cached_payload
+from .conditional import conditional
+from .routers import pin_to_primary, replica_reads
+from .streaming import stream_json_array, use_streaming
+from .writequeue import run_write
+from .models import Category, Course, Lesson, Material, Enrollment, QuestionAnswer, LessonCompletion, Upload, Job
 from .serializers import (
     CategorySerializer,
     CourseSerializer,
@@ -21,6 +34,8 @@ from .serializers import (
     CourseCreateSerializer,
 )
 
+logger = logging.getLogger(__name__)
+
 
 class MyPagination(PageNumberPagination):
     page_size = 10
@@ -28,18 +43,71 @@ class MyPagination(PageNumberPagination):
     max_page_size = 100
 
 
+class MyCursorPagination(CursorPagination):
+    # Keyset pagination on (created_at, id): every page is an indexed range
+    # scan, so deep pages cost the same as the first one.
+    page_size = 10
+    page_size_query_param = "limit"
+    max_page_size = 100
+    ordering = ("-created_at", "-id")
+
+
+def use_cursor_pagination(request):
+    return request.query_params.get("pagination") == "cursor" or "cursor" in request.query_params
+
+
+# ------------------------ Conditional GET fingerprints ------------------------
+
+def course_fingerprint(request, pk):
+    row = Course.objects.filter(pk=pk).values_list(
+        "updated_at", "category__updated_at", "instructor__username", "instructor__first_name",
+        "instructor__last_name", "lesson_count", "active_enrollment_count", "completion_count",
+    ).first()
+    if row is None:
+        return None
+    # The banner URL is absolute, so the representation varies by host.
+    return (row, request.get_host()), max(row[0], row[1])
+
+
+def lesson_fingerprint(request, pk):
+    updated_at = Lesson.objects.filter(pk=pk).values_list("updated_at", flat=True).first()
+    return None if updated_at is None else ((pk, updated_at), updated_at)
+
+
+def material_fingerprint(request, pk):
+    updated_at = Material.objects.filter(pk=pk).values_list("updated_at", flat=True).first()
+    return None if updated_at is None else ((pk, updated_at), updated_at)
+
+
+def course_lessons_fingerprint(request, course_id=None, pk=None):
+    row = (
+        Course.objects.filter(pk=course_id or pk)
+        .annotate(latest=Max("lesson__updated_at"))
+        .values_list("lesson_count", "latest")
+        .first()
+    )
+    # No Last-Modified: deleting a lesson doesn't move the max timestamp,
+    # only the count in the ETag.
+    return None if row is None else (row, None)
+
+
 # ------------------------ Category ------------------------
 
 @swagger_auto_schema(method="post", request_body=CategorySerializer)
 @api_view(["GET", "POST"])
 @permission_classes([AllowAny])
+@replica_reads
 def category_list_create(request):
     if request.method == "GET":
-        categories = Category.objects.all()
-        paginator = MyPagination()
-        result_page = paginator.paginate_queryset(categories, request)
-        serializer = CategorySerializer(result_page, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        def build():
+            categories = Category.objects.all()
+            paginator = MyPagination()
+            result_page = paginator.paginate_queryset(categories, request)
+            serializer = CategorySerializer(result_page, many=True)
+            return paginator.get_paginated_response(serializer.data).data
+
+        data = cached_payload("categories", [("categories", "all")], build, vary=request.build_absolute_uri())
+        return Response(data)
 
     if not request.user.is_authenticated or request.user.role != "admin":
         return Response({"detail": "Only admin can create categories."}, status=403)
@@ -57,9 +125,15 @@ def category_list_create(request):
 @api_view(["GET", "POST"])
 @permission_classes([IsAuthenticated])
 @parser_classes([MultiPartParser, FormParser])
+@replica_reads
 def course_list_create(request):
     if request.method == "GET":
-        courses = Course.objects.all()
+        courses = Course.objects.for_listing()
+        if use_cursor_pagination(request):
+            paginator = MyCursorPagination()
+            result_page = paginator.paginate_queryset(courses, request)
+            serializer = CourseSerializer(result_page, many=True, context={"request": request})
+            return paginator.get_paginated_response(serializer.data)
         serializer = CourseSerializer(courses, many=True, context={"request": request})
         return Response(serializer.data)
 
@@ -71,22 +145,81 @@ def course_list_create(request):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+# ------------------------ Course Search ------------------------
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+@replica_reads
+def course_search(request):
+    query = request.query_params.get("q", "").strip()
+    if not query:
+        return Response({"detail": "Query parameter 'q' is required."}, status=400)
+
+    if not search.is_available():
+        # Non-SQLite databases: plain substring match, newest first.
+        courses = Course.objects.for_listing().filter(is_active=True).filter(
+            Q(title__icontains=query) | Q(description__icontains=query) | Q(category__title__icontains=query)
+        )
+        paginator = MyCursorPagination()
+        result_page = paginator.paginate_queryset(courses, request)
+        serializer = CourseSerializer(result_page, many=True, context={"request": request})
+        return paginator.get_paginated_response(serializer.data)
+
+    try:
+        limit = min(int(request.query_params.get("limit", MyCursorPagination.page_size)), MyCursorPagination.max_page_size)
+    except ValueError:
+        return Response({"detail": "Invalid limit."}, status=400)
+    after = None
+    if "cursor" in request.query_params:
+        after = search.decode_cursor(request.query_params["cursor"])
+        if after is None:
+            return Response({"detail": "Invalid cursor."}, status=400)
+
+    hits, has_more = search.search(query, max(limit, 1), after)
+    courses = Course.objects.for_listing().in_bulk([course_id for course_id, _ in hits])
+    serializer = CourseSerializer(
+        [courses[course_id] for course_id, _ in hits if course_id in courses], many=True, context={"request": request}
+    )
+
+    next_url = None
+    if has_more:
+        last_id, last_score = hits[-1]
+        params = request.query_params.copy()
+        params["cursor"] = search.encode_cursor(last_score, last_id)
+        next_url = request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+    return Response({"next": next_url, "results": serializer.data})
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def course_autocomplete(request):
+    try:
+        limit = min(int(request.query_params.get("limit", 8)), 20)
+    except ValueError:
+        return Response({"detail": "Invalid limit."}, status=400)
+    results = autocomplete_index.suggest(request.query_params.get("q", ""), max(limit, 1))
+    return Response({"results": results})
+
+
 # ------------------------ Course Detail ------------------------
 
 @swagger_auto_schema(methods=["patch", "put"], request_body=CourseSerializer)
 @api_view(["GET", "PATCH", "PUT", "DELETE"])
 @permission_classes([AllowAny])
 @parser_classes([MultiPartParser, FormParser])
+@conditional(course_fingerprint)
 def course_detail(request, pk):
+    if request.method == "GET":
+        data = _course_detail_payload(request, pk)
+        if data is None:
+            return Response({"detail": "Course not found"}, status=404)
+        return Response(data)
+
     try:
-        course = Course.objects.get(pk=pk)
+        course = Course.objects.for_listing().get(pk=pk)
     except Course.DoesNotExist:
         return Response({"detail": "Course not found"}, status=404)
 
-    if request.method == "GET":
-        serializer = CourseSerializer(course, context={"request": request})
-        return Response(serializer.data)
-
     if not request.user.is_authenticated or request.user != course.instructor:
         return Response({"detail": "Only the course owner can modify or delete."}, status=403)
 
@@ -103,6 +236,25 @@ def course_detail(request, pk):
         return Response({"detail": "Course deleted"}, status=status.HTTP_204_NO_CONTENT)
 
 
+def _course_detail_payload(request, pk):
+    def dependencies():
+        # Category and instructor are embedded in the payload.
+        related = Course.objects.filter(pk=pk).values_list("category_id", "instructor_id").first()
+        if related is None:
+            return None
+        return [("category", related[0]), ("user", related[1])]
+
+    def build():
+        course = Course.objects.for_listing().filter(pk=pk).first()
+        if course is None:
+            return None
+        return CourseSerializer(course, context={"request": request}).data
+
+    return cached_payload(
+        "course_detail", [("course", pk)], build, vary=request.build_absolute_uri(), dependencies=dependencies
+    )
+
+
 # ------------------------ Lesson ------------------------
 
 @swagger_auto_schema(method="post", request_body=LessonSerializer)
@@ -115,7 +267,7 @@ def lesson_list_create(request):
         if course_id:
             lessons = lessons.filter(course__id=course_id)
 
-        paginator = MyPagination()
+        paginator = MyCursorPagination() if use_cursor_pagination(request) else MyPagination()
         result_page = paginator.paginate_queryset(lessons, request)
         serializer = LessonSerializer(result_page, many=True)
         return paginator.get_paginated_response(serializer.data)
@@ -157,7 +309,9 @@ def material_list_create(request):
             materials = Material.objects.filter(course__instructor=request.user)
         else:
             materials = Material.objects.all()
-        paginator = MyPagination()
+        if use_streaming(request):
+            return stream_json_array(request, materials, MaterialSerializer)
+        paginator = MyCursorPagination() if use_cursor_pagination(request) else MyPagination()
         result_page = paginator.paginate_queryset(materials, request)
         serializer = MaterialSerializer(result_page, many=True)
         return paginator.get_paginated_response(serializer.data)
@@ -189,7 +343,9 @@ def material_list_create(request):
 def question_list_create(request):
     if request.method == "GET":
         questions = QuestionAnswer.objects.all()
-        paginator = MyPagination()
+        if use_streaming(request):
+            return stream_json_array(request, questions, QuestionAnswerSerializer)
+        paginator = MyCursorPagination() if use_cursor_pagination(request) else MyPagination()
         result_page = paginator.paginate_queryset(questions, request)
         serializer = QuestionAnswerSerializer(result_page, many=True)
         return paginator.get_paginated_response(serializer.data)
@@ -203,16 +359,6 @@ def question_list_create(request):
 
 # ------------------------ Enrolled Courses ------------------------
 
-@api_view(["GET"])
-@permission_classes([IsAuthenticated])
-def student_enrolled_courses(request):
-    if request.user.role != "student":
-        return Response({"detail": "Only students can access this endpoint."}, status=403)
-
-    enrollments = Enrollment.objects.filter(user=request.user, is_active=True).select_related("course")
-    serializer = EnrollmentSerializer(enrollments, many=True, context={"request": request})
-    return Response(serializer.data)
-
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
@@ -226,10 +372,13 @@ def enroll_in_course(request):
 
         course = Course.objects.get(id=course_id)
 
-        if Enrollment.objects.filter(user=user, course=course, is_active=True).exists():
+        # The unique active-enrollment constraint makes the duplicate check
+        # race-free; no separate exists() round trip.
+        try:
+            enrollment = run_write(Enrollment.objects.create, user=user, course=course, is_active=True)
+        except IntegrityError:
             return Response({"detail": "Already enrolled in this course."}, status=400)
-
-        enrollment = Enrollment.objects.create(user=user, course=course, is_active=True)
+        pin_to_primary(user)
         serializer = EnrollmentSerializer(enrollment, context={"request": request})
         return Response(serializer.data, status=201)
 
@@ -239,10 +388,40 @@ def enroll_in_course(request):
         return Response({"detail": "Error", "error": str(e)}, status=500)
 
 
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+@parser_classes([JSONParser, MultiPartParser, FormParser])
+def enroll_cohort(request, course_id):
+    course = Course.objects.filter(pk=course_id).first()
+    if course is None:
+        return Response({"detail": "Course not found."}, status=404)
+    if not (request.user.is_staff or course.instructor_id == request.user.pk):
+        return Response({"detail": "Only the course instructor can enroll students."}, status=403)
+
+    upload = request.FILES.get("file")
+    if upload is not None:
+        by = request.data.get("by", "id")
+        if by not in enrollments.LOOKUPS:
+            return Response({"detail": "by must be one of id, email, username."}, status=400)
+        identifiers = enrollments.read_identifiers(upload.file, by)
+    else:
+        keys = {"user_ids": "id", "emails": "email", "usernames": "username"}
+        given = [key for key in keys if key in request.data]
+        if len(given) != 1 or not isinstance(request.data[given[0]], list):
+            return Response(
+                {"detail": "Send one list of user_ids, emails or usernames, or a CSV file."}, status=400
+            )
+        by, identifiers = keys[given[0]], request.data[given[0]]
+
+    report = enrollments.enroll_cohort(course, identifiers, by)
+    return Response(report, status=201 if report["enrolled"] else 200)
+
+
 # ------------------------ Lesson & Material Detail ------------------------
 
 @api_view(["GET", "PATCH", "DELETE"])
 @permission_classes([IsAuthenticated])
+@conditional(lesson_fingerprint)
 def lesson_detail(request, pk):
     try:
         lesson = Lesson.objects.select_related("course").get(pk=pk)
@@ -270,6 +449,7 @@ def lesson_detail(request, pk):
 
 @api_view(["GET", "PATCH", "DELETE"])
 @permission_classes([IsAuthenticated])
+@conditional(material_fingerprint)
 def material_detail(request, pk):
     try:
         material = Material.objects.select_related("course").get(pk=pk)
@@ -295,19 +475,29 @@ def material_detail(request, pk):
         return Response({"detail": "Material deleted successfully"}, status=204)
 
 
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def material_link(request, pk):
+    """A short-lived signed URL for the material's file, usable in <a href> and <video src>."""
+    file = media.readable_materials(request.user).filter(pk=pk).values_list("file", flat=True).first()
+    if not file:
+        return Response({"detail": "Material not found."}, status=404)
+    return Response({
+        "url": request.build_absolute_uri(media.signed_url(file)),
+        "expires_in": settings.MEDIA_SIGNED_URL_SECONDS,
+    })
+
+
 # ------------------------ Public Course Lessons ------------------------
 
 @api_view(["GET"])
 @permission_classes([AllowAny])
+@conditional(course_lessons_fingerprint)
 def course_lessons_public(request, pk):
-    try:
-        course = Course.objects.get(pk=pk)
-    except Course.DoesNotExist:
+    data = cached_payload("course_lessons", [("course", pk)], lambda: _course_lessons_payload(pk))
+    if data is None:
         return Response({"detail": "Course not found"}, status=404)
-
-    lessons = Lesson.objects.filter(course=course)
-    serializer = LessonSerializer(lessons, many=True)
-    return Response(serializer.data)
+    return Response(data)
 
 
 @api_view(["GET"])
@@ -315,7 +505,14 @@ def course_lessons_public(request, pk):
 def teacher_courses(request):
     if request.user.role != "teacher":
         return Response({"error": "Only teachers can access this."}, status=403)
-    courses = Course.objects.filter(instructor=request.user)
+    courses = Course.objects.for_listing().filter(instructor=request.user)
+    if use_cursor_pagination(request):
+        paginator = MyCursorPagination()
+        result_page = paginator.paginate_queryset(courses, request)
+        serializer = CourseSerializer(result_page, many=True, context={"request": request})
+        return paginator.get_paginated_response(serializer.data)
+    if use_streaming(request):
+        return stream_json_array(request, courses, CourseSerializer, context={"request": request})
     serializer = CourseSerializer(courses, many=True, context={"request": request})
     return Response(serializer.data)
 
@@ -342,7 +539,7 @@ def teacher_course_list_create(request):
         return Response({'error': 'Only teachers can access this.'}, status=403)
 
     if request.method == 'GET':
-        courses = Course.objects.filter(instructor=request.user)
+        courses = Course.objects.for_listing().filter(instructor=request.user)
         serializer = CourseSerializer(courses, many=True, context={"request": request})
         return Response(serializer.data)
 
@@ -373,32 +570,13 @@ def teacher_course_update_delete(request, pk):
         course.delete()
         return Response(status=204)
     
-@api_view(["GET"])
-@permission_classes([IsAuthenticated])
-def get_course_progress(request, course_id):
-    user = request.user
-    try:
-        enrollment = Enrollment.objects.get(user=user, course_id=course_id)
-        return Response({
-            "progress_percent": enrollment.progress,
-            "is_completed": enrollment.is_completed
-        })
-    except Enrollment.DoesNotExist:
-        return Response({"progress_percent": 0})
 
 
-
-@api_view(['GET'])
-@permission_classes([AllowAny])  # or IsAuthenticated if needed
-def get_course_lessons(request, course_id):
-    try:
-        course = Course.objects.get(id=course_id)
-    except Course.DoesNotExist:
-        return Response({'error': 'Course not found'}, status=404)
-
-    lessons = Lesson.objects.filter(course=course)
-    serializer = LessonSerializer(lessons, many=True)
-    return Response(serializer.data)
+def _course_lessons_payload(course_id):
+    if not Course.objects.filter(pk=course_id).exists():
+        return None
+    lessons = Lesson.objects.filter(course_id=course_id)
+    return LessonSerializer(lessons, many=True).data
 
 
 @api_view(["POST"])
@@ -407,21 +585,26 @@ def complete_lesson(request):
     try:
         user = request.user
         lesson_id = request.data.get("lesson_id")
-        print("User:", user)
-        print("Lesson ID:", lesson_id)
 
         if not lesson_id:
             return Response({"error": "Missing lesson_id"}, status=400)
 
         try:
-            lesson = Lesson.objects.get(id=lesson_id)
+            lesson = Lesson.objects.select_related("course").get(id=lesson_id)
         except Lesson.DoesNotExist:
             return Response({"error": "Lesson not found"}, status=404)
 
         if user.role != "student":
             return Response({"error": "Only students can complete lessons"}, status=403)
 
-        completed, created = LessonCompletion.objects.get_or_create(
+        enrollment = Enrollment.objects.filter(user=user, course=lesson.course, is_active=True).first()
+        if enrollment is None:
+            return Response({"error": "Enrollment not found"}, status=404)
+
+        # The completion insert and the enrollment's counter/progress UPDATE
+        # (see core.signals) commit together; no per-course COUNTs needed.
+        completed, created = run_write(
+            LessonCompletion.objects.get_or_create,
             student=user,
             lesson=lesson
         )
@@ -429,44 +612,91 @@ def complete_lesson(request):
         if not created:
             return Response({"message": "Lesson already marked as complete"}, status=200)
 
-        try:
-            enrollment = Enrollment.objects.get(user=user, course=lesson.course)
-        except Enrollment.DoesNotExist:
-            return Response({"error": "Enrollment not found"}, status=404)
+        pin_to_primary(user)
+        enrollment.refresh_from_db(fields=["progress", "is_completed", "is_certificate_ready"])
+        if enrollment.is_completed and not enrollment.is_certificate_ready:
+            _issue_certificates_later(lesson.course_id)
+        return Response({"message": "Lesson marked as complete", "progress": enrollment.progress}, status=200)
 
-        total_lessons = Lesson.objects.filter(course=lesson.course).count()
-        completed_count = LessonCompletion.objects.filter(student=user, lesson__course=lesson.course).count()
+    except Exception as e:
+        logger.exception("Completing lesson %s for user %s failed", request.data.get("lesson_id"), request.user.pk)
+        return Response({"error": "Internal Server Error", "details": str(e)}, status=500)
 
-        progress_percent = int((completed_count / total_lessons) * 100)
-        enrollment.progress = progress_percent
-        if progress_percent >= 100:
-            enrollment.is_completed = True
-        enrollment.save()
 
-        return Response({"message": "Lesson marked as complete", "progress": progress_percent}, status=200)
+def _issue_certificates_later(course_id):
+    # One job per course picks up every student who finished it meanwhile.
+    jobs.enqueue(tasks.issue_certificates, key=f"certificates:{course_id}", course_id=course_id)
 
-    except Exception as e:
-        print("🔥 Server Error:", str(e))
-        return Response({"error": "Internal Server Error", "details": str(e)}, status=500)
 
-    
-@api_view(["GET"])
-@permission_classes([IsAuthenticated])
-def completed_lessons(request, course_id):
-    try:
-        if not hasattr(request.user, "role") or request.user.role != "student":
-            return Response({"error": "Only students can view completed lessons"}, status=403)
+MAX_BATCH_COMPLETIONS = 500
 
-        lesson_ids = LessonCompletion.objects.filter(
-            student=request.user,
-            lesson__course_id=course_id
-        ).values_list("lesson_id", flat=True)
 
-        return Response(list(lesson_ids), status=200)
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def complete_lessons_batch(request):
+    user = request.user
+    if user.role != "student":
+        return Response({"error": "Only students can complete lessons"}, status=403)
+
+    lesson_ids = request.data.get("lesson_ids")
+    if not isinstance(lesson_ids, list) or not lesson_ids:
+        return Response({"error": "lesson_ids must be a non-empty list"}, status=400)
+    if len(lesson_ids) > MAX_BATCH_COMPLETIONS:
+        return Response({"error": f"At most {MAX_BATCH_COMPLETIONS} lessons per batch"}, status=400)
+    try:
+        lesson_ids = list(dict.fromkeys(int(lesson_id) for lesson_id in lesson_ids))
+    except (TypeError, ValueError):
+        return Response({"error": "lesson_ids must be integers"}, status=400)
+
+    lessons = dict(Lesson.objects.filter(id__in=lesson_ids).values_list("id", "course_id"))
+    enrolled_courses = set(
+        Enrollment.objects.filter(user=user, course_id__in=set(lessons.values()), is_active=True)
+        .values_list("course_id", flat=True)
+    )
+    already_done = set(
+        LessonCompletion.objects.filter(student=user, lesson_id__in=lessons).values_list("lesson_id", flat=True)
+    )
+
+    results = []
+    new_per_course = {}
+    to_create = []
+    for lesson_id in lesson_ids:
+        course_id = lessons.get(lesson_id)
+        if course_id is None:
+            outcome = "not_found"
+        elif course_id not in enrolled_courses:
+            outcome = "not_enrolled"
+        elif lesson_id in already_done:
+            outcome = "already_completed"
+        else:
+            outcome = "completed"
+            to_create.append(LessonCompletion(student=user, lesson_id=lesson_id, course_id=course_id))
+            new_per_course[course_id] = new_per_course.get(course_id, 0) + 1
+        results.append({"lesson_id": lesson_id, "status": outcome})
+
+    # bulk_create skips the per-row signals, so the course counters and the
+    # affected enrollments are brought up to date once per course here.
+    with transaction.atomic():
+        LessonCompletion.objects.bulk_create(to_create, ignore_conflicts=True)
+        # ignore_conflicts drops rows a concurrent request inserted first,
+        # so recount rather than adding what was sent.
+        Course.objects.filter(pk__in=new_per_course).recount_counters("completion_count")
+        for course_id in new_per_course:
+            transaction.on_commit(lambda course_id=course_id: bump_version("course", course_id))
+        enrollments = Enrollment.objects.filter(user=user, course_id__in=new_per_course)
+        enrollments.recompute_progress()
+    pin_to_primary(user)
+
+    progress = []
+    for course_id, value, done, ready in Enrollment.objects.filter(
+        user=user, course_id__in=enrolled_courses
+    ).values_list("course_id", "progress", "is_completed", "is_certificate_ready"):
+        progress.append({"course_id": course_id, "progress": value, "is_completed": done})
+        if done and not ready and course_id in new_per_course:
+            _issue_certificates_later(course_id)
+    return Response({"results": results, "progress": progress}, status=200)
 
-    except Exception as e:
-        print("[ERROR] completed_lessons:", str(e))
-        return Response({"error": "Failed to fetch completed lessons"}, status=500)
+    
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
@@ -478,7 +708,7 @@ def create_lesson(request):
             return Response(serializer.data, status=201)
         return Response(serializer.errors, status=400)
     except Exception as e:
-        print("❌ Add lesson error:", str(e))
+        logger.exception("Creating a lesson failed")
         return Response({"error": "Internal Server Error", "details": str(e)}, status=500)
 
 @api_view(['POST'])
@@ -492,9 +722,169 @@ def create_course(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class CourseViewSet(viewsets.ModelViewSet):
-    queryset = Course.objects.all()
+    queryset = Course.objects.for_listing()
     serializer_class = CourseSerializer
     permission_classes = [IsAuthenticated]
 
     def perform_create(self, serializer):
-        serializer.save(instructor=self.request.user)
\ No newline at end of file
+        serializer.save(instructor=self.request.user)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def certificate_download(request, enrollment_id):
+    enrollment = Enrollment.objects.select_related("course").filter(pk=enrollment_id).first()
+    if enrollment is None:
+        return Response({"error": "Enrollment not found"}, status=404)
+    user = request.user
+    if not (user.is_staff or enrollment.user_id == user.pk or enrollment.course.instructor_id == user.pk):
+        return Response({"error": "You do not have access to this certificate"}, status=403)
+    if not enrollment.is_completed:
+        return Response({"error": "The course has not been completed yet"}, status=409)
+
+    path = certificates.ensure(enrollment)
+    response = FileResponse(
+        open(path, "rb"), as_attachment=True, filename=f"certificate-{enrollment.pk}.pdf",
+        content_type="application/pdf",
+    )
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def catalog_cache_stats(request):
+    return Response(cache_stats())
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def job_stats(request):
+    try:
+        window = max(int(request.GET.get("window", 3600)), 1)
+    except ValueError:
+        return Response({"detail": "window must be a number of seconds."}, status=400)
+    return Response(jobs.stats(window))
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def job_detail(request, pk):
+    try:
+        job = Job.objects.get(pk=pk)
+    except Job.DoesNotExist:
+        return Response({"detail": "Job not found."}, status=404)
+    return Response({
+        "id": job.pk,
+        "queue": job.queue,
+        "task": job.task,
+        "status": job.status,
+        "attempts": job.attempts,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "result": job.result,
+        "error": job.last_error.strip().splitlines()[-1] if job.last_error else None,
+    })
+
+
+# ------------------------ Resumable Uploads ------------------------
+
+def _upload_error(exc):
+    detail = exc.detail if isinstance(exc.detail, dict) else {"detail": exc.detail}
+    return Response(detail, status=exc.status)
+
+
+def _upload_state(upload):
+    return {"id": str(upload.pk), "kind": upload.kind, "offset": upload.received, "size": upload.size}
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def upload_start(request):
+    if request.user.role != "teacher":
+        return Response({"detail": "Only teachers can upload files."}, status=403)
+
+    kind = request.data.get("kind")
+    filename = request.data.get("filename")
+    try:
+        size = int(request.data.get("size"))
+    except (TypeError, ValueError):
+        size = -1
+    if kind not in ("material", "banner") or not filename or size < 0:
+        return Response({"detail": "kind (material|banner), filename and size are required."}, status=400)
+
+    try:
+        upload = uploads.start(request.user, kind, filename, size, request.data.get("sha256") or "")
+    except uploads.UploadError as exc:
+        return _upload_error(exc)
+    data = _upload_state(upload)
+    data["chunk_size"] = settings.UPLOAD_CHUNK_MAX_BYTES
+    return Response(data, status=201)
+
+
+@api_view(["GET", "PATCH", "DELETE"])
+@permission_classes([IsAuthenticated])
+def upload_detail(request, pk):
+    upload = Upload.objects.filter(pk=pk, user=request.user).first()
+    if upload is None:
+        return Response({"detail": "Upload not found."}, status=404)
+
+    if request.method == "GET":
+        return Response(_upload_state(upload), headers={"Upload-Offset": str(upload.received)})
+
+    if request.method == "DELETE":
+        uploads.discard(upload)
+        return Response(status=204)
+
+    # PATCH: the raw body is the chunk; it's read from the stream, never parsed.
+    try:
+        offset = int(request.headers["Upload-Offset"])
+    except (KeyError, ValueError):
+        return Response({"detail": "Upload-Offset header is required."}, status=400)
+    length = request.META.get("CONTENT_LENGTH")
+    if not length:
+        return Response({"detail": "Content-Length is required."}, status=411)
+
+    try:
+        offset = uploads.append(upload, offset, request.stream, int(length), request.headers.get("Upload-Checksum"))
+    except uploads.UploadError as exc:
+        return _upload_error(exc)
+    return Response(_upload_state(upload), headers={"Upload-Offset": str(offset)})
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def upload_finalize(request, pk):
+    upload = Upload.objects.filter(pk=pk, user=request.user).first()
+    if upload is None:
+        return Response({"detail": "Upload not found."}, status=404)
+
+    course = Course.objects.filter(pk=request.data.get("course"), instructor=request.user).first()
+    if course is None:
+        return Response({"detail": "Course not found or not yours."}, status=404)
+
+    if upload.kind == "material":
+        target = Material(
+            course=course,
+            title=request.data.get("title", ""),
+            description=request.data.get("description", ""),
+            file_type=request.data.get("file_type", ""),
+        )
+        try:
+            target.full_clean(exclude=["file"])
+        except ValidationError as exc:
+            return Response(exc.message_dict, status=400)
+        field_file, serializer_class = target.file, MaterialSerializer
+    else:
+        target, field_file, serializer_class = course, course.banner, CourseSerializer
+
+    try:
+        digest = uploads.finish(upload, field_file)
+    except uploads.UploadError as exc:
+        return _upload_error(exc)
+    target.save()
+    uploads.discard(upload)
+
+    data = serializer_class(target, context={"request": request}).data
+    return Response({**data, "sha256": digest}, status=201 if upload.kind == "material" else 200)
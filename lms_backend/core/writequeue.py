@@ -0,0 +1,88 @@
+"""
+Opt-in in-process write queue for SQLite deployments.
+
+SQLite allows one writer at a time, so concurrent request threads mostly
+queue up on the database lock. With ``SQLITE_WRITE_QUEUE = True`` small writes
+are handed to a single writer thread instead, which groups whatever is waiting
+into one transaction (each write in its own savepoint) and hands the results
+back to the callers. Without the setting, ``run_write`` just calls through.
+"""
+
+import queue
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+
+class WriteQueue:
+    def __init__(self, max_batch=64, max_wait=0.002):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        self._ensure_started()
+        future = Future()
+        self._queue.put((future, fn, args, kwargs))
+        return future
+
+    def _ensure_started(self):
+        # Started lazily so the thread is created in each gunicorn worker
+        # after the fork, not in the master.
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="sqlite-write-queue", daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get(timeout=self.max_wait))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            close_old_connections()
+            outcomes = []
+            try:
+                with transaction.atomic():
+                    for future, fn, args, kwargs in batch:
+                        try:
+                            with transaction.atomic():
+                                outcomes.append((future, fn(*args, **kwargs), None))
+                        except Exception as exc:
+                            outcomes.append((future, None, exc))
+            except Exception as exc:
+                # The shared commit failed, so none of the writes happened.
+                for future, *_ in batch:
+                    future.set_exception(exc)
+                continue
+            for future, result, exc in outcomes:
+                if exc is not None:
+                    future.set_exception(exc)
+                else:
+                    future.set_result(result)
+
+
+write_queue = WriteQueue(
+    max_batch=getattr(settings, "SQLITE_WRITE_QUEUE_MAX_BATCH", 64),
+    max_wait=getattr(settings, "SQLITE_WRITE_QUEUE_MAX_WAIT", 0.002),
+)
+
+
+def run_write(fn, *args, **kwargs):
+    """Run ``fn`` in a transaction, through the write queue when it's enabled."""
+    if getattr(settings, "SQLITE_WRITE_QUEUE", False):
+        return write_queue.submit(fn, *args, **kwargs).result()
+    with transaction.atomic():
+        return fn(*args, **kwargs)
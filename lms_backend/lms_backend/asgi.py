@@ -14,3 +14,11 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lms_backend.settings')
 
 application = get_asgi_application()
+
+# Build the autocomplete index in the background as soon as the worker starts,
+# and run background jobs in this process unless JOB_EMBEDDED_WORKERS is 0.
+from core import jobs  # noqa: E402
+from core.autocomplete import index as autocomplete_index  # noqa: E402
+
+autocomplete_index.warm()
+jobs.start_embedded_worker()
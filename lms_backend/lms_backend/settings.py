@@ -60,8 +60,76 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            # Wait for the write lock instead of failing with "database is locked",
+            # and take it up front so read-then-write transactions can't deadlock.
+            "timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT", "20")),
+            "transaction_mode": "IMMEDIATE",
+            # Run on every new connection: WAL lets readers proceed during a write.
+            "init_command": (
+                "PRAGMA journal_mode=WAL;"
+                "PRAGMA synchronous=NORMAL;"
+                f"PRAGMA cache_size=-{int(os.getenv('SQLITE_CACHE_KB', '65536'))};"
+                f"PRAGMA mmap_size={int(os.getenv('SQLITE_MMAP_BYTES', str(256 * 1024 * 1024)))};"
+                "PRAGMA temp_store=MEMORY;"
+            ),
+        },
+    }
+}
+
+# Read replicas: comma-separated SQLite paths, kept in sync with the primary by
+# `manage.py sync_replicas`. Only views marked @replica_reads use them.
+READ_REPLICAS = []
+for index, path in enumerate(filter(None, os.getenv("DATABASE_REPLICAS", "").split(","))):
+    alias = f"replica{index + 1}"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "NAME": path.strip(),
+        "TEST": {"MIRROR": "default"},
     }
+    READ_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["core.routers.ReadReplicaRouter"]
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", "5"))
+# Pins must be visible to every worker process, like the catalog versions.
+REPLICA_PIN_CACHE_ALIAS = "versions"
+
+# Funnel small writes (enrollments, lesson completions) through one writer
+# thread per process that commits them in batches; see core/writequeue.py.
+SQLITE_WRITE_QUEUE = os.getenv("SQLITE_WRITE_QUEUE", "False") == "True"
+
+# Catalog response cache (core/cache.py). Payloads are keyed by the version
+# numbers of the rows they were built from, so they can live in per-process
+# memory ("default"). The versions themselves must be shared by every process
+# that reads or bumps them (web workers, `manage.py run_jobs`, management
+# commands), otherwise a worker keeps serving a payload another process has
+# invalidated. They default to the database cache: run `manage.py
+# createcachetable` once per database. CACHE_VERSION_BACKEND/LOCATION can
+# point them at Redis or Memcached instead. A per-process backend (LocMem,
+# Dummy) for "versions" fails the core.E001 system check.
+_version_backend = os.getenv("CACHE_VERSION_BACKEND", "django.core.cache.backends.db.DatabaseCache")
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", "lms-cache"),
+    },
+    "versions": {
+        "BACKEND": _version_backend,
+        "LOCATION": os.getenv("CACHE_VERSION_LOCATION", "lms_cache_versions"),
+        "TIMEOUT": None,
+    },
 }
+if _version_backend.endswith((".DatabaseCache", ".FileBasedCache")):
+    # These backends cull by entry count; a culled version is merely re-seeded
+    # (a miss), but there is no reason to cull them at all.
+    CACHES["versions"]["OPTIONS"] = {"MAX_ENTRIES": int(os.getenv("CACHE_VERSION_MAX_ENTRIES", "10000000"))}
+CATALOG_CACHE_ALIAS = "default"
+CATALOG_VERSION_CACHE_ALIAS = "versions"
+CATALOG_CACHE_TIMEOUT = int(os.getenv("CATALOG_CACHE_TIMEOUT", "300"))
+
+# In-process title autocomplete (core/autocomplete.py).
+AUTOCOMPLETE_MAX_ENTRIES = int(os.getenv("AUTOCOMPLETE_MAX_ENTRIES", "1000000"))
+AUTOCOMPLETE_REFRESH_SECONDS = int(os.getenv("AUTOCOMPLETE_REFRESH_SECONDS", "300"))
 
 AUTH_USER_MODEL = "users.User"
 
@@ -70,8 +138,31 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
     "ROTATE_REFRESH_TOKENS": True,
     "BLACKLIST_AFTER_ROTATION": True,
+    # Embeds username/role/is_staff and the token version so API requests
+    # skip the user query (users/authentication.py).
+    "TOKEN_OBTAIN_SERIALIZER": "users.authentication.ClaimsTokenObtainPairSerializer",
+    # Rotation/logout revoke refresh tokens in users.blacklist rather than
+    # the token_blacklist app.
+    "TOKEN_REFRESH_SERIALIZER": "users.blacklist.BlacklistTokenRefreshSerializer",
+    "TOKEN_BLACKLIST_SERIALIZER": "users.blacklist.BlacklistTokenSerializer",
 }
 
+# How long a user's token version is cached. Revocations reach other
+# processes through the cache, or after this many seconds with the
+# per-process default LocMemCache.
+AUTH_VERSION_CACHE_SECONDS = int(os.getenv("AUTH_VERSION_CACHE_SECONDS", "300"))
+
+# Refresh-token blacklist (users/blacklist.py): Bloom filter size per process
+# (2**23 bits = 1 MiB, ~0.05% false positives at 500k revoked tokens), how
+# often it picks up revocations made by other processes, and how often
+# expired entries are pruned and the filter rebuilt.
+TOKEN_BLACKLIST_BLOOM_BITS = int(os.getenv("TOKEN_BLACKLIST_BLOOM_BITS", 2 ** 23))
+TOKEN_BLACKLIST_SYNC_SECONDS = float(os.getenv("TOKEN_BLACKLIST_SYNC_SECONDS", "1"))
+TOKEN_BLACKLIST_PRUNE_SECONDS = float(os.getenv("TOKEN_BLACKLIST_PRUNE_SECONDS", "3600"))
+
+# Password hashing threads for POST /api/users/import/ (0: one per CPU).
+USER_IMPORT_THREADS = int(os.getenv("USER_IMPORT_THREADS", "0"))
+
 SWAGGER_SETTINGS = {
     "SECURITY_DEFINITIONS": {
         "Bearer": {
@@ -87,7 +178,7 @@ SWAGGER_SETTINGS = {
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
     "http://127.0.0.1:5173",
-    "https://lms1-w2jv.onrender.com/",  # ✅ change as needed
+    "https://lms1-w2jv.onrender.com",  # ✅ change as needed
 ]
 
 STATIC_URL = '/static/'
@@ -98,9 +189,40 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Let the front-end server send media bodies once core.media has checked
+# access: "x-accel-redirect" (nginx, internal location at MEDIA_ACCEL_PREFIX
+# aliased to MEDIA_ROOT) or "x-sendfile" (Apache/lighttpd). Empty streams
+# them from Django.
+MEDIA_OFFLOAD = os.getenv("MEDIA_OFFLOAD", "")
+MEDIA_ACCEL_PREFIX = os.getenv("MEDIA_ACCEL_PREFIX", "/protected-media/")
+# Lifetime of the signed material links from GET /api/materials/<id>/link/.
+MEDIA_SIGNED_URL_SECONDS = int(os.getenv("MEDIA_SIGNED_URL_SECONDS", "3600"))
+
+# Resumable uploads (core.uploads): partial files live outside MEDIA_ROOT
+# until finalized and are moved into storage without copying.
+UPLOAD_TEMP_DIR = os.getenv("UPLOAD_TEMP_DIR", os.path.join(BASE_DIR, "upload_tmp"))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", 20 * 1024 ** 3))
+UPLOAD_CHUNK_MAX_BYTES = int(os.getenv("UPLOAD_CHUNK_MAX_BYTES", 64 * 1024 ** 2))
+
+# Background jobs (core/jobs.py). JOB_QUEUES caps concurrently running jobs
+# per queue across all workers (unlisted queues are unlimited). Each web
+# process runs JOB_EMBEDDED_WORKERS job threads; with more than a couple of
+# web processes set it to 0 and run one `manage.py run_jobs` instead, so only
+# one process polls the queue. JOBS_EAGER runs jobs inline on commit.
+JOB_QUEUES = {"default": 4, "progress": 2, "images": 2, "certificates": 1, "imports": 1}
+JOB_EMBEDDED_WORKERS = int(os.getenv("JOB_EMBEDDED_WORKERS", "1"))
+JOBS_EAGER = os.getenv("JOBS_EAGER", "False") == "True"
+JOB_RETENTION_HOURS = int(os.getenv("JOB_RETENTION_HOURS", "24"))
+
+# Completion certificates (core/certificates.py) are cached here, outside
+# MEDIA_ROOT; they are only served through the access-checked download view.
+CERTIFICATE_ROOT = os.getenv("CERTIFICATE_ROOT", os.path.join(BASE_DIR, "certificates"))
+CERTIFICATE_BACKGROUND = os.getenv("CERTIFICATE_BACKGROUND", "")
+CERTIFICATE_FONT = os.getenv("CERTIFICATE_FONT", "")
+
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
-    'DEFAULT_AUTHENTICATION_CLASSES': ['rest_framework_simplejwt.authentication.JWTAuthentication'],
+    'DEFAULT_AUTHENTICATION_CLASSES': ['users.authentication.ClaimsJWTAuthentication'],
 }
 
 LANGUAGE_CODE = "en-us"
@@ -1,6 +1,8 @@
+import re
+
 from django.contrib import admin
 from django.urls import path, include, re_path
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.views import TokenBlacklistView, TokenObtainPairView, TokenRefreshView
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
@@ -8,6 +10,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.views.generic import TemplateView
 from django.views.decorators.csrf import ensure_csrf_cookie
+from core.media import serve_media
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -24,6 +27,7 @@ urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
     path("api/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    path("api/token/blacklist/", TokenBlacklistView.as_view(), name="token_blacklist"),
 
     # ✅ App APIs
     path("api/", include("users.urls")),
@@ -38,8 +42,8 @@ urlpatterns = [
     re_path(r"^(?!api|admin|swagger|redoc|media|static).*$", ensure_csrf_cookie(TemplateView.as_view(template_name="index.html"))),
 ]
 
-# ✅ Media file handling
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# ✅ Media file handling (Range requests, access checks for materials)
+urlpatterns += [re_path(rf"^{re.escape(settings.MEDIA_URL.lstrip('/'))}(?P<path>.+)$", serve_media)]
 
 # ✅ Static file handling (for DEBUG=True only)
 if settings.DEBUG:
@@ -0,0 +1,91 @@
+"""
+JWT authentication without a per-request user query.
+
+Tokens issued by :class:`ClaimsTokenObtainPairSerializer` carry the user's
+``username``, ``role``, ``is_staff`` and ``token_version``. Authenticating
+such a token builds a ``User`` from those claims with every other field
+deferred, so ``request.user.id``/``.role`` cost nothing and touching e.g.
+``request.user.email`` loads that field on first use, as with ``.only()``.
+
+Revocation: ``User.token_version`` is bumped whenever the password, role,
+staff flag or active flag changes (see users.signals), and a token whose
+version no longer matches is rejected. The current version is read from the
+cache (``AUTH_VERSION_CACHE_SECONDS``), so the check is usually a cache hit;
+a deactivated user is cached as version ``-1``. Tokens without the claims
+(issued before this was deployed) go through the stock database lookup.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+
+CLAIMS = ("username", "role", "is_staff")
+VERSION_CLAIM = "ver"
+INACTIVE = -1
+
+
+def _cache():
+    return caches[getattr(settings, "AUTH_VERSION_CACHE_ALIAS", "default")]
+
+
+def _version_key(user_id):
+    return f"lms:auth:ver:{user_id}"
+
+
+def token_version(user_id):
+    """Current token version of ``user_id``, or ``None`` if the user doesn't exist."""
+    cache = _cache()
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        row = User.objects.filter(pk=user_id).values_list("token_version", "is_active").first()
+        if row is None:
+            return None
+        version = row[0] if row[1] else INACTIVE
+        cache.set(key, version, getattr(settings, "AUTH_VERSION_CACHE_SECONDS", 300))
+    return version
+
+
+def forget_token_version(user_id):
+    _cache().delete(_version_key(user_id))
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        # Claims are copied from the refresh token into each access token it
+        # mints, so refreshed tokens keep them too.
+        token = super().get_token(user)
+        for claim in CLAIMS:
+            token[claim] = getattr(user, claim)
+        token[VERSION_CLAIM] = user.token_version
+        return token
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        required = (api_settings.USER_ID_CLAIM, VERSION_CLAIM, *CLAIMS)
+        if any(claim not in validated_token for claim in required):
+            return super().get_user(validated_token)
+
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        version = token_version(user_id)
+        if version is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if version == INACTIVE:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if version != validated_token[VERSION_CLAIM]:
+            raise AuthenticationFailed(_("Token has been revoked"), code="token_revoked")
+
+        # Like a row loaded with .only(): the remaining fields are deferred and
+        # fetched from the database on first access.
+        loaded = {claim: validated_token[claim] for claim in CLAIMS}
+        loaded.update(id=user_id, is_active=True, token_version=version)
+        names = [field.attname for field in User._meta.concrete_fields if field.attname in loaded]
+        return User.from_db(None, names, [loaded[name] for name in names])
@@ -0,0 +1,169 @@
+"""
+Refresh-token blacklist.
+
+Revoked refresh tokens are stored as one :class:`~users.models.RevokedToken`
+row each: the ``jti`` and the token's expiry, nothing else. Every process also
+keeps a Bloom filter of the revoked ``jti``\\s, so checking a token that was
+never revoked (nearly all of them) doesn't touch the database; only a filter
+hit is confirmed with a primary-key lookup. The filter pulls in rows revoked
+by other processes at most every ``TOKEN_BLACKLIST_SYNC_SECONDS`` and is
+rebuilt from the unexpired rows every ``TOKEN_BLACKLIST_PRUNE_SECONDS``, when
+expired rows are also deleted (a token past its expiry is rejected anyway).
+
+Rotation doesn't depend on the filter being current: ``revoke`` inserts the
+``jti`` as a primary key, so when two requests race to rotate the same
+refresh token only one insert succeeds and the other is refused.
+"""
+
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .authentication import INACTIVE, VERSION_CLAIM, token_version
+from .models import RevokedToken
+
+HASHES = 7
+# Rows committed shortly before a sync may carry an earlier revoked_at.
+SYNC_OVERLAP = timedelta(seconds=5)
+
+
+class BloomFilter:
+    def __init__(self, bits, hashes=HASHES):
+        self.bits = bits
+        self.hashes = hashes
+        self._array = bytearray((bits + 7) // 8)
+        self._lock = threading.Lock()
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, step = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * step) % self.bits for i in range(self.hashes)]
+
+    def add(self, key):
+        positions = self._positions(key)
+        with self._lock:
+            for position in positions:
+                self._array[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        array = self._array
+        return all(array[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class _Blacklist:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter = None
+        self._synced_at = None
+        self._sync_due = 0.0
+        self._rebuild_due = 0.0
+
+    def _rebuild(self):
+        bloom = BloomFilter(settings.TOKEN_BLACKLIST_BLOOM_BITS)
+        now = timezone.now()
+        RevokedToken.objects.filter(expires_at__lte=now).delete()
+        for jti in RevokedToken.objects.values_list("jti", flat=True).iterator(chunk_size=5000):
+            bloom.add(jti.hex)
+        self._filter, self._synced_at = bloom, now
+        self._rebuild_due = time.monotonic() + settings.TOKEN_BLACKLIST_PRUNE_SECONDS
+
+    def _sync(self):
+        now = timezone.now()
+        recent = RevokedToken.objects.filter(revoked_at__gte=self._synced_at - SYNC_OVERLAP)
+        for jti in recent.values_list("jti", flat=True):
+            self._filter.add(jti.hex)
+        self._synced_at = now
+
+    def current(self):
+        """The filter, refreshed first if a sync or rebuild is due."""
+        clock = time.monotonic()
+        if self._filter is None or clock >= self._sync_due:
+            with self._lock:
+                clock = time.monotonic()
+                if self._filter is None or clock >= self._rebuild_due:
+                    self._rebuild()
+                elif clock >= self._sync_due:
+                    self._sync()
+                self._sync_due = clock + settings.TOKEN_BLACKLIST_SYNC_SECONDS
+        return self._filter
+
+
+_blacklist = _Blacklist()
+
+
+def _key(jti):
+    return jti.replace("-", "").lower()
+
+
+def is_revoked(jti):
+    if _key(jti) not in _blacklist.current():
+        return False
+    return RevokedToken.objects.filter(jti=jti).exists()
+
+
+def revoke(jti, exp):
+    """Blacklist the token; return ``False`` if it already was."""
+    if is_revoked(jti):
+        return False
+    expires_at = datetime.fromtimestamp(exp, tz=dt_timezone.utc)
+    try:
+        with transaction.atomic():
+            RevokedToken.objects.create(jti=jti, expires_at=expires_at)
+    except IntegrityError:
+        return False
+    _blacklist.current().add(_key(jti))
+    return True
+
+
+def _check_user(refresh):
+    """Refuse refresh tokens of missing, inactive or since-revoked users."""
+    user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+    if user_id is None:
+        return
+    version = token_version(user_id)
+    if version is None or version == INACTIVE:
+        raise AuthenticationFailed(_("No active account found for the given token."), "no_active_account")
+    if VERSION_CLAIM in refresh.payload and refresh[VERSION_CLAIM] != version:
+        raise InvalidToken(_("Token has been revoked"))
+
+
+class BlacklistTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+        _check_user(refresh)
+        jti = refresh[api_settings.JTI_CLAIM]
+        if api_settings.ROTATE_REFRESH_TOKENS and api_settings.BLACKLIST_AFTER_ROTATION:
+            if not revoke(jti, refresh["exp"]):
+                raise InvalidToken(_("Token is blacklisted"))
+        elif is_revoked(jti):
+            raise InvalidToken(_("Token is blacklisted"))
+
+        data = {"access": str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data["refresh"] = str(refresh)
+        return data
+
+
+class BlacklistTokenSerializer(serializers.Serializer):
+    """Log out: blacklist the given refresh token."""
+    refresh = serializers.CharField(write_only=True)
+    token_class = RefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+        revoke(refresh[api_settings.JTI_CLAIM], refresh["exp"])
+        return {}
@@ -0,0 +1,150 @@
+"""
+Bulk user provisioning from CSV or JSONL.
+
+Rows are read lazily from the file and handled ``BATCH_SIZE`` at a time:
+each row is validated like a model instance, usernames are checked against
+the database with one ``IN`` query per batch (and against earlier rows of the
+same file), passwords are hashed on the executor the caller provides, and the
+valid rows are written with ``bulk_create``. Password hashing dominates the
+cost (PBKDF2 is deliberately slow), so it is the part spread over cores.
+
+Columns: ``username`` and ``password`` are required; ``email``,
+``first_name``, ``last_name``, ``mobile_no`` and ``role`` (default
+``student``) are optional.
+"""
+
+import csv
+import io
+import json
+import time
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from .models import User
+
+BATCH_SIZE = 1000
+# Passwords per task sent to a process pool (thread pools ignore it).
+HASH_CHUNK_SIZE = 16
+FIELDS = ("username", "email", "first_name", "last_name", "mobile_no", "role")
+
+
+def read_rows(stream, fmt):
+    """Yield ``(line number, row dict)`` from a binary ``stream`` of CSV or JSONL."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            row = {"__error__": f"Invalid JSON: {exc}"}
+        yield number, row if isinstance(row, dict) else {"__error__": "Expected a JSON object."}
+
+
+def _build(row):
+    """Return ``(user, password, errors)`` for one input row."""
+    if "__error__" in row:
+        return None, None, {"row": [row["__error__"]]}
+    values = {field: str(row.get(field) or "").strip() for field in FIELDS}
+    values["role"] = values["role"] or "student"
+    password = row.get("password") or ""
+    user = User(**values)
+    errors = {}
+    if not password:
+        errors["password"] = ["This field is required."]
+    try:
+        user.full_clean(exclude=["password"], validate_unique=False, validate_constraints=False)
+    except ValidationError as exc:
+        errors.update(exc.message_dict)
+    return user, password, errors
+
+
+def _hash(executor, passwords):
+    if executor is None:
+        return [make_password(password) for password in passwords]
+    return list(executor.map(make_password, passwords, chunksize=HASH_CHUNK_SIZE))
+
+
+def _write(users, lines, on_error):
+    try:
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+        return len(users)
+    except IntegrityError:
+        pass
+    # Someone registered one of these usernames meanwhile: fall back to
+    # row-by-row inserts to find out which.
+    created = 0
+    for user, line in zip(users, lines):
+        try:
+            with transaction.atomic():
+                user.save(force_insert=True)
+            created += 1
+        except IntegrityError:
+            on_error(line, user.username, {"username": ["A user with that username already exists."]})
+    return created
+
+
+def import_users(rows, executor=None, on_error=None, batch_size=BATCH_SIZE):
+    """
+    Create users from ``rows`` (as yielded by ``read_rows``), hashing passwords
+    on ``executor`` (inline when ``None``). ``on_error(line, username,
+    errors)`` is called for each rejected row. Return a summary dict.
+    """
+    on_error = on_error or (lambda *args: None)
+    seen = set()
+    total = created = failed = 0
+    started = time.monotonic()
+    rows = iter(rows)
+    while batch := list(islice(rows, batch_size)):
+        total += len(batch)
+        candidates = []
+        for line, row in batch:
+            user, password, errors = _build(row)
+            username = user.username if user is not None else ""
+            if not errors and username in seen:
+                errors = {"username": ["Duplicate username in this file."]}
+            if errors:
+                failed += 1
+                on_error(line, username, errors)
+                continue
+            seen.add(username)
+            candidates.append((line, user, password))
+
+        taken = set(
+            User.objects.filter(username__in=[user.username for _, user, _ in candidates])
+            .values_list("username", flat=True)
+        )
+        ready = []
+        for line, user, password in candidates:
+            if user.username in taken:
+                failed += 1
+                on_error(line, user.username, {"username": ["A user with that username already exists."]})
+            else:
+                ready.append((line, user, password))
+        if not ready:
+            continue
+
+        lines, users, passwords = zip(*ready)
+        for user, hashed in zip(users, _hash(executor, passwords)):
+            user.password = hashed
+        written = _write(list(users), lines, on_error)
+        created += written
+        failed += len(users) - written
+
+    seconds = time.monotonic() - started
+    return {
+        "rows": total,
+        "created": created,
+        "failed": failed,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(total / seconds, 1) if seconds else None,
+    }
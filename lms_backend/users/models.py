@@ -9,6 +9,18 @@ USER_ROLES = (
 class User(AbstractUser):
     role = models.CharField(max_length=10, choices=USER_ROLES)
     mobile_no = models.CharField(max_length=20, blank=True)
+    # Bumped to revoke every issued JWT (see users.authentication).
+    token_version = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"{self.username} ({self.role})"
+
+
+class RevokedToken(models.Model):
+    """A refresh token that may no longer be used; see users.blacklist."""
+    jti = models.UUIDField(primary_key=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.jti.hex
@@ -0,0 +1,33 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+
+from .authentication import forget_token_version
+from .models import User
+
+# Changing any of these invalidates the user's outstanding tokens: they are
+# either embedded as claims or decide whether the user may sign in at all.
+TOKEN_FIELDS = ("password", "role", "is_staff", "is_active")
+
+
+@receiver(pre_save, sender=User)
+def user_remember_token_fields(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._revoke_tokens = False
+    if raw or instance.pk is None:
+        return
+    fields = [name for name in TOKEN_FIELDS if update_fields is None or name in update_fields]
+    if not fields:
+        return
+    old = User.objects.filter(pk=instance.pk).values(*fields).first()
+    instance._revoke_tokens = old is not None and any(old[name] != getattr(instance, name) for name in fields)
+
+
+@receiver(post_save, sender=User)
+def user_revoke_tokens(sender, instance, created, **kwargs):
+    if not getattr(instance, "_revoke_tokens", False):
+        return
+    # A separate UPDATE so it also applies when save() had update_fields.
+    User.objects.filter(pk=instance.pk).update(token_version=F("token_version") + 1)
+    instance.refresh_from_db(fields=["token_version"])
+    transaction.on_commit(lambda: forget_token_version(instance.pk))
@@ -0,0 +1,36 @@
+"""Background tasks for the users app, run by core.jobs workers."""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from core.jobs import task
+
+from . import imports
+
+MAX_REPORTED_ERRORS = 1000
+
+
+# One attempt: the file is removed once it has been read, and re-running a
+# partial import would only report the already-created rows as duplicates.
+@task(queue="imports", max_attempts=1, timeout=3600)
+def import_users_file(path, fmt):
+    errors = []
+
+    def on_error(line, username, row_errors):
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"line": line, "username": username, "errors": row_errors})
+
+    # Threads rather than processes: the worker may be embedded in a web
+    # process, and hashlib's PBKDF2 releases the GIL, so the hashing still
+    # runs on several cores.
+    threads = getattr(settings, "USER_IMPORT_THREADS", 0) or os.cpu_count() or 1
+    try:
+        with open(path, "rb") as stream, ThreadPoolExecutor(max_workers=threads) as pool:
+            summary = imports.import_users(imports.read_rows(stream, fmt), pool, on_error)
+    finally:
+        os.remove(path)
+    summary["errors"] = sorted(errors, key=lambda error: error["line"])
+    summary["errors_truncated"] = summary["failed"] > len(errors)
+    return summary
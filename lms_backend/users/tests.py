@@ -1,3 +1,178 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import timedelta
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core import jobs
+from core.models import Job
+
+from . import blacklist
+from .authentication import ClaimsJWTAuthentication, ClaimsTokenObtainPairSerializer
+from .models import RevokedToken, User
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class BulkImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", password="x", role="teacher")
+        User.objects.create_user("taken", password="x", role="student")
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        override = self.settings(UPLOAD_TEMP_DIR=root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _import(self, text, name="users.csv"):
+        upload = SimpleUploadedFile(name, text.encode())
+        return self.client.post("/api/users/import/", {"file": upload}, format="multipart")
+
+    def test_import_is_queued_and_polled(self):
+        response = self._import("username,password,role\nann,pw1,student\ntaken,pw2,student\nbob,pw3,teacher\n")
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()["id"]
+        self.assertEqual(response["Location"], f"/api/jobs/{job_id}/")
+        self.assertFalse(User.objects.filter(username="ann").exists())
+
+        poll = self.client.get(f"/api/jobs/{job_id}/").json()
+        self.assertEqual((poll["status"], poll["result"]), ("queued", None))
+
+        job = jobs.claim("test")
+        self.assertEqual((job.pk, job.queue), (job_id, "imports"))
+        jobs.execute(job)
+
+        poll = self.client.get(f"/api/jobs/{job_id}/").json()
+        self.assertEqual(poll["status"], "succeeded")
+        self.assertEqual((poll["result"]["rows"], poll["result"]["created"], poll["result"]["failed"]), (3, 2, 1))
+        self.assertEqual(poll["result"]["errors"][0]["line"], 3)
+        self.assertTrue(User.objects.get(username="bob").check_password("pw3"))
+        self.assertFalse(os.path.exists(job.kwargs["path"]))
+
+    def test_rejects_unknown_format(self):
+        response = self.client.post(
+            "/api/users/import/", {"file": SimpleUploadedFile("u.txt", b"x"), "format": "xml"}, format="multipart"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Job.objects.exists())
+
+    def test_job_detail_is_admin_only(self):
+        job_id = self._import('{"username": "cy", "password": "pw"}\n', name="users.jsonl").json()["id"]
+        self.client.force_authenticate(User.objects.get(username="taken"))
+        self.assertEqual(self.client.get(f"/api/jobs/{job_id}/").status_code, 403)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class ClaimsAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("ann", password="pw", role="student", email="ann@example.com")
+
+    def setUp(self):
+        caches["default"].clear()
+        self.authenticator = ClaimsJWTAuthentication()
+
+    def _authenticate(self, token):
+        request = RequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        return self.authenticator.authenticate(request)[0]
+
+    def _token(self):
+        return ClaimsTokenObtainPairSerializer.get_token(self.user).access_token
+
+    def test_claims_are_trusted_without_a_user_query(self):
+        token = APIClient().post("/api/token/", {"username": "ann", "password": "pw"}).json()["access"]
+        self._authenticate(token)  # caches the token version
+        with self.assertNumQueries(0):
+            user = self._authenticate(token)
+            self.assertEqual((user.pk, user.username, user.role), (self.user.pk, "ann", "student"))
+        # Other fields are loaded on first use.
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, "ann@example.com")
+
+    def test_changing_the_password_revokes_tokens(self):
+        token = self._token()
+        self._authenticate(token)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password("new")
+            self.user.save()
+        with self.assertRaisesMessage(AuthenticationFailed, "revoked"):
+            self._authenticate(token)
+        self.user.refresh_from_db()
+        self.assertEqual(self._authenticate(self._token()).pk, self.user.pk)
+
+    def test_deactivated_users_are_refused(self):
+        token = self._token()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save(update_fields=["is_active"])
+        with self.assertRaisesMessage(AuthenticationFailed, "inactive"):
+            self._authenticate(token)
+
+    def test_tokens_without_claims_load_the_user(self):
+        token = RefreshToken.for_user(self.user).access_token
+        with self.assertNumQueries(1):
+            self.assertEqual(self._authenticate(token).email, "ann@example.com")
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class RefreshBlacklistTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user("ann", password="pw", role="student")
+
+    def setUp(self):
+        caches["default"].clear()
+        self.client = APIClient()
+
+    def _refresh(self, token):
+        return self.client.post("/api/token/refresh/", {"refresh": token})
+
+    def test_rotation_revokes_the_used_token(self):
+        first = self.client.post("/api/token/", {"username": "ann", "password": "pw"}).json()["refresh"]
+        response = self._refresh(first)
+        self.assertEqual(response.status_code, 200)
+        second = response.json()["refresh"]
+        self.assertEqual(self._refresh(first).status_code, 401)
+        self.assertEqual(self._refresh(second).status_code, 200)
+
+    def test_logout_revokes_the_token(self):
+        refresh = self.client.post("/api/token/", {"username": "ann", "password": "pw"}).json()["refresh"]
+        self.assertEqual(self.client.post("/api/token/blacklist/", {"refresh": refresh}).status_code, 200)
+        self.assertEqual(self._refresh(refresh).status_code, 401)
+
+    @override_settings(TOKEN_BLACKLIST_SYNC_SECONDS=60)
+    def test_unrevoked_tokens_skip_the_database(self):
+        blacklist._blacklist._sync_due = 0  # pick up the setting
+        blacklist.is_revoked(uuid.uuid4().hex)
+        with self.assertNumQueries(0):
+            for _ in range(100):
+                self.assertFalse(blacklist.is_revoked(uuid.uuid4().hex))
+
+    def test_expired_entries_are_pruned(self):
+        now = timezone.now()
+        RevokedToken.objects.create(jti=uuid.uuid4(), expires_at=now - timedelta(minutes=1))
+        kept = RevokedToken.objects.create(jti=uuid.uuid4(), expires_at=now + timedelta(days=1))
+        blacklist._blacklist._rebuild()
+        self.assertEqual(list(RevokedToken.objects.values_list("jti", flat=True)), [kept.jti])
+        self.assertTrue(blacklist.is_revoked(str(kept.jti)))
+
+    def test_bloom_filter(self):
+        bloom = blacklist.BloomFilter(2 ** 16)
+        added = [uuid.uuid4().hex for _ in range(1000)]
+        for key in added:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in added))
+        false_positives = sum(uuid.uuid4().hex in bloom for _ in range(10000))
+        self.assertLess(false_positives, 50)
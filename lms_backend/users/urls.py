@@ -1,6 +1,7 @@
 from django.urls import path
-from .views import user_list_create
+from .views import user_bulk_import, user_list_create
 
 urlpatterns = [
     path('users/', user_list_create, name='user-list-create'),
+    path('users/import/', user_bulk_import, name='user-bulk-import'),
 ]
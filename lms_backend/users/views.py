@@ -1,7 +1,14 @@
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated, AllowAny
+import os
+import uuid
+
+from django.conf import settings
+from rest_framework.decorators import api_view, parser_classes, permission_classes
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
+from core import jobs
+from . import tasks
 from .models import User
 from .serializers import UserSerializer
 from drf_yasg.utils import swagger_auto_schema
@@ -28,3 +35,32 @@ def user_list_create(request):
             serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(["POST"])
+@permission_classes([IsAdminUser])
+@parser_classes([MultiPartParser])
+def user_bulk_import(request):
+    upload = request.FILES.get("file")
+    if upload is None:
+        return Response({"detail": "Upload a CSV or JSONL file as 'file'."}, status=status.HTTP_400_BAD_REQUEST)
+    fmt = request.data.get("format") or ("csv" if upload.name.lower().endswith(".csv") else "jsonl")
+    if fmt not in ("csv", "jsonl"):
+        return Response({"detail": "format must be csv or jsonl."}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Hashing thousands of passwords takes minutes, so the import runs as a
+    # job; the client polls jobs/<id>/ for the summary and per-row errors.
+    directory = os.path.join(settings.UPLOAD_TEMP_DIR, "imports")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{uuid.uuid4().hex}.{fmt}")
+    with open(path, "wb") as destination:
+        for chunk in upload.chunks():
+            destination.write(chunk)
+    job = jobs.enqueue(tasks.import_users_file, path=path, fmt=fmt)
+    if job is None:  # JOBS_EAGER: already ran on commit
+        return Response({"id": None, "status": "succeeded"}, status=status.HTTP_202_ACCEPTED)
+    return Response(
+        {"id": job.pk, "status": job.status},
+        status=status.HTTP_202_ACCEPTED,
+        headers={"Location": f"/api/jobs/{job.pk}/"},
+    )